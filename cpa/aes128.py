@@ -0,0 +1,268 @@
+# AES-128, shared by the CPA and TA code. ta/ imports this module
+# from cpa/, so it must not import modules of which ta/ has its own version,
+# such as helpers.
+import numpy as np
+
+SBOX = (
+    0x63,0x7c,0x77,0x7b,0xf2,0x6b,0x6f,0xc5,0x30,0x01,0x67,0x2b,0xfe,0xd7,0xab,0x76,
+    0xca,0x82,0xc9,0x7d,0xfa,0x59,0x47,0xf0,0xad,0xd4,0xa2,0xaf,0x9c,0xa4,0x72,0xc0,
+    0xb7,0xfd,0x93,0x26,0x36,0x3f,0xf7,0xcc,0x34,0xa5,0xe5,0xf1,0x71,0xd8,0x31,0x15,
+    0x04,0xc7,0x23,0xc3,0x18,0x96,0x05,0x9a,0x07,0x12,0x80,0xe2,0xeb,0x27,0xb2,0x75,
+    0x09,0x83,0x2c,0x1a,0x1b,0x6e,0x5a,0xa0,0x52,0x3b,0xd6,0xb3,0x29,0xe3,0x2f,0x84,
+    0x53,0xd1,0x00,0xed,0x20,0xfc,0xb1,0x5b,0x6a,0xcb,0xbe,0x39,0x4a,0x4c,0x58,0xcf,
+    0xd0,0xef,0xaa,0xfb,0x43,0x4d,0x33,0x85,0x45,0xf9,0x02,0x7f,0x50,0x3c,0x9f,0xa8,
+    0x51,0xa3,0x40,0x8f,0x92,0x9d,0x38,0xf5,0xbc,0xb6,0xda,0x21,0x10,0xff,0xf3,0xd2,
+    0xcd,0x0c,0x13,0xec,0x5f,0x97,0x44,0x17,0xc4,0xa7,0x7e,0x3d,0x64,0x5d,0x19,0x73,
+    0x60,0x81,0x4f,0xdc,0x22,0x2a,0x90,0x88,0x46,0xee,0xb8,0x14,0xde,0x5e,0x0b,0xdb,
+    0xe0,0x32,0x3a,0x0a,0x49,0x06,0x24,0x5c,0xc2,0xd3,0xac,0x62,0x91,0x95,0xe4,0x79,
+    0xe7,0xc8,0x37,0x6d,0x8d,0xd5,0x4e,0xa9,0x6c,0x56,0xf4,0xea,0x65,0x7a,0xae,0x08,
+    0xba,0x78,0x25,0x2e,0x1c,0xa6,0xb4,0xc6,0xe8,0xdd,0x74,0x1f,0x4b,0xbd,0x8b,0x8a,
+    0x70,0x3e,0xb5,0x66,0x48,0x03,0xf6,0x0e,0x61,0x35,0x57,0xb9,0x86,0xc1,0x1d,0x9e,
+    0xe1,0xf8,0x98,0x11,0x69,0xd9,0x8e,0x94,0x9b,0x1e,0x87,0xe9,0xce,0x55,0x28,0xdf,
+    0x8c,0xa1,0x89,0x0d,0xbf,0xe6,0x42,0x68,0x41,0x99,0x2d,0x0f,0xb0,0x54,0xbb,0x16
+)
+
+INV_SBOX = tuple(SBOX.index(i) for i in range(256))
+
+RCON = (0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1b, 0x36)
+
+# The state is stored column by column, so byte i is in row i % 4. ShiftRows
+# moves the byte at position SHIFT_ROWS_SOURCES[i] to position i.
+SHIFT_ROWS_SOURCES = tuple((i + 4 * (i % 4)) % 16 for i in range(16))
+
+ROUNDS = 10
+
+SBOX_TABLE = np.array(SBOX, dtype=np.uint8)
+SHIFT_ROWS_TABLE = np.array(SHIFT_ROWS_SOURCES)
+# The Sbox applied to both bytes of every 16-bit word, which halves the
+# amount of table lookups of SubBytes.
+SBOX_PAIRS_TABLE = (SBOX_TABLE[np.arange(2 ** 16) & 0xff] |
+                    SBOX_TABLE[np.arange(2 ** 16) >> 8].astype(np.uint16)
+                    << 8).astype("<u2")
+
+# The intermediates that compute_intermediates() can return: the output of
+# the first SubBytes, the input state of the last round, the ciphertext and
+# the round keys.
+INTERMEDIATES = ("round1_sbox_out", "round10_in", "ciphertext",
+                 "key_schedule")
+DEFAULT_BATCH_SIZE = 2 ** 14
+
+
+def key_schedule_core(word, round_nr):
+    """Applies RotWord, SubWord and the round constant to a key schedule
+    word, as done for the first word of every round key.
+
+    Arguments:
+        word {[int]} -- The last word of the previous round key as 4 bytes.
+        round_nr {int} -- The round of the key that is computed, in [1..10].
+
+    Returns:
+        [int] -- The transformed word as 4 bytes.
+    """
+    word = [SBOX[b] for b in word[1:] + word[:1]]
+    word[0] ^= RCON[round_nr - 1]
+    return word
+
+
+def expand_key(key):
+    """Computes the AES-128 key schedule.
+
+    Arguments:
+        key {[int]} -- The 16-byte master key.
+
+    Returns:
+        [[int]] -- The 11 round keys of 16 bytes, of which the first one is
+        the master key.
+    """
+    words = [list(key[i:i + 4]) for i in range(0, 16, 4)]
+    for i in range(4, 4 * (ROUNDS + 1)):
+        previous = words[i - 1]
+        if i % 4 == 0:
+            previous = key_schedule_core(previous, i // 4)
+        words.append([a ^ b for (a, b) in zip(words[i - 4], previous)])
+
+    return [sum(words[i:i + 4], []) for i in range(0, len(words), 4)]
+
+
+def invert_key_schedule(round_key, round_nr=ROUNDS):
+    """Computes the master key from a single round key by running the AES-128
+    key schedule backwards.
+
+    Arguments:
+        round_key {[int]} -- The 16-byte round key.
+        round_nr {int} -- The round of the given key, in [0..10].
+
+    Returns:
+        [int] -- The 16-byte master key.
+    """
+    # The window holds the words i + 1 to i + 4 of the key schedule, from
+    # which word i is recovered as word i + 4 XOR (the core of) word i + 3.
+    window = [list(round_key[i:i + 4]) for i in range(0, 16, 4)]
+    for i in range(4 * round_nr - 1, -1, -1):
+        previous = window[2]
+        if (i + 4) % 4 == 0:
+            previous = key_schedule_core(previous, (i + 4) // 4)
+        word = [a ^ b for (a, b) in zip(window[3], previous)]
+        window = [word] + window[:3]
+
+    return sum(window, [])
+
+
+def rotate_words(words, bytes_amnt):
+    """Rotates every little-endian 32-bit word of an array, so that every byte
+    moves to the position of the byte bytes_amnt positions before it.
+
+    Arguments:
+        words {np.ndarray} -- A '<u4' array of words.
+        bytes_amnt {int} -- The amount of positions to rotate by.
+
+    Returns:
+        np.ndarray -- The rotated '<u4' array.
+    """
+    return (words >> np.uint32(8 * bytes_amnt)) | \
+        (words << np.uint32(32 - 8 * bytes_amnt))
+
+
+def sub_bytes(states):
+    """Substitutes every byte of an array through the Sbox.
+
+    Arguments:
+        states {np.ndarray} -- An array of which the last axis has an even
+        length, such as a (states x 16) uint8 array or an array of 32-bit
+        words.
+
+    Returns:
+        np.ndarray -- The substituted array, of the same shape and type.
+    """
+    states = np.ascontiguousarray(states)
+    return SBOX_PAIRS_TABLE.take(states.view("<u2")).view(states.dtype)
+
+
+def expand_keys(keys):
+    """Computes the AES-128 key schedules of many keys at once. The words of
+    the schedule are handled as 32-bit integers, whose little-endian bytes
+    are the bytes of the word.
+
+    Arguments:
+        keys {np.ndarray} -- A (keys x 16) array of master keys.
+
+    Returns:
+        np.ndarray -- A (keys x 11 x 16) uint8 array of the round keys of
+        every key, of which the first one is the master key.
+    """
+    keys = np.ascontiguousarray(keys, dtype=np.uint8)
+    key_words = keys.view("<u4")
+    words = [key_words[:, i].copy() for i in range(4)]
+
+    for i in range(4, 4 * (ROUNDS + 1)):
+        previous = words[i - 1]
+        if i % 4 == 0:
+            previous = sub_bytes(rotate_words(previous, 1)) ^ \
+                np.uint32(RCON[i // 4 - 1])
+        words.append(words[i - 4] ^ previous)
+
+    return np.stack(words, axis=1).view(np.uint8).reshape(
+        len(keys), ROUNDS + 1, 16)
+
+
+def mix_columns(states):
+    """Applies MixColumns to many states at once. Every column is handled as
+    one 32-bit integer.
+
+    Arguments:
+        states {np.ndarray} -- A contiguous (states x 16) uint8 array.
+
+    Returns:
+        np.ndarray -- The mixed (states x 16) uint8 array.
+    """
+    columns = np.ascontiguousarray(states).view("<u4")
+    # Every byte becomes 2a ^ 3b ^ c ^ d for the bytes a, b, c and d of its
+    # column, starting at its own row.
+    rotated = rotate_words(columns, 1)
+    doubled = columns ^ rotated
+    doubled = ((doubled & np.uint32(0x7f7f7f7f)) << np.uint32(1)) ^ \
+        (((doubled >> np.uint32(7)) & np.uint32(0x01010101)) *
+         np.uint32(0x1b))
+    mixed = doubled ^ rotated ^ rotate_words(columns, 2) ^ \
+        rotate_words(columns, 3)
+    return mixed.view(np.uint8)
+
+
+def compute_intermediates(plaintexts, keys, names=("ciphertext",),
+                          batch_size=DEFAULT_BATCH_SIZE):
+    """Encrypts many blocks with AES-128 at once and returns the requested
+    intermediate values of the encryption, see INTERMEDIATES. Every block may
+    have its own key, or all blocks may share a single key. The blocks are
+    encrypted in batches, which bounds the memory use of the rounds.
+
+    Arguments:
+        plaintexts {np.ndarray} -- A (blocks x 16) array of plaintexts, or a
+        single plaintext that is encrypted under every key.
+        keys {np.ndarray} -- A (blocks x 16) array of keys, or a single key
+        that encrypts every plaintext.
+        names {[string]} -- The names of the intermediates to return.
+        batch_size {int} -- The amount of blocks to encrypt at once.
+
+    Raises:
+        ValueError -- If an intermediate is unknown.
+
+    Returns:
+        {np.ndarray} -- The (blocks x 16) uint8 array of every requested
+        intermediate, except for the (keys x 11 x 16) key_schedule.
+    """
+    unknown_names = set(names) - set(INTERMEDIATES)
+    if unknown_names:
+        raise ValueError(f"Unknown intermediates {sorted(unknown_names)}, "
+                         f"expected any of {INTERMEDIATES}.")
+
+    plaintexts = np.atleast_2d(np.asarray(plaintexts, dtype=np.uint8))
+    keys = np.atleast_2d(np.asarray(keys, dtype=np.uint8))
+    blocks_amnt = max(len(plaintexts), len(keys))
+    # A shared key is expanded only once.
+    shared_round_keys = expand_keys(keys) if len(keys) == 1 else None
+
+    results = {name: np.empty((blocks_amnt, 16), dtype=np.uint8)
+               for name in names if name != "key_schedule"}
+    if "key_schedule" in names:
+        results["key_schedule"] = shared_round_keys if len(keys) == 1 \
+            else expand_keys(keys)
+
+    for i in range(0, blocks_amnt, batch_size):
+        batch = slice(i, min(i + batch_size, blocks_amnt))
+        batch_plaintexts = plaintexts if len(plaintexts) == 1 \
+            else plaintexts[batch]
+        round_keys = shared_round_keys if len(keys) == 1 \
+            else expand_keys(keys[batch])
+
+        states = batch_plaintexts ^ round_keys[:, 0]
+        if "round1_sbox_out" in results:
+            results["round1_sbox_out"][batch] = sub_bytes(states)
+        for round_nr in range(1, ROUNDS + 1):
+            if round_nr == ROUNDS and "round10_in" in results:
+                results["round10_in"][batch] = states
+            # ShiftRows only moves bytes, so it may come before SubBytes.
+            states = sub_bytes(states[:, SHIFT_ROWS_TABLE])
+            if round_nr != ROUNDS:
+                states = mix_columns(states)
+            states = states ^ round_keys[:, round_nr]
+        if "ciphertext" in results:
+            results["ciphertext"][batch] = states
+
+    return results
+
+
+def encrypt(plaintexts, keys, batch_size=DEFAULT_BATCH_SIZE):
+    """Encrypts many blocks with AES-128 at once, see compute_intermediates().
+
+    Arguments:
+        plaintexts {np.ndarray} -- A (blocks x 16) array of plaintexts, or a
+        single plaintext that is encrypted under every key.
+        keys {np.ndarray} -- A (blocks x 16) array of keys, or a single key
+        that encrypts every plaintext.
+        batch_size {int} -- The amount of blocks to encrypt at once.
+
+    Returns:
+        np.ndarray -- A (blocks x 16) uint8 array of ciphertexts.
+    """
+    return compute_intermediates(plaintexts, keys, ["ciphertext"],
+                                 batch_size)["ciphertext"]
@@ -19,6 +19,24 @@ class AttackAnalyser:
         Returns:
             float -- The average guessing entropy of all subkeys.
         """
+        partial_guessing_entropies = \
+            self.compute_partial_guessing_entropies(known_key, subkey_coeffs)
+
+        return np.mean(partial_guessing_entropies)
+
+    def compute_partial_guessing_entropies(self, known_key, subkey_coeffs):
+        """Computes the guessing entropy of each subkey, which is the rank of
+        the known subkey among the subkey guesses.
+
+        Arguments:
+            known_key {[int]} -- The full, actual secret key as a list of ints.
+            subkey_coeffs { {{}} } -- A dictionary that contains a nested
+            dictionary for each of the attacked subkeys, as given to
+            compute_guessing_entropy().
+
+        Returns:
+            [int] -- The guessing entropy of each attacked subkey.
+        """
         partial_guessing_entropies = []
         for (subkey_index, subkey_guess_corr_coeffs) in subkey_coeffs.items():
             known_subkey = known_key[subkey_index]
@@ -29,7 +47,34 @@ class AttackAnalyser:
 
             partial_guessing_entropies.append(pge)
 
-        return np.mean(partial_guessing_entropies)
+        return partial_guessing_entropies
+
+    def compute_guessing_entropies(self, known_key, pccs):
+        """Computes the partial guessing entropy of each subkey for many
+        attacks at once, from the PCCs of all their subkey guesses. Ties are
+        ranked like compute_subkey_guessing_entropy() ranks them.
+
+        Arguments:
+            known_key {[int]} -- The full, actual secret key as a list of ints.
+            pccs {np.ndarray} -- An (... x subkeys x 256) array of the PCC of
+            every subkey guess, e.g. of many resampled attacks.
+
+        Returns:
+            np.ndarray -- An (... x subkeys) array of partial guessing
+            entropies.
+        """
+        pccs = np.asarray(pccs)
+        subkeys_amnt = pccs.shape[-2]
+        known_subkeys = np.asarray(known_key[:subkeys_amnt])
+        known_pccs = np.take_along_axis(
+            pccs, np.broadcast_to(known_subkeys[:, np.newaxis],
+                                  pccs.shape[:-1] + (1,)), axis=-1)
+
+        # The sort is stable, so equal guesses keep their order of guess.
+        guesses = np.arange(pccs.shape[-1])
+        earlier_guesses = guesses < known_subkeys[:, np.newaxis]
+        return (pccs > known_pccs).sum(axis=-1) + \
+            ((pccs == known_pccs) & earlier_guesses).sum(axis=-1)
 
     def compute_subkey_guessing_entropy(self, known_subkey,
                                         subkey_guess_corr_coeffs):
@@ -84,6 +129,77 @@ class AttackAnalyser:
 
         raise ValueError(f"Key {int_key} was not found in the list of pairs.")
 
+    def compute_correlation_scores(self, pccs, traces_amnt):
+        """Turns the PCCs of a CPA attack into scores that add up over the
+        subkeys like log-likelihoods, so that they can be used to rank full
+        keys. Under the Fisher transform, the correlation of n traces is
+        approximately normal with a variance of 1 / (n - 3), which gives the
+        log-likelihood ratio of a guess versus no correlation at all.
+
+        Arguments:
+            pccs {np.ndarray} -- A (subkeys x 256) array of the absolute PCC
+            of every subkey guess.
+            traces_amnt {int} -- The amount of traces of the attack.
+
+        Returns:
+            np.ndarray -- A (subkeys x 256) array of scores.
+        """
+        fisher_z = np.arctanh(np.clip(np.abs(pccs), 0, 1 - 1e-12))
+        return (max(traces_amnt, 4) - 3) * fisher_z * fisher_z / 2
+
+    def compute_key_rank_bounds(self, known_key, scores, bins_amnt=2048):
+        """Bounds the rank of the full key among all 2^128 keys, which is the
+        amount of keys that score higher than it when the scores of their
+        subkeys are added up. This is the brute force effort that remains
+        after the attack, unlike the guessing entropy of the subkeys.
+
+        The scores of every subkey are counted in a histogram with bins of
+        one common width, and convolving the 16 histograms counts the keys
+        per sum of bins. A key's score lies within 16 bin widths from its
+        sum of bins, so the keys above the known key's score are certainly
+        counted by the lower bound and possibly by the upper bound.
+
+        Arguments:
+            known_key {[int]} -- The full, actual secret key as a list of ints.
+            scores {np.ndarray} -- A (16 x 256) array of the score of every
+            subkey guess, which add up over the subkeys, such as TA
+            log-likelihoods or compute_correlation_scores() of CPA PCCs.
+            bins_amnt {int} -- The amount of bins of every histogram. More
+            bins give tighter bounds.
+
+        Returns:
+            (float, float) -- The lower and upper bound of the rank of the
+            known key, where 0 means that it is the best scoring key.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        subkeys_amnt = len(scores)
+        # A log-likelihood of -inf (a probability of 0) counts as the lowest
+        # finite score, which keeps the bin width finite.
+        scores = np.maximum(scores, scores[np.isfinite(scores)].min())
+        offsets = scores.min(axis=1)
+        bin_width = (scores.max(axis=1) - offsets).max() / (bins_amnt - 1)
+        if bin_width == 0:
+            # All guesses score the same, so all keys tie.
+            return (0.0, float(scores.shape[1]) ** subkeys_amnt - 1)
+
+        bin_indices = np.floor(
+            (scores - offsets[:, np.newaxis]) / bin_width).astype(int)
+        key_counts = np.ones(1)
+        for subkey_bin_indices in bin_indices:
+            histogram = np.bincount(subkey_bin_indices, minlength=bins_amnt)
+            key_counts = np.convolve(key_counts, histogram)
+
+        # The position of the known key's score among the sums of bins.
+        known_score = scores[np.arange(subkeys_amnt), known_key].sum()
+        threshold = (known_score - offsets.sum()) / bin_width
+        sums_of_bins = np.arange(len(key_counts))
+
+        lower_bound = key_counts[sums_of_bins > threshold].sum()
+        upper_bound = \
+            key_counts[sums_of_bins > threshold - subkeys_amnt].sum() - 1
+
+        return (float(lower_bound), float(max(upper_bound, lower_bound)))
+
     def compute_key_success_rate(self, known_key, guess):
         return int(known_key == guess)
 
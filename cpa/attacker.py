@@ -3,6 +3,8 @@ import numpy as np
 from scipy.stats import pearsonr
 from power_consumption_modeler import PowerConsumptionModeler
 from helpers import *
+from correlation import (correlation_matrix, max_abs_correlations,
+                         normalize_columns)
 
 import time
 
@@ -10,7 +12,8 @@ import time
 class Attacker:
     POSSIBLE_SUBKEYS = range(256)  # Integers [0..255]
 
-    def __init__(self, plaintexts):
+    def __init__(self, plaintexts, dtype=np.float64,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
         """Initiates an Attacker object, which will execute a Correlation
         Power Analysis Attack on an AES implementation by having it encrypt
         a given set of plaintexts.
@@ -20,10 +23,17 @@ class Attacker:
             be encrypted to obtain power samples from the algorithm. Each
             sequence is a tuple (or list) of decimal numbers that represent
             bytes.
+            dtype {np.dtype} -- The float type to correlate in. The traces
+            themselves may be of any numeric type, e.g. int8 scope samples.
+            np.float32 halves the memory use and doubles the throughput of
+            the correlation at a precision that is ample for ranking keys.
+            leakage_model {string} -- The name of the leakage model with which
+            to model the power consumption, see LEAKAGE_MODELS.
         """
         self.plaintexts = plaintexts
+        self.dtype = dtype
 
-        self.power_modeler = PowerConsumptionModeler()
+        self.power_modeler = PowerConsumptionModeler(leakage_model)
 
         # For each of the 16 subkeys, store a "subkey guess correlation" dict.
         # Such a dict stores the correlation coefficient for each subkey guess.
@@ -31,31 +41,55 @@ class Attacker:
         for i in range(16):
             self.subkey_corr_coeffs[i] = {}
 
-    def obtain_full_private_key(self, power_samples, only_first_byte=False):
+    def obtain_full_private_key(self, power_samples, only_first_byte=False,
+                                bytes_per_chunk=4):
         """Computes the full private key used in AES128 by computing each of
         its 16 subkeys. This is done with power samples produced by encryption
         of known plaintexts.
 
+        The trace matrix is centered and normalized only once and shared by
+        the hypotheses of all subkeys, which are correlated with it in
+        batches of `bytes_per_chunk` subkeys per matrix product.
+
         Arguments:
             power_samples { [[float]] } - A list of power traces where each
             trace is a list of floats that represents the obtained output
             for one plaintext encryption. Each sample is assumed to use the
             same encryption key.
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+            bytes_per_chunk {int} -- The amount of subkeys of which the 256
+            hypotheses are correlated in one matrix product. Higher values are
+            faster but need (bytes_per_chunk * 256 x samples) floats of memory.
 
         Returns:
             [int] -- The full 128-bit key as a list of 16 integers.
         """
-        private_key = []  # List of binary values
-
-        block_nr = 0  # It doesn't matter which plaintext block we look at
+        normalized_traces = normalize_columns(power_samples, self.dtype)
+        traces_amnt = len(normalized_traces)
 
         final_subkeys = []  # 16 subkeys of 8 bits each, as integers
         amnt_of_subkeys = 1 if only_first_byte else 16
-        for subkey_nr in range(0, amnt_of_subkeys):
-            print(f"Starting to obtain subkey {subkey_nr}!")
-            subkey = self.find_used_subkey(power_samples, block_nr, subkey_nr)
-            print(f"Found subkey nr {subkey_nr}: {subkey}")
-            final_subkeys.append(subkey)
+        for chunk_start in range(0, amnt_of_subkeys, bytes_per_chunk):
+            subkey_nrs = range(chunk_start,
+                               min(chunk_start + bytes_per_chunk,
+                                   amnt_of_subkeys))
+            print(f"Starting to obtain subkeys {list(subkey_nrs)}!")
+
+            # Stack the normalized hypotheses of all subkeys in this chunk to
+            # correlate them with the traces in a single product.
+            hypotheses = np.concatenate([
+                normalize_columns(self.model_consumptions(traces_amnt,
+                                                          subkey_nr),
+                                  self.dtype)
+                for subkey_nr in subkey_nrs
+            ], axis=1)
+            pccs = max_abs_correlations(hypotheses.T @ normalized_traces)
+            pccs = pccs.reshape(len(subkey_nrs), len(self.POSSIBLE_SUBKEYS))
+
+            for (subkey_nr, subkey_pccs) in zip(subkey_nrs, pccs):
+                subkey = self.store_subkey_pccs(subkey_nr, subkey_pccs)
+                print(f"Found subkey nr {subkey_nr}: {subkey}")
+                final_subkeys.append(subkey)
 
         return final_subkeys
 
@@ -78,70 +112,39 @@ class Attacker:
         Returns:
             int -- The best subkey guess as an integer.
         """
-        # Compute Pearson's Correlation Coefficient (PCC) for each possible
-        # subkey and use the PCCs to find the best subkey.
-        best_subkey = 0
-        best_subkey_pcc = 0
+        # Model the consumption of every trace for all 256 subkey guesses and
+        # correlate all of them with the actual consumptions at once.
+        hypotheses = self.model_consumptions(len(power_samples),
+                                             subkey_byte_index)
+        correlations = correlation_matrix(hypotheses, power_samples,
+                                          self.dtype)
+
+        # The PCC of a guess is its highest absolute correlation over all
+        # sample points.
+        pccs = max_abs_correlations(correlations)
+
+        return self.store_subkey_pccs(subkey_byte_index, pccs)
 
+    def store_subkey_pccs(self, subkey_byte_index, pccs):
+        """Stores the computed correlation coefficient of each subkey guess
+        for a subkey and picks the guess that correlates the most.
+
+        Arguments:
+            subkey_byte_index {int} -- Integer to indicate which byte we're
+            inspecting in the given block.
+            pccs {np.ndarray} -- The highest absolute correlation of each of
+            the 256 subkey guesses.
+
+        Returns:
+            int -- The best subkey guess as an integer.
+        """
+        # For each subkey attempt, store the correlation of this subkey
+        # guess with the actual consumptions to compute guessing entropy.
         for subkey_guess in self.POSSIBLE_SUBKEYS:
-            if subkey_guess in [64, 128, 192, 256]:
-                print(f"Computing PCC for subkey guess {subkey_guess}...")
-
-            # For each plaintext, compute the modeled consumption for
-            # encrypting it with one of the guessed subkeys.
-            subkey_guess_consumptions = []
-
-            # Compute the simulated subkey consumptions for each plaintext
-            for i in range(len(power_samples)):
-                # Define the location we're attacking in the full plaintext
-                subplaintext = self.plaintexts[i][subkey_byte_index]
-
-                # Compute the Hamm dist after subBytes in round 1
-                sbox_simulation = apply_sbox(subplaintext ^ subkey_guess)
-                modeled_consumption = \
-                    self.power_modeler.subkey_hamm_weight(sbox_simulation)
-
-                subkey_guess_consumptions.append(modeled_consumption)
-
-            # Find out the correlation between the modeled consumptions and the
-            # actual consumptions by computing correlation values for each
-            # subkey guess.
-            numpoint = len(power_samples[0])
-            # For each point, keep track of the sum and both denominators in
-            # the correlation function computed as
-            # r_i,j = sumnum / np.sqrt(sumden1 * sumden2).
-            sumnum = np.zeros(numpoint)
-            sumden1 = np.zeros(numpoint)
-            sumden2 = np.zeros(numpoint)
-
-            numtraces = len(power_samples)
-
-            modeled_cons_mean = np.mean(subkey_guess_consumptions,
-                                        dtype=np.float64)
-            traces_mean = np.mean(power_samples, axis=0, dtype=np.float64)
-
-            # Compute the correlation for all trace points at the same time.
-            # Build up the correlation value over time by iterating over all
-            # power traces.
-            for trace_num in range(0, numtraces):
-                modeled_cons_diff = \
-                    subkey_guess_consumptions[trace_num] - modeled_cons_mean
-                actual_cons_diff = power_samples[trace_num] - traces_mean
-
-                sumnum = sumnum + modeled_cons_diff*actual_cons_diff
-                sumden1 = sumden1 + modeled_cons_diff*modeled_cons_diff
-                sumden2 = sumden2 + actual_cons_diff*actual_cons_diff
-
-            pcc = max(abs(sumnum / np.sqrt(sumden1 * sumden2)))
-
-            # For this subkey attempt, store the correlation of this subkey
-            # guess with the actual consumptions to compute guessing entropy.
-            self.subkey_corr_coeffs[subkey_byte_index][subkey_guess] = pcc
-
-            # Compare this subkey's correlation coeff with that of the others.
-            if (abs(pcc) > abs(best_subkey_pcc)):
-                best_subkey = subkey_guess
-                best_subkey_pcc = pcc
+            self.subkey_corr_coeffs[subkey_byte_index][subkey_guess] = \
+                pccs[subkey_guess]
+
+        best_subkey = int(np.argmax(pccs))
 
         subkey_guess_corr_coeffs = self.subkey_corr_coeffs[subkey_byte_index]
         sorted_coeffs = [
@@ -155,6 +158,31 @@ class Attacker:
         print(f"Top 10 subkeys for subbyte {subkey_byte_index}:\n{best_subkeys[:10]}")
         return best_subkey
 
+    def model_consumptions(self, traces_amnt, subkey_byte_index,
+                           plaintexts=None):
+        """Models the power consumption according to the leakage model for
+        each of the first `traces_amnt` plaintexts and each of the 2^8 subkey
+        guesses.
+
+        Arguments:
+            traces_amnt {int} -- The amount of traces (and thus plaintexts)
+            to model the consumption for.
+            subkey_byte_index {int} -- Integer to indicate which byte we're
+            inspecting in the given block.
+            plaintexts { [[int]] } -- The plaintexts to model the consumption
+            for. Defaults to the plaintexts given to this attacker.
+
+        Returns:
+            np.ndarray -- A (traces_amnt x 256) matrix of modeled consumptions.
+        """
+        if plaintexts is None:
+            plaintexts = self.plaintexts
+
+        subplaintexts = np.asarray(plaintexts)[:traces_amnt,
+                                               subkey_byte_index]
+
+        return self.power_modeler.hypotheses(subplaintexts)
+
     def pearson_correlation_coeff(self, actual_consumptions,
                                   modeled_consumptions):
         """Computes the Pearson Correlation Coefficient (PCC) between a set of
@@ -171,33 +199,14 @@ class Attacker:
             the encryption alg with a certain plaintext.
 
         Returns:
-            float -- The PCC between the given sets of power consumptions. The
-            value is in the range [-1, 1], where 1 means the actual
-            consumption always increases when the modeled consumption
-            increases, and -1 means they always decrease at the same time.
+            np.ndarray -- The PCC between the given sets of power consumptions
+            at each sample point. Each value is in the range [-1, 1], where 1
+            means the actual consumption always increases when the modeled
+            consumption increases, and -1 means they always decrease at the
+            same time.
         """
         # PCC = np.cov(AC, MC)/stddev(AC)*stddev(MC)
-        # (pcc, _) = pearsonr(actual_consumptions, modeled_consumptions)
-
-        # Initialize arrays &amp; variables to zero
-        numpoint = 5000
-        sumnum = np.zeros(numpoint)
-        sumden1 = np.zeros(numpoint)
-        sumden2 = np.zeros(numpoint)
-
-        # Mean of hypothesis
-        modeled_cons_mean = np.mean(modeled_consumptions, dtype=np.float64)
-
-        # Mean of all points in trace
-        meant = np.mean(actual_consumptions, axis=0, dtype=np.float64)
-
-        hdiff = (modeled_consumptions[tnum] - modeled_cons_mean)
-        tdiff = actual_consumptions[tnum, :] - meant
-
-        sumnum = sumnum + (hdiff*tdiff)
-        sumden1 = sumden1 + hdiff*hdiff
-        sumden2 = sumden2 + tdiff*tdiff
-
-        pcc = sumnum / np.sqrt(sumden1 * sumden2)
+        modeled_consumptions = np.reshape(modeled_consumptions, (-1, 1))
+        pcc = correlation_matrix(modeled_consumptions, actual_consumptions)
 
-        return pcc
+        return pcc[0]
@@ -0,0 +1,100 @@
+import numpy as np
+
+from power_consumption_modeler import PowerConsumptionModeler
+from streaming_attacker import StreamingAttacker
+
+
+class BinnedAttacker(StreamingAttacker):
+    PLAINTEXT_VALUES_AMNT = 256
+
+    def __init__(self, dtype=np.float64,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates a BinnedAttacker object, which executes the same
+        Correlation Power Analysis attack as a StreamingAttacker, but only
+        sorts the traces into one bin per value of each plaintext byte.
+
+        The hypothesis of a guess only depends on the plaintext byte, so all
+        traces in a bin share it. The sums of the correlation are therefore
+        the hypothesis table applied to the bins' trace counts and trace
+        sums, which turns the O(traces x 256 x samples) products of every
+        batch into O(traces x samples) bin sums plus O(256 x 256 x samples)
+        products per computation of the correlations.
+
+        Arguments:
+            dtype {np.dtype} -- The float type in which every batch is
+            processed. The bins are always accumulated in float64.
+            leakage_model {string} -- The name of the leakage model with which
+            to model the power consumption, see LEAKAGE_MODELS.
+        """
+        super().__init__(dtype=dtype, leakage_model=leakage_model)
+        self.hypothesis_table = \
+            self.power_modeler.hypothesis_table.astype(np.float64)
+
+    def reset(self):
+        """Discards the bins of all traces ingested so far."""
+        super().reset()
+        self.bin_counts = np.zeros((self.SUBKEYS_AMNT,
+                                    self.PLAINTEXT_VALUES_AMNT))
+        self.bin_sum_x = None  # Per subkey, plaintext byte value and sample
+
+    def update(self, power_samples, plaintexts):
+        """Adds a batch of traces to the bins of their plaintext bytes.
+
+        Arguments:
+            power_samples { [[float]] } -- A batch of power traces, each of
+            which is a list of floats for one plaintext encryption.
+            plaintexts { [[int]] } -- The 16-byte plaintexts belonging to the
+            given power traces.
+        """
+        power_samples = np.asarray(power_samples)
+        batch_size = len(power_samples)
+        if batch_size == 0:
+            return
+
+        if self.trace_offset is None:
+            samples_amnt = power_samples.shape[1]
+            self.trace_offset = power_samples.mean(axis=0, dtype=np.float64)
+            self.sum_x = np.zeros(samples_amnt)
+            self.sum_x2 = np.zeros(samples_amnt)
+            self.bin_sum_x = np.zeros((self.SUBKEYS_AMNT,
+                                       self.PLAINTEXT_VALUES_AMNT,
+                                       samples_amnt))
+
+        power_samples = power_samples.astype(self.dtype)
+        power_samples -= self.trace_offset.astype(self.dtype)
+        self.sum_x += power_samples.sum(axis=0, dtype=np.float64)
+        self.sum_x2 += np.einsum("ij,ij->j", power_samples, power_samples,
+                                 dtype=np.float64)
+
+        plaintexts = np.asarray(plaintexts, dtype=np.intp)
+        for subkey_nr in range(self.SUBKEYS_AMNT):
+            # Sorting the traces by plaintext byte makes every bin one
+            # contiguous run of rows, which can be summed in a single call.
+            values = plaintexts[:, subkey_nr]
+            order = np.argsort(values, kind="stable")
+            (bin_values, bin_starts, bin_sizes) = np.unique(
+                values[order], return_index=True, return_counts=True)
+
+            self.bin_counts[subkey_nr, bin_values] += bin_sizes
+            self.bin_sum_x[subkey_nr, bin_values] += np.add.reduceat(
+                power_samples[order], bin_starts, axis=0, dtype=np.float64)
+
+        self.traces_amnt += batch_size
+
+    def correlations(self, subkey_byte_index):
+        """Computes the correlation of every subkey guess with every sample
+        point from the bins of all traces ingested so far.
+
+        Arguments:
+            subkey_byte_index {int} -- Integer to indicate which byte we're
+            inspecting in the given block.
+
+        Returns:
+            np.ndarray -- A (256 x samples) matrix of correlation values.
+        """
+        counts = self.bin_counts[subkey_byte_index]
+        table = self.hypothesis_table
+
+        return self.correlations_from_sums(
+            counts @ table, counts @ (table * table),
+            table.T @ self.bin_sum_x[subkey_byte_index])
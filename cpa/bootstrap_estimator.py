@@ -0,0 +1,247 @@
+import numpy as np
+
+from attack_analyser import AttackAnalyser
+from correlation import safe_divide
+from power_consumption_modeler import PowerConsumptionModeler
+from streaming_attacker import StreamingAttacker
+from trace_source import DEFAULT_MEMORY_BUDGET
+
+
+def select_points_of_interest(trace_source, points_per_subkey,
+                              sample_steps=(1,), dtype=np.float64):
+    """Selects, for every subkey, the sample points of a TraceSource at which
+    any of its guesses correlates the most with the traces. No key is used,
+    but the selected points fit the noise of these traces, so bootstrap the
+    attack on other traces than the points were selected on. The sample
+    points of several sample steps are selected in the same pass, see
+    TraceSource.step_mask().
+
+    Arguments:
+        trace_source {TraceSource} -- The source of all traces to select the
+        points on.
+        points_per_subkey {int} -- The amount of sample points to select for
+        every subkey.
+        sample_steps {[int]} -- The factors by which to decimate the source's
+        sample points.
+        dtype {np.dtype} -- The float type to correlate in.
+
+    Returns:
+        { [int] } -- For every sample step, the sorted sample points of the
+        trace file that were selected for any subkey.
+    """
+    attacker = StreamingAttacker(dtype=dtype)
+    subkeys_amnt = attacker.SUBKEYS_AMNT
+    guesses_amnt = len(attacker.POSSIBLE_SUBKEYS)
+    bytes_per_sample = ((subkeys_amnt + 2) * guesses_amnt + 3) * 8
+
+    # The highest absolute correlation of any guess at every sample point.
+    scores = np.zeros((subkeys_amnt, trace_source.samples_amnt))
+    for sample_range in trace_source.sample_ranges(bytes_per_sample):
+        attacker.reset()
+        bytes_per_trace = (guesses_amnt + len(sample_range)) * \
+            np.dtype(dtype).itemsize
+        for (power_samples, plaintexts) in trace_source.batches(
+                sample_range, bytes_per_trace):
+            attacker.update(power_samples, plaintexts)
+
+        for subkey_nr in range(subkeys_amnt):
+            scores[subkey_nr, sample_range.start:sample_range.stop] = \
+                np.abs(attacker.correlations(subkey_nr)).max(axis=0)
+
+    points = {}
+    for step in sample_steps:
+        positions = np.flatnonzero(trace_source.step_mask(step))
+        best_positions = np.argsort(scores[:, positions], axis=1)[
+            :, ::-1][:, :points_per_subkey]
+        points[step] = np.unique(
+            trace_source.sample_points[positions[best_positions]])
+
+    return points
+
+
+class BootstrapEstimator:
+    SUBKEYS_AMNT = 16
+
+    def __init__(self, power_samples, plaintexts, dtype=np.float64,
+                 memory_budget=DEFAULT_MEMORY_BUDGET,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates a BootstrapEstimator object, which estimates the
+        distribution of the guessing entropy and success rates of a CPA
+        attack with a given amount of traces by resampling a population of
+        traces, instead of repeating the attack on fresh random subsets.
+
+        The per-trace contributions to the sums of the correlation, i.e. the
+        traces at the points of interest and their hypotheses, are computed
+        once. A resample is a vector of trace weights, so the sums of many
+        resamples follow from a few matrix products with these
+        contributions, without reading any trace again.
+
+        Arguments:
+            power_samples { [[float]] } -- The (traces x points) population of
+            traces, restricted to the points of interest.
+            plaintexts { [[int]] } -- The plaintexts of the population.
+            dtype {np.dtype} -- The float type of the matrix products.
+            memory_budget {int} -- The amount of bytes that the weighted
+            traces and the sums of the resamples of one product may take up.
+            leakage_model {string} -- The name of the leakage model with which
+            to model the power consumption, see LEAKAGE_MODELS.
+        """
+        power_modeler = PowerConsumptionModeler(leakage_model)
+        plaintexts = np.asarray(plaintexts)
+        self.dtype = dtype
+        self.memory_budget = memory_budget
+
+        # Centering on the population means keeps the sums of any resample
+        # small, which avoids cancellation in the correlations.
+        power_samples = np.asarray(power_samples, dtype=np.float64)
+        self.power_samples = \
+            (power_samples - power_samples.mean(axis=0)).astype(dtype)
+        self.hypotheses = []
+        for subkey_nr in range(self.SUBKEYS_AMNT):
+            hypotheses = power_modeler.hypotheses(plaintexts[:, subkey_nr])
+            hypotheses = hypotheses - hypotheses.mean(axis=0, dtype=np.float64)
+            self.hypotheses.append(hypotheses.astype(dtype))
+
+    def resample_weights(self, trace_amnt, resamples_amnt, rng,
+                         replace=True):
+        """Draws resamples of the population as trace weights.
+
+        Arguments:
+            trace_amnt {int} -- The amount of traces in every resample.
+            resamples_amnt {int} -- The amount of resamples.
+            rng {np.random.Generator} -- The random generator to draw with.
+            replace {bool} -- Whether to draw with replacement (bootstrap) or
+            without (subsampling).
+
+        Returns:
+            np.ndarray -- A (resamples x traces) matrix of the amount of times
+            that every trace is drawn.
+        """
+        population_size = len(self.power_samples)
+        if replace:
+            return rng.multinomial(
+                trace_amnt, np.full(population_size, 1 / population_size),
+                size=resamples_amnt).astype(np.float64)
+
+        weights = np.zeros((resamples_amnt, population_size))
+        for weights_row in weights:
+            weights_row[rng.choice(population_size, trace_amnt,
+                                   replace=False)] = 1
+        return weights
+
+    def resample_pccs(self, weights):
+        """Computes the PCC of every subkey guess of the attack on every
+        resample. The resamples are attacked in chunks, of which the
+        weighted traces and sums fit in the memory budget.
+
+        Arguments:
+            weights {np.ndarray} -- A (resamples x traces) matrix of trace
+            weights, see resample_weights().
+
+        Returns:
+            np.ndarray -- A (resamples x subkeys x 256) array of PCCs.
+        """
+        (traces_amnt, points_amnt) = self.power_samples.shape
+        guesses_amnt = self.hypotheses[0].shape[1]
+        # The weighted traces of one resample, and its sums of products and
+        # the numerators and denominators of its correlations.
+        bytes_per_resample = \
+            traces_amnt * points_amnt * np.dtype(self.dtype).itemsize + \
+            4 * guesses_amnt * points_amnt * 8
+        chunk_size = max(1, self.memory_budget // bytes_per_resample)
+
+        return np.concatenate([
+            self.resample_chunk_pccs(weights[start:start + chunk_size])
+            for start in range(0, len(weights), chunk_size)])
+
+    def resample_chunk_pccs(self, weights):
+        """Computes the PCC of every subkey guess of the attack on every
+        resample of a chunk at once.
+
+        Arguments:
+            weights {np.ndarray} -- A (resamples x traces) matrix of trace
+            weights, see resample_weights().
+
+        Returns:
+            np.ndarray -- A (resamples x subkeys x 256) array of PCCs.
+        """
+        (resamples_amnt, traces_amnt) = weights.shape
+        points_amnt = self.power_samples.shape[1]
+        n = weights.sum(axis=1)[:, np.newaxis]
+
+        x = self.power_samples
+        sum_x = weights @ x
+        sum_x2 = weights @ (x * x)
+        sumden2 = np.maximum(n * sum_x2 - sum_x * sum_x, 0)
+
+        # The weighted traces of all resamples side by side, so that the
+        # sums of products of every resample follow from one product.
+        weighted_traces = (weights.T.astype(self.dtype)[:, :, np.newaxis] *
+                           x[:, np.newaxis, :]).reshape(traces_amnt, -1)
+
+        pccs = np.zeros((resamples_amnt, self.SUBKEYS_AMNT,
+                         self.hypotheses[0].shape[1]))
+        for (subkey_nr, h) in enumerate(self.hypotheses):
+            sum_h = weights @ h
+            sum_h2 = weights @ (h * h)
+            sum_xh = (h.T @ weighted_traces).reshape(
+                -1, resamples_amnt, points_amnt).transpose(1, 0, 2)
+
+            sumnum = n[:, :, np.newaxis] * sum_xh - \
+                sum_h[:, :, np.newaxis] * sum_x[:, np.newaxis, :]
+            sumden1 = np.maximum(n * sum_h2 - sum_h * sum_h, 0)
+            sumden = sumden1[:, :, np.newaxis] * sumden2[:, np.newaxis, :]
+            pccs[:, subkey_nr] = np.abs(
+                safe_divide(sumnum, np.sqrt(sumden))).max(axis=2)
+
+        return pccs
+
+    def estimate(self, known_key, trace_amnt, resamples_amnt, rng,
+                 replace=True, confidence=0.95, batch_size=50):
+        """Estimates the guessing entropy, key success rate and subkey success
+        rate of the attack with a given amount of traces, with percentile
+        confidence intervals over the resamples.
+
+        Arguments:
+            known_key {[int]} -- The full, actual secret key as a list of ints.
+            trace_amnt {int} -- The amount of traces of the attack.
+            resamples_amnt {int} -- The amount of resamples.
+            rng {np.random.Generator} -- The random generator to draw with.
+            replace {bool} -- Whether to draw with replacement (bootstrap) or
+            without (subsampling).
+            confidence {float} -- The confidence level of the intervals.
+            batch_size {int} -- The amount of resamples to attack at once.
+
+        Returns:
+            { float } -- The mean 'GE', 'KEY_SR' and 'SUBKEY_SR', each with
+            its interval bounds as e.g. 'GE_LOW' and 'GE_HIGH'.
+        """
+        analyser = AttackAnalyser()
+        guessing_entropies = []
+        key_success_rates = []
+        subkey_success_rates = []
+        for start in range(0, resamples_amnt, batch_size):
+            weights = self.resample_weights(
+                trace_amnt, min(batch_size, resamples_amnt - start), rng,
+                replace)
+            pccs = self.resample_pccs(weights)
+
+            partial_guessing_entropies = \
+                analyser.compute_guessing_entropies(known_key, pccs)
+            ge = partial_guessing_entropies.mean(axis=1)
+            guessing_entropies.append(ge)
+            key_success_rates.append((ge == 0).astype(float))
+            subkey_success_rates.append(
+                (pccs.argmax(axis=2) == known_key).mean(axis=1))
+
+        alpha = (1 - confidence) / 2
+        estimates = {}
+        for (name, values) in [('GE', guessing_entropies),
+                               ('KEY_SR', key_success_rates),
+                               ('SUBKEY_SR', subkey_success_rates)]:
+            values = np.concatenate(values)
+            estimates[name] = values.mean()
+            estimates[f"{name}_LOW"] = np.quantile(values, alpha)
+            estimates[f"{name}_HIGH"] = np.quantile(values, 1 - alpha)
+
+        return estimates
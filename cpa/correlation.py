@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def correlation_matrix(hypotheses, traces, dtype=np.float64):
+    """Computes Pearson's correlation coefficient between every column of a
+    hypothesis matrix and every sample point of a trace matrix at once. Both
+    matrices are centered column-wise, after which all correlations follow
+    from a single matrix product.
+
+    Arguments:
+        hypotheses {np.ndarray} -- A (traces x guesses) matrix that holds the
+        modeled power consumption of every trace for every subkey guess.
+        traces {np.ndarray} -- A (traces x samples) matrix of the actual
+        power consumption traces.
+        dtype {np.dtype} -- The float type of the matrix product.
+
+    Returns:
+        np.ndarray -- A (guesses x samples) matrix of correlation values in
+        the range [-1, 1]. Guesses or samples without any variance get a
+        correlation of 0.
+    """
+    # Equivalent to sumnum / np.sqrt(sumden1 * sumden2) of the trace-by-trace
+    # loop, but computed for all guesses and samples in one go.
+    return normalize_columns(hypotheses, dtype).T @ \
+        normalize_columns(traces, dtype)
+
+
+def normalize_columns(matrix, dtype=np.float64):
+    """Centers every column of a matrix and scales it to unit norm, so that
+    the correlation between two normalized columns is their dot product.
+    Normalizing the trace matrix once lets it be shared by any amount of
+    hypotheses, e.g. those of all 16 key bytes.
+
+    The matrix may be of any numeric type, e.g. the int8 samples of the
+    scope, and is converted to the given float type without a float64 copy.
+    The means and norms are always accumulated in float64, so that a float32
+    result only loses precision in its final rounding.
+
+    Arguments:
+        matrix {np.ndarray} -- A (traces x columns) matrix of either modeled
+        or actual power consumptions.
+        dtype {np.dtype} -- The float type of the normalized matrix.
+
+    Returns:
+        np.ndarray -- The normalized matrix. Columns without any variance are
+        all zeros.
+    """
+    matrix = np.asarray(matrix)
+    means = matrix.mean(axis=0, dtype=np.float64)
+
+    centered = matrix.astype(dtype)
+    centered -= means.astype(dtype)
+    norms = np.sqrt(np.einsum("ij,ij->j", centered, centered,
+                              dtype=np.float64)).astype(dtype)
+
+    # A column with a norm of 0 is all zeros already, so it is left as is.
+    np.divide(centered, norms, out=centered, where=norms != 0)
+    return centered
+
+
+def safe_divide(numerator, denominator):
+    """Divides two arrays element-wise, yielding 0 wherever the denominator
+    is 0 instead of a NaN or an infinity.
+
+    Arguments:
+        numerator {np.ndarray} -- The array of numerators.
+        denominator {np.ndarray} -- The array of denominators, broadcastable
+        against the numerator.
+
+    Returns:
+        np.ndarray -- The element-wise quotient.
+    """
+    numerator, denominator = np.broadcast_arrays(numerator, denominator)
+    result = np.zeros(numerator.shape, dtype=np.result_type(numerator, 1.0))
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def max_abs_correlations(correlations):
+    """Reduces a (guesses x samples) correlation matrix to the highest
+    absolute correlation of each guess, which is the score used to rank
+    subkey guesses.
+
+    Arguments:
+        correlations {np.ndarray} -- A (guesses x samples) correlation matrix.
+
+    Returns:
+        np.ndarray -- The maximum absolute correlation of each guess.
+    """
+    return np.abs(correlations).max(axis=-1)
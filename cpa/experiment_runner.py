@@ -0,0 +1,190 @@
+import hashlib
+import itertools
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+
+def run_cell_task(task):
+    """Runs one cell of an experiment grid, which is a top-level function so
+    that it can be sent to a worker process.
+
+    Arguments:
+        task {(function, {}, int)} -- The cell function, the cell's parameters
+        and the seed of its random generator.
+
+    Returns:
+        ({}, [{}]) -- The cell's parameters and the result rows of the cell.
+    """
+    (run_cell, cell, seed) = task
+    rows = run_cell(cell, np.random.default_rng(seed))
+
+    return (cell, rows)
+
+
+class ExperimentRunner:
+    def __init__(self, grid, run_cell, checkpoint_dir, workers=1, seed=42,
+                 seed_params=None, config=None):
+        """Initiates an ExperimentRunner object, which runs an experiment for
+        every cell of a grid of parameters. Every finished cell is stored in
+        the checkpoint directory right away, and cells that are already
+        stored there are skipped, so that an interrupted run can simply be
+        started again.
+
+        Every cell gets its own random generator, of which the seed only
+        depends on the cell's parameters. The results are thus the same,
+        bit for bit, whether the cells are run serially or in parallel, in
+        whichever order they finish and in whichever grid they are part of.
+
+        Every stored cell holds a hash of everything its results depend on:
+        its parameters, the seeds and the given config. Cells that were
+        stored with another configuration are run again, so that a changed
+        experiment never reuses stale results, while the cells of a grid
+        that only grew are reused.
+
+        Arguments:
+            grid { {string: []} } -- The values of every parameter, of which
+            every combination is one cell. The parameter values must be
+            JSON serializable.
+            run_cell {function} -- The top-level function that runs one cell.
+            It is called with a dict of the cell's parameters and a
+            np.random.Generator, and returns a list of result row dicts.
+            checkpoint_dir {string} -- The directory to store the results of
+            every finished cell in.
+            workers {int} -- The amount of worker processes to run the cells
+            on. With 1, the cells are run in this process.
+            seed {int} -- The seed from which the seeds of all cells follow.
+            seed_params {[string]} -- The parameters that the seed of a cell
+            depends on. Cells that only differ in the other parameters share
+            their random numbers, e.g. to use the same traces for every
+            sample step. Defaults to all parameters.
+            config {{}} -- Any other JSON serializable values that the results
+            depend on, such as the hash of the trace file and the constants
+            of the experiment.
+        """
+        self.grid = grid
+        self.run_cell = run_cell
+        self.checkpoint_dir = checkpoint_dir
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.seed_params = list(grid) if seed_params is None else seed_params
+        self.config = {} if config is None else config
+
+    def cell_hash(self, cell):
+        """Hashes everything that the results of a cell depend on, besides
+        the cell function itself.
+
+        Arguments:
+            cell {{}} -- The parameters of the cell.
+
+        Returns:
+            string -- The SHA-256 hex digest of the cell's configuration.
+        """
+        config = {"cell": cell, "seed": self.seed,
+                  "seed_params": self.seed_params, "config": self.config}
+        encoded = json.dumps(config, sort_keys=True,
+                             default=lambda value: value.item())
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def cells(self):
+        """Lists the cells of the grid, in the order of the grid's values.
+
+        Returns:
+            [{}] -- The parameters of every cell.
+        """
+        return [dict(zip(self.grid, values))
+                for values in itertools.product(*self.grid.values())]
+
+    def cell_seed(self, cell):
+        """Derives the seed of a cell from its values of the seed parameters,
+        so that it does not change when the grid grows.
+
+        Arguments:
+            cell {{}} -- The parameters of the cell.
+
+        Returns:
+            int -- The seed of the cell's random generator.
+        """
+        value_hashes = []
+        for param in self.seed_params:
+            encoded = json.dumps(cell[param],
+                                 default=lambda value: value.item())
+            digest = hashlib.sha256(encoded.encode()).hexdigest()
+            value_hashes.append(int(digest[:8], 16))
+        seed_sequence = np.random.SeedSequence(self.seed,
+                                               spawn_key=tuple(value_hashes))
+        return int(seed_sequence.generate_state(1)[0])
+
+    def cell_file(self, cell):
+        name = "_".join(f"{param}={value}" for (param, value) in cell.items())
+        return os.path.join(self.checkpoint_dir, f"{name}.json")
+
+    def store_cell(self, cell, rows):
+        """Stores the result rows of a finished cell. The file is written
+        under a temporary name first, so that an interrupted write never
+        leaves a cell that looks finished.
+
+        Arguments:
+            cell {{}} -- The parameters of the cell.
+            rows {[{}]} -- The result rows of the cell.
+        """
+        cell_file = self.cell_file(cell)
+        with open(f"{cell_file}.tmp", "w") as f:
+            json.dump({"cell_hash": self.cell_hash(cell), "rows": rows}, f,
+                      default=lambda value: value.item())
+        os.replace(f"{cell_file}.tmp", cell_file)
+
+    def load_cell(self, cell):
+        """Loads the result rows of a stored cell.
+
+        Arguments:
+            cell {{}} -- The parameters of the cell.
+
+        Returns:
+            [{}] -- The result rows of the cell, or None if the cell was not
+            stored with the same configuration.
+        """
+        cell_file = self.cell_file(cell)
+        if not os.path.exists(cell_file):
+            return None
+        with open(cell_file) as f:
+            stored = json.load(f)
+        if not isinstance(stored, dict) or \
+                stored.get("cell_hash") != self.cell_hash(cell):
+            return None
+        return stored["rows"]
+
+    def run(self):
+        """Runs every cell of the grid that has not been stored yet.
+
+        Returns:
+            pd.DataFrame -- The result rows of all cells, in the order of the
+            cells in the grid.
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        cells = self.cells()
+        tasks = [(self.run_cell, cell, self.cell_seed(cell))
+                 for cell in cells
+                 if self.load_cell(cell) is None]
+        print(f"Running {len(tasks)} of {len(cells)} cells, the others have "
+              f"already finished...")
+
+        if self.workers == 1:
+            finished_cells = map(run_cell_task, tasks)
+            self.store_cells(finished_cells, len(tasks))
+        else:
+            with Pool(self.workers) as pool:
+                finished_cells = pool.imap_unordered(run_cell_task, tasks)
+                self.store_cells(finished_cells, len(tasks))
+
+        return pd.DataFrame([row
+                             for cell in cells
+                             for row in self.load_cell(cell)])
+
+    def store_cells(self, finished_cells, cells_amnt):
+        for (i, (cell, rows)) in enumerate(finished_cells):
+            self.store_cell(cell, rows)
+            print(f"Finished cell {i + 1}/{cells_amnt}: {cell}")
@@ -0,0 +1,230 @@
+# Shared with the template attack code in ta/, so this module may only import
+# numpy and modules of cpa/ that do the same.
+import time
+
+import numpy as np
+
+import aes128
+
+# The first bytes are enumerated one by one, the last two together through a
+# sorted table of all their 2^16 pairs.
+PREFIX_BYTES = 14
+# Every band of scores holds at most this many batches of keys. Larger bands
+# are found in fewer searches, but take more memory to sort.
+BAND_BATCHES = 16
+
+
+class KeyEnumerator:
+    def __init__(self, scores, batch_size=2 ** 16):
+        """Initiates a KeyEnumerator object, which walks the full keys in
+        decreasing order of their score, the sum of the scores of their
+        subkeys, so that keys of which a few subkeys were ranked low by an
+        attack can still be recovered by brute force.
+
+        The keys are enumerated in bands of scores. Every band is found by a
+        breadth first search, which extends all prefixes of subkeys by one
+        byte at once and drops every prefix that cannot reach the band, and
+        is sorted before its keys are handed out.
+        The width of the bands adapts, so that every band holds at most a few
+        batches of keys.
+
+        Arguments:
+            scores {np.ndarray} -- A (16 x 256) array of the score of every
+            subkey guess, which add up over the subkeys, such as TA
+            log-likelihoods or compute_correlation_scores() of CPA PCCs. The
+            nested dictionaries of an Attacker's subkey_corr_coeffs are
+            accepted as well.
+            batch_size {int} -- The amount of keys to verify at once.
+        """
+        if isinstance(scores, dict):
+            scores = [[scores[subkey_nr][guess] for guess in range(256)]
+                      for subkey_nr in range(16)]
+        scores = np.asarray(scores, dtype=np.float64)
+        # A log-likelihood of -inf (a probability of 0) counts as the lowest
+        # finite score, so that those keys are still enumerated last.
+        scores = np.maximum(scores, scores[np.isfinite(scores)].min())
+        self.batch_size = batch_size
+
+        self.guesses = np.argsort(-scores, axis=1, kind="stable")
+        self.sorted_scores = np.take_along_axis(scores, self.guesses, axis=1)
+
+        pair_scores = (self.sorted_scores[PREFIX_BYTES][:, np.newaxis] +
+                       self.sorted_scores[PREFIX_BYTES + 1][np.newaxis, :])
+        pair_order = np.argsort(-pair_scores.ravel(), kind="stable")
+        self.pair_scores = pair_scores.ravel()[pair_order]
+        self.pair_guesses = np.stack(
+            [self.guesses[PREFIX_BYTES][pair_order // 256],
+             self.guesses[PREFIX_BYTES + 1][pair_order % 256]], axis=1)
+
+        # The best and worst score that the subkeys from every byte on can
+        # add to a key.
+        self.best_remaining = np.append(
+            np.cumsum(self.sorted_scores[:PREFIX_BYTES, 0][::-1])[::-1],
+            0) + self.pair_scores[0]
+        self.worst_remaining = np.append(
+            np.cumsum(self.sorted_scores[:PREFIX_BYTES, -1][::-1])[::-1],
+            0) + self.pair_scores[-1]
+
+        self.keys_tested = 0
+        self.keys_per_second = 0.0
+
+    def band_leaves(self, lower, upper):
+        """Finds the keys with a score in [lower, upper) through a breadth
+        first search over the ranks of the prefix subkeys, which extends all
+        prefixes by one byte at once and drops every prefix that cannot
+        reach the band. The subkeys of a byte are sorted, so the extensions
+        of a prefix that fall in the band are one range of ranks.
+
+        Arguments:
+            lower {float} -- The lowest score of the band.
+            upper {float} -- The score above the band.
+
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -- The subkeys of
+            every complete prefix, their scores and the range of the pair
+            table that completes every prefix into the band.
+        """
+        scores = np.zeros(1)
+        # The parent prefix and the subkey of every prefix of every length.
+        parents = []
+        subkeys = []
+
+        for byte_nr in range(PREFIX_BYTES + 1):
+            if byte_nr == PREFIX_BYTES:
+                (best, worst) = (0, 0)
+                negated_scores = -self.pair_scores
+            else:
+                best = self.best_remaining[byte_nr + 1]
+                worst = self.worst_remaining[byte_nr + 1]
+                negated_scores = -self.sorted_scores[byte_nr]
+            # Extensions that score too high were handed out in an earlier
+            # band, extensions that score too low come in a later one.
+            starts = np.searchsorted(negated_scores, scores + worst - upper,
+                                     side="right")
+            ends = np.searchsorted(negated_scores, scores + best - lower,
+                                   side="right")
+            if byte_nr == PREFIX_BYTES:
+                break
+
+            counts = ends - starts
+            prefix_parents = np.repeat(np.arange(len(scores)), counts)
+            offsets = np.cumsum(counts) - counts
+            extensions = starts[prefix_parents] + \
+                np.arange(len(prefix_parents)) - offsets[prefix_parents]
+            scores = scores[prefix_parents] + \
+                self.sorted_scores[byte_nr][extensions]
+            parents.append(prefix_parents)
+            subkeys.append(self.guesses[byte_nr][extensions].astype(np.uint8))
+
+        in_band = np.flatnonzero(ends > starts)
+        prefixes = np.empty((len(in_band), PREFIX_BYTES), dtype=np.uint8)
+        prefix_indices = in_band
+        for byte_nr in reversed(range(PREFIX_BYTES)):
+            prefixes[:, byte_nr] = subkeys[byte_nr][prefix_indices]
+            prefix_indices = parents[byte_nr][prefix_indices]
+
+        return (prefixes, scores[in_band], starts[in_band], ends[in_band])
+
+    def leaf_keys(self, leaves, key_indices):
+        """Assembles keys of a band, which are numbered by their prefix and
+        then by their position in the pair table.
+
+        Arguments:
+            leaves {(np.ndarray)} -- The prefixes of the band, as given by
+            band_leaves().
+            key_indices {np.ndarray} -- The numbers of the keys to assemble.
+
+        Returns:
+            (np.ndarray, np.ndarray) -- A (keys x 16) uint8 array of the keys
+            and an array of their scores.
+        """
+        (prefix_subkeys, scores, starts, ends) = leaves
+        key_offsets = np.cumsum(ends - starts)
+        prefixes = np.searchsorted(key_offsets, key_indices, side="right")
+        pairs = ends[prefixes] - key_offsets[prefixes] + key_indices
+
+        keys = np.empty((len(key_indices), 16), dtype=np.uint8)
+        keys[:, :PREFIX_BYTES] = prefix_subkeys[prefixes]
+        keys[:, PREFIX_BYTES:] = self.pair_guesses[pairs]
+
+        return (keys, scores[prefixes] + self.pair_scores[pairs])
+
+    def candidates(self):
+        """Enumerates all keys in decreasing order of their score.
+
+        Yields:
+            (np.ndarray, np.ndarray) -- Batches of at most batch_size keys, as
+            a (keys x 16) uint8 array, and their scores.
+        """
+        best_score = self.best_remaining[0]
+        worst_score = self.worst_remaining[0]
+        # Keys with scores this close together are handed out unsorted, which
+        # only happens for ties beyond the precision of the scores.
+        min_width = 1e-9 * max(1.0, abs(best_score), abs(worst_score))
+        width = max((best_score - worst_score) / 2 ** 16, min_width)
+        upper = np.inf
+
+        while upper > worst_score - min_width:
+            lower = min(upper, best_score) - width
+            leaves = self.band_leaves(lower, upper)
+            (_, _, starts, ends) = leaves
+            keys_amnt = int((ends - starts).sum())
+
+            if keys_amnt > BAND_BATCHES * self.batch_size and \
+                    width > min_width:
+                width = max(width / 4, min_width)
+                continue
+
+            if keys_amnt > BAND_BATCHES * self.batch_size:
+                # The band cannot be narrowed any further, so it is handed out
+                # unsorted.
+                for i in range(0, keys_amnt, self.batch_size):
+                    yield self.leaf_keys(
+                        leaves, np.arange(i, min(i + self.batch_size,
+                                                 keys_amnt)))
+            else:
+                (keys, scores) = self.leaf_keys(leaves, np.arange(keys_amnt))
+                order = np.argsort(-scores, kind="stable")
+                for i in range(0, keys_amnt, self.batch_size):
+                    batch = order[i:i + self.batch_size]
+                    yield (keys[batch], scores[batch])
+
+            if keys_amnt < BAND_BATCHES * self.batch_size // 4:
+                width *= 2
+            upper = lower
+
+    def search(self, plaintext, ciphertext, budget=2 ** 24):
+        """Verifies the keys in decreasing order of their score against a
+        known plaintext and ciphertext, until the key is found or the budget
+        runs out. The amount of tested keys and the throughput in keys per
+        second are kept in keys_tested and keys_per_second.
+
+        Arguments:
+            plaintext {[int]} -- A known plaintext of 16 bytes.
+            ciphertext {[int]} -- The ciphertext of the plaintext under the
+            unknown key.
+            budget {int} -- The maximal amount of keys to test.
+
+        Returns:
+            [int] -- The key that encrypts the plaintext to the ciphertext, or
+            None if it is not among the tested keys.
+        """
+        ciphertext = np.asarray(ciphertext, dtype=np.uint8)
+        start_time = time.perf_counter()
+        self.keys_tested = 0
+        found_key = None
+
+        for (keys, _) in self.candidates():
+            keys = keys[:budget - self.keys_tested]
+            matches = np.all(aes128.encrypt(plaintext, keys) == ciphertext,
+                             axis=1)
+            self.keys_tested += len(keys)
+            if matches.any():
+                found_key = [int(b) for b in keys[np.argmax(matches)]]
+                break
+            if self.keys_tested >= budget:
+                break
+
+        elapsed = time.perf_counter() - start_time
+        self.keys_per_second = self.keys_tested / elapsed if elapsed else 0.0
+        return found_key
@@ -0,0 +1,79 @@
+import numpy as np
+
+from aes128 import INV_SBOX, SHIFT_ROWS_SOURCES, invert_key_schedule
+from attacker import Attacker
+from power_consumption_modeler import HAMM_WEIGHTS
+
+
+class LastRoundAttacker(Attacker):
+    def __init__(self, ciphertexts, dtype=np.float64):
+        """Initiates a LastRoundAttacker object, which executes a Correlation
+        Power Analysis attack on the last round of AES128 using the obtained
+        ciphertexts instead of the plaintexts. It recovers the last round key
+        and from it the master key, which is a second attack path on the same
+        traces that does not depend on the first round attack.
+
+        The power consumption is modeled as the Hamming distance between the
+        state before the last SubBytes and the ciphertext that overwrites it.
+        The state byte that becomes ciphertext byte i is the inverse Sbox of
+        that byte XOR the guessed last round key byte, and it is overwritten
+        by the ciphertext byte that ShiftRows moves away from its position.
+
+        Arguments:
+            ciphertexts { [[int]] } -- The ciphertexts produced by encrypting
+            the plaintexts of the traces, as 16 integers each.
+            dtype {np.dtype} -- The float type to correlate in.
+        """
+        super().__init__(plaintexts=None, dtype=dtype)
+        self.ciphertexts = ciphertexts
+
+        # The state byte before the last SubBytes for every combination of a
+        # ciphertext byte and a key guess.
+        self.inv_sbox_table = np.asarray(INV_SBOX)[
+            np.bitwise_xor.outer(np.arange(256), np.arange(256))]
+
+    def model_consumptions(self, traces_amnt, subkey_byte_index,
+                           ciphertexts=None):
+        """Models the power consumption of the last round for each of the
+        first `traces_amnt` ciphertexts and each of the 2^8 guesses of the
+        last round key byte.
+
+        Arguments:
+            traces_amnt {int} -- The amount of traces (and thus ciphertexts)
+            to model the consumption for.
+            subkey_byte_index {int} -- Integer to indicate which byte of the
+            last round key we're inspecting.
+            ciphertexts { [[int]] } -- The ciphertexts to model the
+            consumption for. Defaults to the ciphertexts given to this
+            attacker.
+
+        Returns:
+            np.ndarray -- A (traces_amnt x 256) matrix of modeled consumptions.
+        """
+        if ciphertexts is None:
+            ciphertexts = self.ciphertexts
+
+        ciphertexts = np.asarray(ciphertexts, dtype=np.intp)[:traces_amnt]
+        state_before = self.inv_sbox_table[ciphertexts[:, subkey_byte_index]]
+        overwriting_byte = \
+            ciphertexts[:, SHIFT_ROWS_SOURCES[subkey_byte_index]]
+
+        return HAMM_WEIGHTS[state_before ^ overwriting_byte[:, np.newaxis]]
+
+    def obtain_master_key(self, power_samples):
+        """Computes the full private key used in AES128 by computing each of
+        the 16 bytes of the last round key and inverting the key schedule.
+
+        Arguments:
+            power_samples { [[float]] } - A list of power traces where each
+            trace is a list of floats that represents the obtained output
+            for one encryption.
+
+        Returns:
+            [int] -- The full 128-bit master key as a list of 16 integers.
+        """
+        last_round_key = self.obtain_full_private_key(power_samples)
+        master_key = invert_key_schedule(last_round_key)
+        print(f"Last round key {last_round_key} gives master key {master_key}")
+
+        return master_key
@@ -1,4 +1,189 @@
+import numpy as np
+
+from correlation import safe_divide
+from power_consumption_modeler import PowerConsumptionModeler
+
+
+def windows_from_scores(scores, fraction=0.1, margin=100):
+    """Finds the windows of sample points that leak the most. These are the
+    highest scoring fraction of the sample points, each widened by a margin
+    on both sides, after which overlapping windows are merged.
+
+    Arguments:
+        scores {np.ndarray} -- The score of each sample point, e.g. of
+        OperationLocator.scores(), where a higher score means more leakage.
+        fraction {float} -- The fraction of the sample points to select
+        before widening them.
+        margin {int} -- The amount of sample points by which to widen every
+        selected sample point on both sides.
+
+    Returns:
+        [(int, int)] -- The sorted, disjoint windows as (start, end) tuples,
+        which can be used as slices of the traces.
+    """
+    selected_amnt = max(1, int(round(fraction * len(scores))))
+    selected = np.argsort(scores)[::-1][:selected_amnt]
+
+    windows = []
+    for point in np.sort(selected):
+        start = max(0, int(point) - margin)
+        end = min(len(scores), int(point) + margin + 1)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+
+    return windows
+
+
 class OperationLocator:
+    METHODS = ("snr", "variance", "correlation")
+
+    # The classes of the SNR are the values of the plaintext bytes, which do
+    # not depend on the key. Under a fixed key, every intermediate of one
+    # plaintext byte, such as the SubBytes output, is a function of it, so
+    # the classes separate the leakage of any such intermediate.
+    CLASSES_AMNT = 256
+    SUBKEYS_AMNT = 16
+    # The statistics take up this many bytes per sample point, so long
+    # traces are best located in ranges of sample points, see
+    # TraceSource.sample_ranges().
+    BYTES_PER_SAMPLE = (SUBKEYS_AMNT * CLASSES_AMNT + 2) * 8
+
+    def __init__(self, method="snr",
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates an OperationLocator object, which finds the windows of
+        sample points in which the traces leak information about the
+        processed data, so that the attack can be restricted to them.
+
+        Every sample point is scored in a single vectorized pass over the
+        traces, which may be given in batches. No method uses the key:
+        - "snr": the highest signal-to-noise ratio of the sample point with
+          respect to the value of any plaintext byte.
+        - "variance": the variance of the sample point over all traces.
+        - "correlation": the highest absolute correlation of the sample
+          point with the leakage model of any plaintext byte under any
+          subkey guess, as in the attack itself.
+
+        Both "snr" and "correlation" are computed from the sums of the traces
+        per plaintext byte value, which take up BYTES_PER_SAMPLE bytes per
+        sample point.
+
+        Arguments:
+            method {string} -- The method by which to score sample points.
+            leakage_model {string} -- The name of the leakage model of the
+            "correlation" method, see LEAKAGE_MODELS.
+
+        Raises:
+            ValueError -- This error is raised when the given method is not
+            one of METHODS.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method {method}, choose one of "
+                             f"{self.METHODS}.")
+
+        self.method = method
+        self.power_modeler = PowerConsumptionModeler(leakage_model)
+        self.traces_amnt = 0
+        self.trace_offset = None
+        self.sum_x = None  # Per sample
+        self.sum_x2 = None  # Per sample
+        self.class_counts = np.zeros((self.SUBKEYS_AMNT, self.CLASSES_AMNT))
+        self.class_sum_x = None  # Per subkey, class and sample
+
+    def update(self, power_samples, plaintexts):
+        """Adds a batch of traces and their plaintexts to the statistics of
+        the sample point scores.
+
+        Arguments:
+            power_samples { [[float]] } -- A batch of power traces.
+            plaintexts { [[int]] } -- The 16-byte plaintexts belonging to the
+            given power traces.
+        """
+        power_samples = np.asarray(power_samples)
+        if len(power_samples) == 0:
+            return
+
+        if self.trace_offset is None:
+            samples_amnt = power_samples.shape[1]
+            self.trace_offset = power_samples.mean(axis=0, dtype=np.float64)
+            self.sum_x = np.zeros(samples_amnt)
+            self.sum_x2 = np.zeros(samples_amnt)
+            self.class_sum_x = np.zeros((self.SUBKEYS_AMNT, self.CLASSES_AMNT,
+                                         samples_amnt))
+
+        power_samples = power_samples - self.trace_offset
+        self.sum_x += power_samples.sum(axis=0)
+        self.sum_x2 += np.einsum("ij,ij->j", power_samples, power_samples)
+
+        # (traces x subkeys) values of the plaintext bytes.
+        classes = np.asarray(plaintexts, dtype=np.intp)[:, :16]
+        for subkey_nr in range(self.SUBKEYS_AMNT):
+            # One-hot class membership turns the class sums into a product.
+            membership = np.zeros((len(power_samples), self.CLASSES_AMNT))
+            membership[np.arange(len(power_samples)),
+                       classes[:, subkey_nr]] = 1
+            self.class_counts[subkey_nr] += membership.sum(axis=0)
+            self.class_sum_x[subkey_nr] += membership.T @ power_samples
+
+        self.traces_amnt += len(power_samples)
+
+    def scores(self):
+        """Scores every sample point with the method of this locator, using
+        the statistics of all traces ingested so far.
+
+        Returns:
+            np.ndarray -- The score of each sample point, where a higher
+            score means more leakage.
+        """
+        n = self.traces_amnt
+        mean = self.sum_x / n
+        variance = np.maximum(self.sum_x2 / n - mean * mean, 0)
+
+        if self.method == "variance":
+            return variance
+
+        scores = np.zeros(len(mean))
+        # The hypotheses are functions of the plaintext byte, so their sums
+        # over the traces follow from the sums per plaintext byte value.
+        table = self.power_modeler.hypothesis_table.astype(np.float64)
+        for subkey_nr in range(self.SUBKEYS_AMNT):
+            counts = self.class_counts[subkey_nr]
+            class_sum_x = self.class_sum_x[subkey_nr]
+
+            if self.method == "snr":
+                class_means = safe_divide(class_sum_x,
+                                          counts[:, np.newaxis])
+                signal = ((counts[:, np.newaxis] / n) *
+                          (class_means - mean) ** 2).sum(axis=0)
+                noise = np.maximum(variance - signal, 0)
+                subkey_scores = safe_divide(signal, noise)
+            else:
+                sum_h = counts @ table
+                sum_h2 = counts @ (table * table)
+                sum_xh = table.T @ class_sum_x
+                sumnum = n * sum_xh - np.outer(sum_h, self.sum_x)
+                sumden1 = np.maximum(n * sum_h2 - sum_h * sum_h, 0)
+                sumden2 = n * n * variance
+                correlations = safe_divide(
+                    sumnum, np.sqrt(np.outer(sumden1, sumden2)))
+                subkey_scores = np.abs(correlations).max(axis=0)
+            scores = np.maximum(scores, subkey_scores)
+
+        return scores
+
+    def locate_windows(self, fraction=0.1, margin=100):
+        """Finds the windows of sample points that leak the most, see
+        windows_from_scores().
+
+        Arguments:
+            fraction {float} -- The fraction of the sample points to select
+            before widening them.
+            margin {int} -- The amount of sample points by which to widen
+            every selected sample point on both sides.
 
-    def __init__(self):
-        pass
\ No newline at end of file
+        Returns:
+            [(int, int)] -- The sorted, disjoint windows as (start, end)
+            tuples, which can be used as slices of the traces.
+        """
+        return windows_from_scores(self.scores(), fraction, margin)
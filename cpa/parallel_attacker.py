@@ -0,0 +1,208 @@
+import os
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from attacker import Attacker
+from correlation import max_abs_correlations, normalize_columns
+from power_consumption_modeler import PowerConsumptionModeler
+
+# The state of a worker process, set once by init_worker() so that the trace
+# and hypothesis matrices are attached to instead of pickled along with every
+# task.
+worker_state = {}
+
+
+def init_worker(shm_name, traces_shape, hypotheses_shape, dtype):
+    """Attaches a worker process to the shared buffer, which holds the trace
+    matrix followed by the normalized hypotheses of every subkey.
+
+    Arguments:
+        shm_name {string} -- The name of the shared memory block.
+        traces_shape {(int, int)} -- The (traces x samples) shape of the
+        trace matrix.
+        hypotheses_shape {(int, int, int)} -- The (subkeys x traces x 256)
+        shape of the hypotheses.
+        dtype {np.dtype} -- The float type of the buffer.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    worker_state["shm"] = shm
+    traces = np.ndarray(traces_shape, dtype=dtype, buffer=shm.buf)
+    worker_state["traces"] = traces
+    worker_state["hypotheses"] = np.ndarray(hypotheses_shape, dtype=dtype,
+                                            buffer=shm.buf,
+                                            offset=traces.nbytes)
+
+
+def normalize_shard(sample_range):
+    """Centers and normalizes a range of sample points of the shared trace
+    buffer in place.
+
+    Arguments:
+        sample_range {(int, int)} -- The first and end sample point.
+
+    Returns:
+        (int, float) -- The worker's process id and the elapsed time.
+    """
+    start_time = time.perf_counter()
+    traces = worker_state["traces"]
+    (start, end) = sample_range
+    traces[:, start:end] = normalize_columns(traces[:, start:end],
+                                             traces.dtype)
+
+    return (os.getpid(), time.perf_counter() - start_time)
+
+
+def attack_shard(task):
+    """Computes the PCCs of all 256 subkey guesses of one subkey over one
+    range of sample points of the shared, normalized trace buffer, as one
+    product with the subkey's shared, normalized hypotheses.
+
+    Arguments:
+        task {(int, (int, int))} -- The subkey's byte index and the first
+        and end sample point.
+
+    Returns:
+        (int, np.ndarray, int, float) -- The subkey's byte index, the PCC of
+        each guess over the range, the worker's process id and the elapsed
+        time.
+    """
+    start_time = time.perf_counter()
+    (subkey_nr, (start, end)) = task
+    traces = worker_state["traces"]
+    hypotheses = worker_state["hypotheses"][subkey_nr]
+
+    pccs = max_abs_correlations(hypotheses.T @ traces[:, start:end])
+
+    return (subkey_nr, pccs, os.getpid(), time.perf_counter() - start_time)
+
+
+class ParallelAttacker(Attacker):
+    def __init__(self, plaintexts, workers=None, sample_shards=1,
+                 dtype=np.float64,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates a ParallelAttacker object, which executes the same
+        Correlation Power Analysis attack as an Attacker on a pool of worker
+        processes. The traces and the normalized hypotheses of every key
+        byte are put in shared memory once, and every worker attacks one key
+        byte over one shard of the sample points at a time.
+
+        Numpy may use several BLAS threads within every worker, so for the
+        best scaling, limit those to one (e.g. OMP_NUM_THREADS=1).
+
+        Arguments:
+            plaintexts { [[int]] } -- The plaintext binary sequences that were
+            encrypted to obtain the power traces.
+            workers {int} -- The amount of worker processes. Defaults to the
+            amount of CPUs.
+            sample_shards {int} -- The amount of ranges to split the sample
+            points of the traces into, to spread long traces over more tasks.
+            dtype {np.dtype} -- The float type of the shared trace buffer and
+            the correlation.
+            leakage_model {string} -- The name of the leakage model with which
+            to model the power consumption, see LEAKAGE_MODELS.
+        """
+        super().__init__(plaintexts, dtype=dtype, leakage_model=leakage_model)
+        self.workers = workers or os.cpu_count()
+        self.sample_shards = sample_shards
+
+        # Per worker process id, the busy time and the amount of tasks.
+        self.worker_timings = {}
+
+    def obtain_full_private_key(self, power_samples, only_first_byte=False):
+        """Computes the full private key used in AES128 by computing each of
+        its 16 subkeys in parallel.
+
+        Arguments:
+            power_samples { [[float]] } - A list of power traces where each
+            trace is a list of floats that represents the obtained output
+            for one plaintext encryption. Each sample is assumed to use the
+            same encryption key.
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+
+        Returns:
+            [int] -- The full 128-bit key as a list of 16 integers.
+        """
+        power_samples = np.asarray(power_samples)
+        (traces_amnt, samples_amnt) = power_samples.shape
+        amnt_of_subkeys = 1 if only_first_byte else 16
+
+        shard_bounds = np.linspace(0, samples_amnt, self.sample_shards + 1)
+        shard_bounds = shard_bounds.astype(int)
+        sample_ranges = [(int(start), int(end))
+                         for (start, end)
+                         in zip(shard_bounds[:-1], shard_bounds[1:])
+                         if end > start]
+        tasks = [(subkey_nr, sample_range)
+                 for subkey_nr in range(amnt_of_subkeys)
+                 for sample_range in sample_ranges]
+
+        float_size = np.dtype(self.dtype).itemsize
+        hypotheses_shape = (amnt_of_subkeys, traces_amnt,
+                            len(self.POSSIBLE_SUBKEYS))
+        shm = shared_memory.SharedMemory(
+            create=True,
+            size=max(1, (power_samples.size +
+                         int(np.prod(hypotheses_shape))) * float_size))
+        try:
+            traces = np.ndarray(power_samples.shape, dtype=self.dtype,
+                                buffer=shm.buf)
+            traces[:] = power_samples
+            # The hypotheses of a subkey are shared by all of its shards, so
+            # they are modeled and normalized once, here.
+            hypotheses = np.ndarray(hypotheses_shape, dtype=self.dtype,
+                                    buffer=shm.buf, offset=traces.nbytes)
+            for subkey_nr in range(amnt_of_subkeys):
+                hypotheses[subkey_nr] = normalize_columns(
+                    self.model_consumptions(traces_amnt, subkey_nr),
+                    self.dtype)
+
+            start_time = time.perf_counter()
+            self.worker_timings = {}
+            with Pool(self.workers, initializer=init_worker,
+                      initargs=(shm.name, traces.shape, hypotheses_shape,
+                                self.dtype)) as pool:
+                for (pid, elapsed) in pool.imap_unordered(normalize_shard,
+                                                          sample_ranges):
+                    self.record_timing(pid, elapsed)
+
+                pccs = np.zeros((amnt_of_subkeys, len(self.POSSIBLE_SUBKEYS)))
+                for (subkey_nr, shard_pccs, pid, elapsed) in \
+                        pool.imap_unordered(attack_shard, tasks):
+                    pccs[subkey_nr] = np.maximum(pccs[subkey_nr], shard_pccs)
+                    self.record_timing(pid, elapsed)
+
+            self.print_timings(time.perf_counter() - start_time)
+            del traces, hypotheses
+        finally:
+            shm.close()
+            shm.unlink()
+
+        final_subkeys = []  # 16 subkeys of 8 bits each, as integers
+        for subkey_nr in range(amnt_of_subkeys):
+            subkey = self.store_subkey_pccs(subkey_nr, pccs[subkey_nr])
+            print(f"Found subkey nr {subkey_nr}: {subkey}")
+            final_subkeys.append(subkey)
+
+        return final_subkeys
+
+    def record_timing(self, pid, elapsed):
+        (busy_time, tasks_amnt) = self.worker_timings.get(pid, (0.0, 0))
+        self.worker_timings[pid] = (busy_time + elapsed, tasks_amnt + 1)
+
+    def print_timings(self, wall_time):
+        """Prints the busy time of every worker and the parallel efficiency,
+        which is the total busy time divided by the wall time of all workers.
+
+        Arguments:
+            wall_time {float} -- The wall time of the parallel attack.
+        """
+        for (pid, (busy_time, tasks_amnt)) in \
+                sorted(self.worker_timings.items()):
+            print(f"Worker {pid}: {tasks_amnt} tasks in {busy_time:.3f}s")
+
+        total_busy_time = sum(t for (t, _) in self.worker_timings.values())
+        efficiency = total_busy_time / (wall_time * self.workers)
+        print(f"Parallel attack took {wall_time:.3f}s on {self.workers} "
+              f"workers ({efficiency:.0%} efficiency)")
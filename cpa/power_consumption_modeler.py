@@ -1,8 +1,96 @@
+import numpy as np
+
+from aes128 import SBOX
+
+HAMM_WEIGHTS = np.array([bin(i).count("1") for i in range(0, 256)])
+
+
+def sbox_inputs():
+    """Computes the first round SubBytes input of every combination of a
+    plaintext byte and a subkey guess.
+
+    Returns:
+        np.ndarray -- A (plaintext byte x subkey guess) table of Sbox inputs.
+    """
+    return np.bitwise_xor.outer(np.arange(256), np.arange(256))
+
+
+def sbox_outputs():
+    """Computes the first round SubBytes output of every combination of a
+    plaintext byte and a subkey guess.
+
+    Returns:
+        np.ndarray -- A (plaintext byte x subkey guess) table of Sbox outputs.
+    """
+    return np.asarray(SBOX)[sbox_inputs()]
+
+
+# Each leakage model computes the modeled power consumption of every
+# combination of a plaintext byte and a subkey guess as a 256x256 table.
+LEAKAGE_MODELS = {
+    # Hamming weight of the first round SubBytes output.
+    "hw_sbox": lambda: HAMM_WEIGHTS[sbox_outputs()],
+    # Hamming weight of the first round SubBytes input.
+    "hw_sbox_in": lambda: HAMM_WEIGHTS[sbox_inputs()],
+    # Hamming distance of the SubBytes output overwriting its input.
+    "hd_sbox": lambda: HAMM_WEIGHTS[sbox_inputs() ^ sbox_outputs()],
+    # The value of the first round SubBytes output itself.
+    "identity": sbox_outputs,
+}
+for bit in range(8):
+    # A single bit of the first round SubBytes output.
+    LEAKAGE_MODELS[f"sbox_bit{bit}"] = \
+        lambda bit=bit: (sbox_outputs() >> bit) & 1
+
+
 class PowerConsumptionModeler:
     SUBKEY_HAMM_WEIGHTS = [bin(i).count("1") for i in range(0, 256)]
+    DEFAULT_LEAKAGE_MODEL = "hw_sbox"
+
+    def __init__(self, leakage_model=DEFAULT_LEAKAGE_MODEL):
+        """Initiates a PowerConsumptionModeler object, which models the
+        power consumption of an intermediate value of AES according to a
+        leakage model from LEAKAGE_MODELS.
+
+        The model is precomputed as a 256x256 (plaintext byte x subkey guess)
+        hypothesis table, so that modeling the consumption of any amount of
+        plaintexts for all subkey guesses is a single lookup.
 
-    def __init__(self):
-        pass
+        Arguments:
+            leakage_model {string} -- The name of the leakage model.
+
+        Raises:
+            ValueError -- This error is raised when the given leakage model is
+            not in LEAKAGE_MODELS.
+        """
+        if leakage_model not in LEAKAGE_MODELS:
+            raise ValueError(f"Unknown leakage model {leakage_model}, choose "
+                             f"one of {sorted(LEAKAGE_MODELS)}.")
+
+        self.leakage_model = leakage_model
+        self.hypothesis_table = LEAKAGE_MODELS[leakage_model]()
+
+    def hypotheses(self, subplaintexts):
+        """Models the power consumption of the given plaintext bytes for
+        every subkey guess by looking them up in the hypothesis table.
+
+        Arguments:
+            subplaintexts {[int]} -- The attacked byte of each plaintext.
+
+        Returns:
+            np.ndarray -- A (plaintexts x 256) matrix of modeled consumptions.
+        """
+        return self.hypothesis_table[np.asarray(subplaintexts, dtype=np.intp)]
+
+    def classes_amnt(self):
+        """Returns the amount of distinct values that the leakage model can
+        take, e.g. the 9 Hamming weights, which are the classes of a template
+        attack.
+
+        Returns:
+            int -- The highest modeled consumption plus one.
+        """
+        return int(self.hypothesis_table.max()) + 1
 
     def hamming_dist(self, reference, data):
         """Computes the Hamming distance for two given bit strings by counting
@@ -23,7 +111,7 @@ class PowerConsumptionModeler:
             raise Exception("Unequal lengths between compared bitstrings.")
 
         dist = 0
-        for i in len(data):
+        for i in range(len(data)):
             ref_bit = reference[i]
             data_bit = data[i]
             if ref_bit != data_bit:
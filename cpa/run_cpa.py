@@ -2,6 +2,35 @@ import numpy as np
 import sys
 
 from attacker import Attacker
+from streaming_attacker import StreamingAttacker
+from trace_source import DEFAULT_MEMORY_BUDGET, TraceSource
+
+
+def load_text_traces(traces_file):
+    """Loads traces from a text file with one trace per line, written as a
+    tuple of integer samples.
+
+    The samples are kept in the smallest integer dtype that holds all of
+    them, instead of as lists of Python ints. The captures store their
+    samples as unsigned bytes (0..255), which would overflow int8.
+
+    Arguments:
+        traces_file {str} -- The path of the text file.
+
+    Returns:
+        np.ndarray -- A (traces x samples) integer array of the traces.
+    """
+    traces = []
+    file = open(traces_file, "r")
+    for line in file:
+        points = line.strip("\n").strip("(").strip(")").split(",")
+        traces.append([int(point) for point in points])
+    file.close()
+    traces = np.array(traces, dtype=np.int64)
+
+    dtype = np.result_type(np.min_scalar_type(traces.min()),
+                           np.min_scalar_type(traces.max()))
+    return traces.astype(dtype)
 
 
 def main(plaintexts, traces):
@@ -15,36 +44,45 @@ def main(plaintexts, traces):
     print(f"Found full key: {skey}")
 
 
+def main_out_of_core(trace_source):
+    cpa_attacker = StreamingAttacker()
+    skey = cpa_attacker.attack_trace_source(trace_source,
+                                            only_first_byte=False)
+
+    print(f"Found full key: {skey}")
+
+
 if __name__ == '__main__':
     args = sys.argv
     if len(sys.argv) < 3:
-        print("Usage: python3 run_cpa.py plaintexts_input traces_input npy_traces_bool")
+        print("Usage: python3 run_cpa.py plaintexts_input traces_input "
+              "npy_traces_bool [memory_budget_mb]")
 
     # Our ptexts should be stored in ./../data/1000_ptext.npy
     plaintexts_file = sys.argv[1]
     raw_traces_file = sys.argv[2]
     used_npy_traces = bool(sys.argv[3])
+    if len(sys.argv) > 4:
+        memory_budget = int(sys.argv[4]) * 1024 ** 2
+    else:
+        memory_budget = DEFAULT_MEMORY_BUDGET
 
     # If we used npy files for traces and ptexts, call the attacker right away
     if used_npy_traces:
+        # The traces are memory-mapped and attacked in chunks that fit in
+        # the memory budget, so they are never loaded as a whole.
         ptexts = np.load(plaintexts_file)
-        traces = np.load(raw_traces_file)
+        traces = np.load(raw_traces_file, mmap_mode="r")
 
         length = min(len(ptexts), len(traces))
-        ptexts = ptexts[:length]
-        traces = traces[:length]
+        trace_source = TraceSource(raw_traces_file, ptexts,
+                                   indices=np.arange(length),
+                                   memory_budget=memory_budget)
 
-        main(ptexts, traces)
+        main_out_of_core(trace_source)
         exit()
 
-    # Convert traces
-    traces = []
-    file = open(raw_traces_file, "r")
-    for line in file:
-        points = line.strip("\n").strip("(").strip(")").split(",")
-        trace = [int(point) for point in points]
-        traces.append(trace)
-    file.close()
+    traces = load_text_traces(raw_traces_file)
     # traces = traces[5:]  # Omit the two non-encryption traces
 
     # Load 1000 plaintexts and only take the amount we need.
@@ -1,9 +1,19 @@
-import matplotlib.pyplot as plt
+import os
+from functools import partial
+
 import numpy as np
 import pandas as pd
-import run_cpa
+import aes128
 from attack_analyser import AttackAnalyser
-from attacker import Attacker
+from bootstrap_estimator import BootstrapEstimator, select_points_of_interest
+from experiment_runner import ExperimentRunner
+from key_enumerator import KeyEnumerator
+from operation_locator import OperationLocator, windows_from_scores
+from second_order_attacker import SecondOrderAttacker
+from streaming_attacker import StreamingAttacker
+from trace_alignment import TraceAligner
+from trace_cache import DEFAULT_CACHE_DIR, TRACES_NAME, TraceCache
+from trace_source import DEFAULT_MEMORY_BUDGET, TraceSource
 
 # For several amounts of traces, test the guessing entropy with which the CPA
 # attacker is able to guess the first subkey.
@@ -12,61 +22,293 @@ TRACES_AMOUNTS = [3, 12, 48, 192, 768]
 SAMPLE_STEPS = [1, 4, 16]
 FULL = True
 ITERATIONS = 10
-TOTAL_EXPIREMENTS = len(TRACES_AMOUNTS) * len(SAMPLE_STEPS) * ITERATIONS
 CM = True
+MEMORY_BUDGET = DEFAULT_MEMORY_BUDGET
+DTYPE = np.float64  # np.float32 halves the memory use of the attack
+# When not attacking the full traces, the attack is restricted to the windows
+# of sample points that an OperationLocator finds to leak the most.
+LOCATOR_METHOD = "snr"
+WINDOW_FRACTION = 0.1
+WINDOW_MARGIN = 100
+# The masking of the cm traces resists the first order attack, a second order
+# attack combines every pair of sample points within a window instead.
+SECOND_ORDER = False
+SECOND_ORDER_WINDOW = (7155, 12400)
+SECOND_ORDER_COMBINATION = "product"
+# The iteration cells of the experiment grid run on a pool of WORKERS
+# processes, and every finished cell is stored in CHECKPOINT_DIR.
+# Running the experiments again only runs the cells that are not stored yet.
+WORKERS = 1
+SEED = 42
+# Instead of repeating the first order attack ITERATIONS times, BOOTSTRAP
+# attacks all traces once and estimates the GE and success rates, with
+# confidence intervals, from RESAMPLES resamples of the traces at the
+# POINTS_PER_SUBKEY best sample points of every subkey. The points are
+# selected on a random POI_FRACTION of the traces and the resamples are drawn
+# from the other traces, so that the points do not fit the resampled noise.
+BOOTSTRAP = False
+RESAMPLES = 200
+POINTS_PER_SUBKEY = 10
+POI_FRACTION = 0.2
+CONFIDENCE = 0.95
+# The random delays of the cm traces are undone by aligning every trace to a
+# pattern of the first trace. The aligned traces and the shifts are stored
+# in the trace cache and reused by later runs.
+ALIGN = CM
+ALIGNMENT_WINDOW = (7155, 7655)
+MAX_SHIFT = 500
+CACHE_DIR = DEFAULT_CACHE_DIR
+CACHE_MAX_BYTES = 20 * 1024 ** 3
+# A near miss, an attack that leaves at most ENUMERATION_BUDGET keys above the
+# known key, is turned into a recovered key by enumerating the keys in
+# decreasing score and verifying them against a known plaintext/ciphertext
+# pair. A budget of 0 disables the enumeration.
+ENUMERATION_BUDGET = 0
 
 if CM:
     CM_DIR = "cm"
 else:
     CM_DIR = "no-cm"
-# Load the 1000 required plaintexts
-plaintexts = np.load(f"{TEST_DATA_LOC}/{CM_DIR}/bytes_plain.npy")
+RESULTS_NAME = f"cpa{'_cm' if CM else ''}" \
+    f"{'_second_order' if SECOND_ORDER else ''}" \
+    f"_{'full' if FULL else 'cropped'}"
+CHECKPOINT_DIR = f"./checkpoints/{RESULTS_NAME}"
 
-# Load the acquired traces
-traces = np.load(f"{TEST_DATA_LOC}/{CM_DIR}/traces.npy")
+KNOWN_KEY = [43, 126, 21, 22, 40, 174, 210, 166,
+             171, 247, 21, 136, 9, 207, 79, 60]
 
 
-results = pd.DataFrame(columns=['TRACES_AMOUNT', 'SAMPLE_STEP', 'GE',
-                                'KEY_SR', 'SUBKEY_SR', 'FULL'], dtype=int)
+def prepare_traces_file():
+    """Finds the trace file to attack, after aligning the traces if needed.
 
-known_key = [43, 126, 21, 22, 40, 174, 210, 166,
-             171, 247, 21, 136, 9, 207, 79, 60]
+    Returns:
+        string -- The path of the .npy file of the traces.
+    """
+    traces_file = f"{TEST_DATA_LOC}/{CM_DIR}/traces.npy"
 
-atk_analyser = AttackAnalyser()
+    if ALIGN:
+        reference = np.load(traces_file, mmap_mode="r")[0]
+        aligner = TraceAligner(reference, ALIGNMENT_WINDOW, MAX_SHIFT)
+        entry_dir = TraceCache(CACHE_DIR, CACHE_MAX_BYTES).entry(
+            traces_file,
+            {"preprocessing": "align", "reference_trace": 0,
+             "window": ALIGNMENT_WINDOW, "max_shift": MAX_SHIFT},
+            lambda source_file, entry_dir: aligner.align_file(
+                source_file, os.path.join(entry_dir, TRACES_NAME),
+                os.path.join(entry_dir, "shifts.npy")))
+        traces_file = os.path.join(entry_dir, TRACES_NAME)
 
-if FULL:
-    start_point, end_point = 0, -1
-else:
-    start_point, end_point = 7155, 12400
+    return traces_file
+
+
+def locate_windows(traces_file, plaintexts):
+    """Finds the windows of sample points to restrict the attack to, and
+    stores them next to the results.
+
+    Arguments:
+        traces_file {string} -- The path of the .npy file of the traces.
+        plaintexts { [[int]] } -- The plaintexts of all traces.
 
+    Returns:
+        [(int, int)] -- The (start, end) windows of sample points.
+    """
+    # The locator only uses the plaintexts, never the key, so it can score
+    # the sample points on all traces without biasing the experiments.
+    # The statistics of the locator are large per sample point, so the
+    # sample points are scored range by range.
+    trace_source = TraceSource(traces_file, plaintexts,
+                               memory_budget=MEMORY_BUDGET)
+    scores = []
+    for sample_range in trace_source.sample_ranges(
+            OperationLocator.BYTES_PER_SAMPLE):
+        locator = OperationLocator(method=LOCATOR_METHOD)
+        # The centered copy of every trace and its class membership.
+        bytes_per_trace = \
+            (len(sample_range) + OperationLocator.CLASSES_AMNT) * 8
+        for (power_samples, batch_plaintexts) in trace_source.batches(
+                sample_range, bytes_per_trace):
+            locator.update(power_samples, batch_plaintexts)
+        scores.append(locator.scores())
+    windows = windows_from_scores(np.concatenate(scores),
+                                  fraction=WINDOW_FRACTION,
+                                  margin=WINDOW_MARGIN)
+    print(f"Restricting the attack to the windows {windows}")
+    pd.DataFrame(windows, columns=['START', 'END']).to_csv(
+        f"cpa{'_cm' if CM else ''}_windows.csv")
 
-np.random.seed(42)
-i = 0
-for _ in range(ITERATIONS):
-    for trace_amnt in TRACES_AMOUNTS:
-        for step in SAMPLE_STEPS:
+    return windows
 
-            indices = np.random.choice(np.arange(len(traces)), trace_amnt, replace=False)
 
-            sampled_traces = traces[indices, start_point:end_point:step]
-            sampled_plaintexts = plaintexts[indices, :]
-            cpa_attacker = Attacker(sampled_plaintexts)
+def run_cell(traces_file, plaintexts, windows, cell, rng):
+    """Attacks one random subset of the traces with every sample step. The
+    experiment with n traces attacks the first n traces of the subset, which
+    is a random subset of n traces itself. The first order attack streams
+    the traces only once, at full resolution, as the correlations of every
+    sample step are a subset of those. The second order attack likewise
+    combines the pairs of its window once per amount of traces.
 
-            # If we only obtain the first subkey, it is returned
-            # as a singleton list.
-            best_guess = cpa_attacker.obtain_full_private_key(
-                sampled_traces, only_first_byte=False)
+    Arguments:
+        traces_file {string} -- The path of the .npy file of the traces.
+        plaintexts { [[int]] } -- The plaintexts of all traces.
+        windows {[(int, int)]} -- The windows of sample points to attack, or
+        None to attack the full traces.
+        cell {{}} -- The cell's ITERATION.
+        rng {np.random.Generator} -- The random generator of the cell.
 
-            ge = atk_analyser.compute_guessing_entropy(
-                known_key, cpa_attacker.subkey_corr_coeffs)
+    Returns:
+        [{}] -- A result row for every sample step and amount of traces.
+    """
+    traces = np.load(traces_file, mmap_mode="r")
+    indices = rng.choice(len(traces), max(TRACES_AMOUNTS), replace=False)
+
+    if SECOND_ORDER:
+        # The pairs of every sample step are a subset of the pairs of the
+        # full window, so the window is combined once per amount of traces.
+        # The amounts of traces do not share their combined samples, as the
+        # product combination centers the samples on the mean of each
+        # subset.
+        step_results = {step: {} for step in SAMPLE_STEPS}
+        (window_start, window_end) = SECOND_ORDER_WINDOW
+        for trace_amnt in TRACES_AMOUNTS:
+            subset = indices[:trace_amnt]
+            cpa_attacker = SecondOrderAttacker(
+                plaintexts[subset], combination=SECOND_ORDER_COMBINATION,
+                memory_budget=MEMORY_BUDGET, dtype=DTYPE)
+            amnt_results = cpa_attacker.attack_sample_steps(
+                traces[subset, window_start:window_end], SAMPLE_STEPS)
+            for step in SAMPLE_STEPS:
+                step_results[step][trace_amnt] = amnt_results[step]
+    else:
+        trace_source = TraceSource(traces_file, plaintexts, indices=indices,
+                                   end=-1, memory_budget=MEMORY_BUDGET,
+                                   sort_indices=False, windows=windows)
+        cpa_attacker = StreamingAttacker(dtype=DTYPE)
+        step_results = cpa_attacker.attack_step_checkpoints(
+            trace_source, TRACES_AMOUNTS, SAMPLE_STEPS, only_first_byte=False)
+
+    atk_analyser = AttackAnalyser()
+    rows = []
+    for step in SAMPLE_STEPS:
+        for trace_amnt in TRACES_AMOUNTS:
+            (best_guess, subkey_coeffs) = step_results[step][trace_amnt]
+
+            ge = atk_analyser.compute_guessing_entropy(KNOWN_KEY,
+                                                       subkey_coeffs)
             key_sr = int(ge == 0)
-            subkey_sr = atk_analyser.compute_subkey_success_rate(known_key, best_guess)
-            results.loc[i] = [trace_amnt, step, ge, key_sr, subkey_sr, FULL]
-            i += 1
-            print(f"Experiement {i}/{TOTAL_EXPIREMENTS} [trace amount:{trace_amnt}, step: {step}]:"
-                  f"GE: {ge}\tKEY SR: {key_sr}\tSUBKEY SR: {subkey_sr}")
+            subkey_sr = atk_analyser.compute_subkey_success_rate(KNOWN_KEY,
+                                                                 best_guess)
+
+            # The brute force effort that remains for the full key.
+            pccs = np.array([[subkey_coeffs[subkey_nr][guess]
+                              for guess in range(256)]
+                             for subkey_nr in range(16)])
+            scores = atk_analyser.compute_correlation_scores(pccs,
+                                                             trace_amnt)
+            (key_rank_low, key_rank_high) = \
+                atk_analyser.compute_key_rank_bounds(KNOWN_KEY, scores)
+
+            key_recovered = key_sr
+            if not key_sr and key_rank_low < ENUMERATION_BUDGET:
+                enumerator = KeyEnumerator(scores)
+                ciphertext = aes128.encrypt(plaintexts[0], KNOWN_KEY)[0]
+                found_key = enumerator.search(plaintexts[0], ciphertext,
+                                              budget=ENUMERATION_BUDGET)
+                key_recovered = int(found_key == KNOWN_KEY)
+                print(f"Enumerated {enumerator.keys_tested} keys at "
+                      f"{enumerator.keys_per_second:.0f} keys/s")
+
+            rows.append({'TRACES_AMOUNT': trace_amnt, 'SAMPLE_STEP': step,
+                         'GE': ge, 'KEY_SR': key_sr, 'SUBKEY_SR': subkey_sr,
+                         'FULL': FULL, 'ITERATION': cell["ITERATION"],
+                         'KEY_RANK_LOW': key_rank_low,
+                         'KEY_RANK_HIGH': key_rank_high,
+                         'KEY_RECOVERED': key_recovered})
+            print(f"Experiment [iteration: {cell['ITERATION']}, trace "
+                  f"amount: {trace_amnt}, step: {step}]: GE: {ge}\t"
+                  f"KEY SR: {key_sr}\tSUBKEY SR: {subkey_sr}\t"
+                  f"KEY RANK: 2^{np.log2(key_rank_high + 1):.1f}")
+
+    return rows
 
-results.to_csv(f"cpa{'_cm' if CM else ''}_{'full' if FULL else 'cropped'}_results.csv")
+
+def run_bootstrap(traces_file, plaintexts, windows):
+    """Estimates the GE and success rates of every sample step and amount of
+    traces by resampling the traces that the points of interest were not
+    selected on.
+
+    Arguments:
+        traces_file {string} -- The path of the .npy file of the traces.
+        plaintexts { [[int]] } -- The plaintexts of all traces.
+        windows {[(int, int)]} -- The windows of sample points to attack, or
+        None to attack the full traces.
+
+    Returns:
+        pd.DataFrame -- A result row for every sample step and amount of
+        traces, with the bounds of the confidence intervals.
+    """
+    traces = np.load(traces_file, mmap_mode="r")
+    rng = np.random.default_rng(SEED)
+    order = rng.permutation(len(traces))
+    poi_amnt = int(POI_FRACTION * len(traces))
+    poi_indices = order[:poi_amnt]
+    population = np.sort(order[poi_amnt:])
+
+    trace_source = TraceSource(traces_file, plaintexts, indices=poi_indices,
+                               end=-1, memory_budget=MEMORY_BUDGET,
+                               windows=windows)
+    points = select_points_of_interest(trace_source, POINTS_PER_SUBKEY,
+                                       SAMPLE_STEPS, dtype=DTYPE)
+
+    rows = []
+    for step in SAMPLE_STEPS:
+        estimator = BootstrapEstimator(traces[:, points[step]][population],
+                                       plaintexts[population], dtype=DTYPE,
+                                       memory_budget=MEMORY_BUDGET)
+
+        for trace_amnt in TRACES_AMOUNTS:
+            estimates = estimator.estimate(KNOWN_KEY, trace_amnt, RESAMPLES,
+                                           rng, confidence=CONFIDENCE)
+            rows.append({'TRACES_AMOUNT': trace_amnt, 'SAMPLE_STEP': step,
+                         **estimates, 'FULL': FULL})
+            print(f"Bootstrap [trace amount: {trace_amnt}, step: {step}]: "
+                  f"GE: {estimates['GE']} ({estimates['GE_LOW']} - "
+                  f"{estimates['GE_HIGH']})")
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    # Load the 1000 required plaintexts
+    plaintexts = np.load(f"{TEST_DATA_LOC}/{CM_DIR}/bytes_plain.npy")
+
+    # The acquired traces are memory-mapped, each experiment only reads the
+    # chunks it needs through a TraceSource.
+    traces_file = prepare_traces_file()
+    windows = None if FULL else locate_windows(traces_file, plaintexts)
+
+    if BOOTSTRAP:
+        results = run_bootstrap(traces_file, plaintexts, windows)
+        results.to_csv(f"{RESULTS_NAME}_bootstrap_results.csv")
+    else:
+        # Every sample step of an iteration attacks the same random traces,
+        # so they are all attacked within one cell.
+        grid = {"ITERATION": list(range(ITERATIONS))}
+        # Checkpoints of another trace file or other settings are run again.
+        config = {
+            "traces_hash": TraceCache(CACHE_DIR, CACHE_MAX_BYTES).source_hash(
+                traces_file),
+            "traces_amounts": TRACES_AMOUNTS, "sample_steps": SAMPLE_STEPS,
+            "windows": windows, "dtype": np.dtype(DTYPE).name,
+            "second_order": SECOND_ORDER,
+            "second_order_window": SECOND_ORDER_WINDOW,
+            "second_order_combination": SECOND_ORDER_COMBINATION,
+            "enumeration_budget": ENUMERATION_BUDGET, "known_key": KNOWN_KEY}
+        runner = ExperimentRunner(
+            grid, partial(run_cell, traces_file, plaintexts, windows),
+            CHECKPOINT_DIR, workers=WORKERS, seed=SEED, config=config)
+        results = runner.run()
+
+        results.to_csv(f"{RESULTS_NAME}_results.csv")
 
 # print(f"Final guessing entropies: {guessing_entropies}")
 
@@ -79,6 +321,3 @@ results.to_csv(f"cpa{'_cm' if CM else ''}_{'full' if FULL else 'cropped'}_result
 # plt.savefig("./data/cpa-traceAmnt-vs-guessingEntropy.png")
 
 # print("Stored output plot in ./data/cpa-traceAmnt-vs-guessingEntropy.png")
-
-# if __name__ == '__main__':
-#     pass
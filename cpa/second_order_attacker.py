@@ -0,0 +1,301 @@
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from attacker import Attacker
+from correlation import max_abs_correlations, normalize_columns
+from power_consumption_modeler import PowerConsumptionModeler
+from trace_source import DEFAULT_MEMORY_BUDGET
+
+# The state of a worker process, set once by init_tile_worker() so that the
+# window and the hypotheses are sent once instead of with every tile.
+worker_state = {}
+
+
+def combine_samples(first, second, combination):
+    """Combines every sample point of one block of a trace window with every
+    sample point of another block.
+
+    Arguments:
+        first {np.ndarray} -- A (traces x a) block of sample points, which
+        are centered for the product combination.
+        second {np.ndarray} -- A (traces x b) block of sample points, which
+        are centered for the product combination.
+        combination {string} -- The combination function, see COMBINATIONS.
+
+    Returns:
+        np.ndarray -- A (traces x a x b) array of combined sample points.
+    """
+    first = first[:, :, np.newaxis]
+    second = second[:, np.newaxis, :]
+    if combination == "product":
+        return first * second
+    return np.abs(first - second)
+
+
+def attack_tile(window, hypotheses, tile, combination, dtype,
+                sample_steps=(1,)):
+    """Correlates the hypotheses with all pairs of sample points of one tile
+    of a trace window. A tile pairs one block of the window with another, of
+    which only the pairs of two distinct sample points are used.
+
+    Decimating the window only drops sample points, so the pairs of a
+    decimated window are a subset of the pairs of the full window. The
+    correlations are computed once, at full resolution, and reduced over
+    the pairs of every sample step.
+
+    Arguments:
+        window {np.ndarray} -- The (traces x samples) trace window, which
+        is centered for the product combination.
+        hypotheses {np.ndarray} -- The (subkeys x traces x 256) normalized
+        hypotheses.
+        tile {((int, int), (int, int))} -- The first and end sample point of
+        the two blocks of the tile.
+        combination {string} -- The combination function, see COMBINATIONS.
+        dtype {np.dtype} -- The float type to correlate in.
+        sample_steps {[int]} -- The factors by which the window is decimated,
+        as in window[:, ::step].
+
+    Returns:
+        np.ndarray -- The (steps x subkeys x 256) highest absolute
+        correlation of every guess over the pairs of the tile that remain
+        after decimating the window by every sample step.
+    """
+    ((first_start, first_end), (second_start, second_end)) = tile
+    combined = combine_samples(window[:, first_start:first_end],
+                               window[:, second_start:second_end],
+                               combination)
+
+    # Only keep the pairs (i, j) with i < j, as (j, i) combines the same
+    # samples and (i, i) is no combination of two operations.
+    (first_points, second_points) = np.meshgrid(
+        np.arange(first_start, first_end), np.arange(second_start, second_end),
+        indexing="ij")
+    distinct = first_points < second_points
+    combined = combined[:, distinct]
+    (first_points, second_points) = (first_points[distinct],
+                                     second_points[distinct])
+    step_masks = [(first_points % step == 0) & (second_points % step == 0)
+                  for step in sample_steps]
+
+    pccs = np.zeros((len(sample_steps), len(hypotheses), hypotheses.shape[2]))
+    if combined.shape[1] == 0:
+        return pccs
+
+    combined = normalize_columns(combined, dtype)
+    for (subkey_nr, subkey_hypotheses) in enumerate(hypotheses):
+        correlations = np.abs(subkey_hypotheses.T @ combined)
+        for (step_nr, step_mask) in enumerate(step_masks):
+            pccs[step_nr, subkey_nr] = correlations.max(
+                axis=1, where=step_mask, initial=0)
+
+    return pccs
+
+
+def init_tile_worker(window, hypotheses, combination, dtype, sample_steps):
+    worker_state["args"] = (window, hypotheses, combination, dtype,
+                            sample_steps)
+
+
+def attack_tile_in_worker(tile):
+    (window, hypotheses, combination, dtype, sample_steps) = \
+        worker_state["args"]
+    return attack_tile(window, hypotheses, tile, combination, dtype,
+                       sample_steps)
+
+
+class SecondOrderAttacker(Attacker):
+    COMBINATIONS = ("product", "abs_diff")
+
+    def __init__(self, plaintexts, window=None, combination="product",
+                 workers=1, memory_budget=DEFAULT_MEMORY_BUDGET,
+                 dtype=np.float64,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates a SecondOrderAttacker object, which executes a second
+        order Correlation Power Analysis attack to defeat first order
+        masking. Every pair of sample points in a window of the traces is
+        combined into one sample point, which is correlated with the same
+        hypotheses as in a first order attack.
+
+        The pairs are quadratic in the window size, so they are never all
+        stored. The window is split into blocks and every pair of blocks is
+        combined, correlated and discarded as one tile, of which the size
+        follows from the memory budget. The tiles may be attacked by a pool
+        of worker processes.
+
+        Arguments:
+            plaintexts { [[int]] } -- The plaintext binary sequences that were
+            encrypted to obtain the power traces.
+            window {(int, int)} -- The first and end sample point of the
+            window of which to combine the pairs. Defaults to the full traces.
+            combination {string} -- How to combine two sample points: the
+            "product" of the centered samples or the "abs_diff" of the raw
+            samples.
+            workers {int} -- The amount of worker processes to attack the
+            tiles with. With 1, the tiles are attacked in this process.
+            memory_budget {int} -- The amount of bytes that the tiles of all
+            workers may take up together.
+            dtype {np.dtype} -- The float type to combine and correlate in.
+            leakage_model {string} -- The name of the leakage model with which
+            to model the power consumption, see LEAKAGE_MODELS.
+
+        Raises:
+            ValueError -- This error is raised when the given combination is
+            not one of COMBINATIONS.
+        """
+        if combination not in self.COMBINATIONS:
+            raise ValueError(f"Unknown combination {combination}, choose one "
+                             f"of {self.COMBINATIONS}.")
+
+        super().__init__(plaintexts, dtype=dtype, leakage_model=leakage_model)
+        self.window = window
+        self.combination = combination
+        self.workers = workers or os.cpu_count()
+        self.memory_budget = memory_budget
+
+    def tiles(self, traces_amnt, samples_amnt):
+        """Splits the pairs of sample points of a window into tiles, which
+        take up at most the memory budget of one worker while they are
+        attacked.
+
+        Every pair of a tile costs two copies of its combined samples, as
+        the pairs are filtered and normalized into new arrays, and, once the
+        unfiltered samples are released, two rows of correlations per guess
+        for the matrix product and its absolute values.
+
+        Arguments:
+            traces_amnt {int} -- The amount of traces.
+            samples_amnt {int} -- The amount of sample points in the window.
+
+        Returns:
+            [((int, int), (int, int))] -- The first and end sample point of
+            the two blocks of every tile.
+        """
+        float_size = np.dtype(self.dtype).itemsize
+        worker_budget = self.memory_budget // self.workers
+        pair_size = 2 * (traces_amnt + len(self.POSSIBLE_SUBKEYS)) * \
+            float_size
+        block_size = int(np.sqrt(worker_budget / pair_size))
+        block_size = max(1, min(block_size, samples_amnt))
+
+        blocks = [(start, min(start + block_size, samples_amnt))
+                  for start in range(0, samples_amnt, block_size)]
+        return [(blocks[i], blocks[j])
+                for i in range(len(blocks))
+                for j in range(i, len(blocks))]
+
+    def step_pccs(self, power_samples, sample_steps, amnt_of_subkeys):
+        """Computes the highest absolute correlation of every subkey guess
+        over the combined pairs of sample points, for every decimation of
+        the window by a sample step, in a single pass over the pairs.
+
+        Arguments:
+            power_samples { [[float]] } - A list of power traces where each
+            trace is a list of floats that represents the obtained output
+            for one plaintext encryption. Each sample is assumed to use the
+            same encryption key.
+            sample_steps {[int]} -- The factors by which to decimate the
+            window, as in window[:, ::step].
+            amnt_of_subkeys {int} -- The amount of subkeys to attack.
+
+        Returns:
+            np.ndarray -- The (steps x subkeys x 256) PCCs.
+        """
+        power_samples = np.asarray(power_samples)
+        if self.window is not None:
+            (start, end) = self.window
+            power_samples = power_samples[:, start:end]
+
+        # The product combination is the centered product, so every sample
+        # point is centered first. Centering would change the absolute
+        # difference of two sample points with different means, so those
+        # are combined as they are.
+        window = power_samples.astype(self.dtype)
+        if self.combination == "product":
+            window -= power_samples.mean(axis=0, dtype=np.float64).astype(
+                self.dtype)
+        (traces_amnt, samples_amnt) = window.shape
+
+        hypotheses = np.stack([
+            normalize_columns(self.model_consumptions(traces_amnt, subkey_nr),
+                              self.dtype)
+            for subkey_nr in range(amnt_of_subkeys)])
+
+        tiles = self.tiles(traces_amnt, samples_amnt)
+        print(f"Combining {samples_amnt * (samples_amnt - 1) // 2} pairs of "
+              f"sample points in {len(tiles)} tiles...")
+
+        pccs = np.zeros((len(sample_steps), amnt_of_subkeys,
+                         len(self.POSSIBLE_SUBKEYS)))
+        if self.workers == 1:
+            for tile in tiles:
+                pccs = np.maximum(pccs, attack_tile(
+                    window, hypotheses, tile, self.combination, self.dtype,
+                    sample_steps))
+        else:
+            with Pool(self.workers, initializer=init_tile_worker,
+                      initargs=(window, hypotheses, self.combination,
+                                self.dtype, sample_steps)) as pool:
+                for tile_pccs in pool.imap_unordered(attack_tile_in_worker,
+                                                     tiles):
+                    pccs = np.maximum(pccs, tile_pccs)
+
+        return pccs
+
+    def obtain_full_private_key(self, power_samples, only_first_byte=False):
+        """Computes the full private key used in AES128 by computing each of
+        its 16 subkeys from the combined pairs of sample points.
+
+        Arguments:
+            power_samples { [[float]] } - A list of power traces where each
+            trace is a list of floats that represents the obtained output
+            for one plaintext encryption. Each sample is assumed to use the
+            same encryption key.
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+
+        Returns:
+            [int] -- The full 128-bit key as a list of 16 integers.
+        """
+        amnt_of_subkeys = 1 if only_first_byte else 16
+        [pccs] = self.step_pccs(power_samples, [1], amnt_of_subkeys)
+
+        final_subkeys = []  # 16 subkeys of 8 bits each, as integers
+        for subkey_nr in range(amnt_of_subkeys):
+            subkey = self.store_subkey_pccs(subkey_nr, pccs[subkey_nr])
+            print(f"Found subkey nr {subkey_nr}: {subkey}")
+            final_subkeys.append(subkey)
+
+        return final_subkeys
+
+    def attack_sample_steps(self, power_samples, sample_steps,
+                            only_first_byte=False):
+        """Attacks the window decimated by every sample step, from one pass
+        over the pairs of the full window (see step_pccs()).
+
+        Arguments:
+            power_samples { [[float]] } - A list of power traces.
+            sample_steps {[int]} -- The factors by which to decimate the
+            window, as in window[:, ::step].
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+
+        Returns:
+            { {} } -- For each sample step, a tuple of the best key guess and
+            its "subkey guess correlation" dicts, which are formatted like
+            the subkey_corr_coeffs of an Attacker.
+        """
+        amnt_of_subkeys = 1 if only_first_byte else 16
+        all_pccs = self.step_pccs(power_samples, sample_steps,
+                                  amnt_of_subkeys)
+
+        results = {}
+        for (step, pccs) in zip(sample_steps, all_pccs):
+            best_guess = [int(np.argmax(subkey_pccs)) for subkey_pccs in pccs]
+            subkey_coeffs = {
+                subkey_nr: {subkey_guess: pccs[subkey_nr][subkey_guess]
+                            for subkey_guess in self.POSSIBLE_SUBKEYS}
+                for subkey_nr in range(amnt_of_subkeys)
+            }
+            results[step] = (best_guess, subkey_coeffs)
+
+        return results
@@ -0,0 +1,357 @@
+import numpy as np
+
+from attacker import Attacker
+from correlation import max_abs_correlations, safe_divide
+from power_consumption_modeler import PowerConsumptionModeler
+
+
+class StreamingAttacker(Attacker):
+    SUBKEYS_AMNT = 16
+
+    def __init__(self, dtype=np.float64,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates a StreamingAttacker object, which executes the same
+        Correlation Power Analysis attack as an Attacker, but ingests the
+        traces in batches. Only the sufficient statistics of the correlation
+        are kept in memory, so the full set of traces never has to be.
+
+        Arguments:
+            dtype {np.dtype} -- The float type in which every batch is
+            processed. The statistics themselves are always accumulated in
+            float64 to keep them accurate over many batches.
+            leakage_model {string} -- The name of the leakage model with which
+            to model the power consumption, see LEAKAGE_MODELS.
+        """
+        super().__init__(plaintexts=None, dtype=dtype,
+                         leakage_model=leakage_model)
+        self.reset()
+
+    def reset(self):
+        """Discards the statistics of all traces ingested so far."""
+        self.traces_amnt = 0
+
+        # The trace sums are kept relative to the mean of the first batch,
+        # which avoids cancellation when the variance is computed from sums.
+        self.trace_offset = None
+        self.sum_x = None  # Per sample
+        self.sum_x2 = None  # Per sample
+        self.sum_h = np.zeros((self.SUBKEYS_AMNT, len(self.POSSIBLE_SUBKEYS)))
+        self.sum_h2 = np.zeros((self.SUBKEYS_AMNT, len(self.POSSIBLE_SUBKEYS)))
+        self.sum_xh = None  # Per subkey, subkey guess and sample
+
+    def update(self, power_samples, plaintexts):
+        """Adds a batch of traces and their plaintexts to the sufficient
+        statistics of the attack.
+
+        Arguments:
+            power_samples { [[float]] } -- A batch of power traces, each of
+            which is a list of floats for one plaintext encryption.
+            plaintexts { [[int]] } -- The 16-byte plaintexts belonging to the
+            given power traces.
+        """
+        power_samples = np.asarray(power_samples)
+        batch_size = len(power_samples)
+        if batch_size == 0:
+            return
+
+        if self.trace_offset is None:
+            samples_amnt = power_samples.shape[1]
+            self.trace_offset = power_samples.mean(axis=0, dtype=np.float64)
+            self.sum_x = np.zeros(samples_amnt)
+            self.sum_x2 = np.zeros(samples_amnt)
+            self.sum_xh = np.zeros((self.SUBKEYS_AMNT,
+                                    len(self.POSSIBLE_SUBKEYS),
+                                    samples_amnt))
+
+        power_samples = power_samples.astype(self.dtype)
+        power_samples -= self.trace_offset.astype(self.dtype)
+        self.sum_x += power_samples.sum(axis=0, dtype=np.float64)
+        self.sum_x2 += np.einsum("ij,ij->j", power_samples, power_samples,
+                                 dtype=np.float64)
+
+        for subkey_nr in range(self.SUBKEYS_AMNT):
+            hypotheses = self.model_consumptions(batch_size, subkey_nr,
+                                                 plaintexts=plaintexts)
+            hypotheses = hypotheses.astype(self.dtype)
+
+            self.sum_h[subkey_nr] += hypotheses.sum(axis=0, dtype=np.float64)
+            self.sum_h2[subkey_nr] += np.einsum("ij,ij->j",
+                                                hypotheses, hypotheses,
+                                                dtype=np.float64)
+            self.sum_xh[subkey_nr] += hypotheses.T @ power_samples
+
+        self.traces_amnt += batch_size
+
+    def correlations(self, subkey_byte_index):
+        """Computes the correlation of every subkey guess with every sample
+        point from the statistics of all traces ingested so far.
+
+        Arguments:
+            subkey_byte_index {int} -- Integer to indicate which byte we're
+            inspecting in the given block.
+
+        Returns:
+            np.ndarray -- A (256 x samples) matrix of correlation values.
+        """
+        return self.correlations_from_sums(self.sum_h[subkey_byte_index],
+                                           self.sum_h2[subkey_byte_index],
+                                           self.sum_xh[subkey_byte_index])
+
+    def correlations_from_sums(self, sum_h, sum_h2, sum_xh):
+        """Computes the correlation of every subkey guess with every sample
+        point from the sums of the hypotheses of one subkey and the trace
+        sums of all traces ingested so far.
+
+        Arguments:
+            sum_h {np.ndarray} -- The sum of the hypotheses of every guess.
+            sum_h2 {np.ndarray} -- The sum of the squared hypotheses of every
+            guess.
+            sum_xh {np.ndarray} -- The (256 x samples) sums of the products
+            of the hypotheses and the traces.
+
+        Returns:
+            np.ndarray -- A (256 x samples) matrix of correlation values.
+        """
+        n = self.traces_amnt
+        sumnum = n * sum_xh - np.outer(sum_h, self.sum_x)
+        sumden1 = n * sum_h2 - sum_h * sum_h
+        sumden2 = n * self.sum_x2 - self.sum_x * self.sum_x
+
+        # Rounding can make a zero variance slightly negative.
+        sumden = np.outer(np.maximum(sumden1, 0), np.maximum(sumden2, 0))
+        return safe_divide(sumnum, np.sqrt(sumden))
+
+    def obtain_full_private_key(self, power_samples=None,
+                                only_first_byte=False, bytes_per_chunk=4, *,
+                                plaintexts=None):
+        """Computes the full private key used in AES128 from all traces
+        ingested so far, optionally after ingesting one last batch. The
+        parameters come in the order of Attacker.obtain_full_private_key(),
+        so that the attackers are interchangeable.
+
+        Arguments:
+            power_samples { [[float]] } -- An optional last batch of power
+            traces to ingest before computing the key.
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+            bytes_per_chunk {int} -- Unused, as the sums of all subkeys are
+            accumulated by update() already.
+            plaintexts { [[int]] } -- The plaintexts of the last batch.
+
+        Returns:
+            [int] -- The full 128-bit key as a list of 16 integers.
+        """
+        if power_samples is not None:
+            self.update(power_samples, plaintexts)
+
+        final_subkeys = []  # 16 subkeys of 8 bits each, as integers
+        amnt_of_subkeys = 1 if only_first_byte else self.SUBKEYS_AMNT
+        for subkey_nr in range(0, amnt_of_subkeys):
+            pccs = max_abs_correlations(self.correlations(subkey_nr))
+            subkey = self.store_subkey_pccs(subkey_nr, pccs)
+            print(f"Found subkey nr {subkey_nr}: {subkey}")
+            final_subkeys.append(subkey)
+
+        return final_subkeys
+
+    def attack_trace_source(self, trace_source, only_first_byte=False):
+        """Computes the full private key used in AES128 from a TraceSource
+        without ever loading all of its traces. Any previously ingested
+        statistics are discarded.
+
+        Arguments:
+            trace_source {TraceSource} -- The source of the traces and their
+            plaintexts.
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+
+        Returns:
+            [int] -- The full 128-bit key as a list of 16 integers.
+        """
+        amnt_of_subkeys = 1 if only_first_byte else self.SUBKEYS_AMNT
+        [pccs] = self.checkpoint_pccs(trace_source, [len(trace_source)],
+                                      amnt_of_subkeys)
+
+        final_subkeys = []  # 16 subkeys of 8 bits each, as integers
+        for subkey_nr in range(amnt_of_subkeys):
+            subkey = self.store_subkey_pccs(subkey_nr, pccs[subkey_nr])
+            print(f"Found subkey nr {subkey_nr}: {subkey}")
+            final_subkeys.append(subkey)
+
+        return final_subkeys
+
+    def attack_checkpoints(self, trace_source, checkpoints,
+                           only_first_byte=False):
+        """Attacks every prefix of a TraceSource's traces of which the length
+        is a checkpoint, in a single pass over the traces. The attack on the
+        first n traces simply uses the statistics at the moment that the n-th
+        trace has been ingested. Any previously ingested statistics are
+        discarded.
+
+        Arguments:
+            trace_source {TraceSource} -- The source of the traces and their
+            plaintexts, in the order in which they are ingested.
+            checkpoints {[int]} -- The amounts of traces to attack with.
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+
+        Returns:
+            { {} } -- For each checkpoint, a tuple of the best key guess and
+            its "subkey guess correlation" dicts, which are formatted like
+            the subkey_corr_coeffs of an Attacker.
+        """
+        return self.attack_step_checkpoints(trace_source, checkpoints, [1],
+                                            only_first_byte)[1]
+
+    def attack_step_checkpoints(self, trace_source, checkpoints,
+                                sample_steps, only_first_byte=False):
+        """Attacks every prefix of a TraceSource's traces of which the length
+        is a checkpoint, for every further decimation of its sample points by
+        a sample step, in a single pass over the traces. Decimating only
+        drops sample points, so the correlations of a decimated attack are a
+        subset of those of the source's own sample points.
+
+        Arguments:
+            trace_source {TraceSource} -- The source of the traces and their
+            plaintexts, in the order in which they are ingested.
+            checkpoints {[int]} -- The amounts of traces to attack with.
+            sample_steps {[int]} -- The factors by which to decimate the
+            source's sample points, see TraceSource.step_mask().
+            only_first_byte {bool} -- Whether to only obtain the first subkey.
+
+        Returns:
+            { { {} } } -- For each sample step and each checkpoint, a tuple of
+            the best key guess and its "subkey guess correlation" dicts.
+        """
+        amnt_of_subkeys = 1 if only_first_byte else self.SUBKEYS_AMNT
+        all_pccs = self.checkpoint_step_pccs(trace_source, checkpoints,
+                                             sample_steps, amnt_of_subkeys)
+
+        results = {}
+        for (step, step_pccs) in zip(sample_steps, all_pccs):
+            results[step] = {}
+            for (checkpoint, pccs) in zip(checkpoints, step_pccs):
+                best_guess = [int(np.argmax(subkey_pccs))
+                              for subkey_pccs in pccs]
+                subkey_coeffs = {
+                    subkey_nr: {subkey_guess: pccs[subkey_nr][subkey_guess]
+                                for subkey_guess in self.POSSIBLE_SUBKEYS}
+                    for subkey_nr in range(amnt_of_subkeys)
+                }
+                results[step][checkpoint] = (best_guess, subkey_coeffs)
+
+        return results
+
+    def checkpoint_pccs(self, trace_source, checkpoints, amnt_of_subkeys):
+        """Streams the traces of a TraceSource through this attacker and
+        computes the PCC of every subkey guess each time the amount of
+        ingested traces reaches a checkpoint.
+
+        Arguments:
+            trace_source {TraceSource} -- The source of the traces and their
+            plaintexts.
+            checkpoints {[int]} -- The amounts of traces after which to
+            compute the PCCs.
+            amnt_of_subkeys {int} -- The amount of subkeys, starting from the
+            first one, to compute the PCCs of.
+
+        Returns:
+            np.ndarray -- A (checkpoints x subkeys x 256) array of PCCs.
+        """
+        [pccs] = self.checkpoint_step_pccs(trace_source, checkpoints, [1],
+                                           amnt_of_subkeys)
+        return pccs
+
+    def checkpoint_step_pccs(self, trace_source, checkpoints, sample_steps,
+                             amnt_of_subkeys):
+        """Streams the traces of a TraceSource through this attacker and
+        computes the PCC of every subkey guess over the sample points of
+        every sample step, each time the amount of ingested traces reaches a
+        checkpoint. The used sample points are split into ranges of which the
+        statistics fit in the source's memory budget, and the traces of each
+        range are streamed in bounded batches.
+
+        Arguments:
+            trace_source {TraceSource} -- The source of the traces and their
+            plaintexts.
+            checkpoints {[int]} -- The amounts of traces after which to
+            compute the PCCs.
+            sample_steps {[int]} -- The factors by which to decimate the
+            source's sample points, see TraceSource.step_mask().
+            amnt_of_subkeys {int} -- The amount of subkeys, starting from the
+            first one, to compute the PCCs of.
+
+        Raises:
+            ValueError -- This error is raised when a checkpoint is not in the
+            range [1..len(trace_source)] or occurs more than once.
+
+        Returns:
+            np.ndarray -- A (steps x checkpoints x subkeys x 256) array of
+            PCCs.
+        """
+        for checkpoint in checkpoints:
+            if not 1 <= checkpoint <= len(trace_source):
+                raise ValueError(f"Checkpoint {checkpoint} is not within the "
+                                 f"{len(trace_source)} available traces.")
+        if len(set(checkpoints)) != len(checkpoints):
+            raise ValueError(f"The checkpoints {checkpoints} contain "
+                             f"duplicates.")
+        checkpoint_positions = {checkpoint: i
+                                for (i, checkpoint) in enumerate(checkpoints)}
+        sorted_checkpoints = sorted(checkpoint_positions)
+        step_masks = [trace_source.step_mask(step) for step in sample_steps]
+
+        guesses_amnt = len(self.POSSIBLE_SUBKEYS)
+        float_size = np.dtype(self.dtype).itemsize
+
+        # The float64 accumulators, plus the guesses x samples products in
+        # flight while computing correlations.
+        bytes_per_sample = \
+            ((self.SUBKEYS_AMNT + 2) * guesses_amnt + 3) * 8
+
+        pccs = np.zeros((len(sample_steps), len(checkpoints),
+                         amnt_of_subkeys, guesses_amnt))
+        for sample_range in trace_source.sample_ranges(bytes_per_sample):
+            print(f"Attacking samples {sample_range.start} to "
+                  f"{sample_range.stop} of {trace_source.samples_amnt}...")
+            range_masks = [mask[sample_range.start:sample_range.stop]
+                           for mask in step_masks]
+
+            # The hypotheses and the offset copy of each trace.
+            bytes_per_trace = (guesses_amnt + len(sample_range)) * float_size
+
+            self.reset()
+            remaining_checkpoints = list(sorted_checkpoints)
+            for (power_samples, plaintexts) in trace_source.batches(
+                    sample_range, bytes_per_trace):
+                # Split the batch wherever it crosses a checkpoint.
+                offset = 0
+                while offset < len(power_samples) and remaining_checkpoints:
+                    end = min(len(power_samples), offset +
+                              remaining_checkpoints[0] - self.traces_amnt)
+                    self.update(power_samples[offset:end],
+                                plaintexts[offset:end])
+                    offset = end
+
+                    if self.traces_amnt == remaining_checkpoints[0]:
+                        position = checkpoint_positions[
+                            remaining_checkpoints.pop(0)]
+
+                        # A guess' PCC is its highest correlation over all
+                        # sample ranges, of the sample points of each step.
+                        for subkey_nr in range(amnt_of_subkeys):
+                            correlations = np.abs(self.correlations(subkey_nr))
+                            for (step_nr, mask) in enumerate(range_masks):
+                                if not mask.any():
+                                    continue
+                                if not mask.all():
+                                    range_pccs = \
+                                        correlations[:, mask].max(axis=1)
+                                else:
+                                    range_pccs = correlations.max(axis=1)
+                                pccs[step_nr, position, subkey_nr] = \
+                                    np.maximum(
+                                        pccs[step_nr, position, subkey_nr],
+                                        range_pccs)
+
+                if not remaining_checkpoints:
+                    break
+
+        return pccs
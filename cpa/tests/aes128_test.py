@@ -0,0 +1,74 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+import aes128
+from tests.helpers import KNOWN_KEY
+
+
+class AES128Test(unittest.TestCase):
+    # The message of aes_cipher/main.c, and the key schedule, round 10 input
+    # states and ECB ciphertexts that aes_cipher/aes.c computes for its key.
+    MESSAGE = b"Input_Text_blck1Input_Text_blck2Input_Text_blck3" \
+        b"Input_Text_blck4"
+    KEY_SCHEDULE = (
+        "2b7e151628aed2a6abf7158809cf4f3ca0fafe1788542cb123a339392a6c7605"
+        "f2c295f27a96b9435935807a7359f67f3d80477d4716fe3e1e237e446d7a883b"
+        "ef44a541a8525b7fb671253bdb0bad00d4d1c6f87c839d87caf2b8bc11f915bc"
+        "6d88a37a110b3efddbf98641ca0093fd4e54f70e5f5fc9f384a64fb24ea6dc4f"
+        "ead27321b58dbad2312bf5607f8d292fac7766f319fadc2128d12941575c006e"
+        "d014f9a8c9ee2589e13f0cc8b6630ca6")
+    ROUND10_INPUTS = ["b801063cb24975e9d8e9fed8288142d7",
+                      "498db9b24c211a2b78dc97729600d4a0",
+                      "001347219bdd1b32f753474682e3c716",
+                      "61d4aa14d8d8e69b71bbae66f01ebf24"]
+    CIPHERTEXTS = ["bc2f42a6fef00962803363d6821f91c7",
+                   "ebe97148e0686dbe5d5c5a39263eaee6",
+                   "b3d559efdd03e374892eaceba51ea3fc",
+                   "3f751d9ea8042d73424da0dc3a2b8295"]
+
+    def test_matches_c_implementation(self):
+        plaintexts = np.frombuffer(self.MESSAGE, dtype=np.uint8).reshape(4, 16)
+
+        results = aes128.compute_intermediates(plaintexts, KNOWN_KEY,
+                                               aes128.INTERMEDIATES)
+
+        self.assertEqual(results["key_schedule"].tobytes().hex(),
+                         self.KEY_SCHEDULE)
+        self.assertEqual([state.tobytes().hex()
+                          for state in results["round10_in"]],
+                         self.ROUND10_INPUTS)
+        self.assertEqual([block.tobytes().hex()
+                          for block in results["ciphertext"]],
+                         self.CIPHERTEXTS)
+        np.testing.assert_array_equal(
+            results["round1_sbox_out"],
+            np.asarray(aes128.SBOX)[plaintexts ^ np.uint8(KNOWN_KEY)])
+
+    def test_key_per_block(self):
+        rng = np.random.RandomState(0)
+        plaintexts = rng.randint(0, 256, (1000, 16))
+        keys = rng.randint(0, 256, (1000, 16))
+
+        results = aes128.compute_intermediates(
+            plaintexts, keys, ["ciphertext", "key_schedule"], batch_size=300)
+
+        for i in [0, 299, 300, 999]:
+            self.assertEqual(results["key_schedule"][i].tolist(),
+                             aes128.expand_key(list(keys[i])))
+            np.testing.assert_array_equal(
+                results["ciphertext"][i],
+                aes128.encrypt(plaintexts[i], keys[i])[0])
+        # One plaintext under many keys, as when verifying key guesses.
+        np.testing.assert_array_equal(
+            aes128.encrypt(plaintexts[0], keys)[1],
+            aes128.encrypt(plaintexts[0], keys[1])[0])
+
+    def test_unknown_intermediate(self):
+        with self.assertRaises(ValueError):
+            aes128.compute_intermediates([0] * 16, KNOWN_KEY,
+                                         ["round5_state"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attacker import Attacker
+from binned_attacker import BinnedAttacker
+from streaming_attacker import StreamingAttacker
+from trace_source import TraceSource
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+class BinnedAttackTest(unittest.TestCase):
+    def test_bins_match_streaming_correlations(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 300, 40)
+
+        for leakage_model in ["hw_sbox", "hd_sbox"]:
+            streaming_attacker = StreamingAttacker(
+                leakage_model=leakage_model)
+            streaming_attacker.update(traces, plaintexts)
+            binned_attacker = BinnedAttacker(leakage_model=leakage_model)
+            for (start, end) in [(0, 1), (1, 140), (140, 300)]:
+                binned_attacker.update(traces[start:end],
+                                       plaintexts[start:end])
+
+            for byte_nr in [0, 9]:
+                np.testing.assert_allclose(
+                    binned_attacker.correlations(byte_nr),
+                    streaming_attacker.correlations(byte_nr), atol=1e-10)
+
+    def test_recovers_key_from_trace_source(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 120, 40)
+        attacker = Attacker(plaintexts)
+        attacker.obtain_full_private_key(traces)
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            traces_file = os.path.join(data_dir, "traces.npy")
+            np.save(traces_file, traces)
+            trace_source = TraceSource(traces_file, plaintexts,
+                                       memory_budget=100000)
+            binned_attacker = BinnedAttacker()
+            computed_key = binned_attacker.attack_trace_source(trace_source)
+            del trace_source
+
+        self.assertEqual(computed_key, KNOWN_KEY)
+        assert_coeffs_almost_equal(self, binned_attacker.subkey_corr_coeffs,
+                                   attacker.subkey_corr_coeffs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attack_analyser import AttackAnalyser
+from attacker import Attacker
+from bootstrap_estimator import BootstrapEstimator, select_points_of_interest
+from trace_source import TraceSource
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+class BootstrapTest(unittest.TestCase):
+    def test_weighted_resamples_match_attacks(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 80, 32)
+        estimator = BootstrapEstimator(traces, plaintexts)
+
+        rng = np.random.default_rng(0)
+        weights = estimator.resample_weights(30, 2, rng)
+        weights = np.vstack([weights,
+                             estimator.resample_weights(30, 1, rng,
+                                                        replace=False)])
+        pccs = estimator.resample_pccs(weights)
+
+        for (resample_weights, resample_pccs) in zip(weights, pccs):
+            # A trace drawn twice counts twice in the attack.
+            drawn = np.repeat(np.arange(80), resample_weights.astype(int))
+            attacker = Attacker(plaintexts[drawn])
+            attacker.obtain_full_private_key(traces[drawn])
+            assert_coeffs_almost_equal(self, resample_pccs,
+                                       attacker.subkey_corr_coeffs, [0, 5, 15])
+
+    def test_chunked_resamples_match_single_chunk(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 80, 32)
+        estimator = BootstrapEstimator(traces, plaintexts)
+        # Room for the weighted traces and sums of two resamples at most.
+        chunked = BootstrapEstimator(traces, plaintexts,
+                                     memory_budget=2 * (80 * 32 * 8 +
+                                                        4 * 256 * 32 * 8))
+
+        weights = estimator.resample_weights(30, 5, np.random.default_rng(3))
+        np.testing.assert_allclose(chunked.resample_pccs(weights),
+                                   estimator.resample_pccs(weights))
+
+    def test_vectorized_guessing_entropies(self):
+        analyser = AttackAnalyser()
+        rng = np.random.RandomState(1)
+        # Rounding produces ties, which must be ranked as in the dict version.
+        pccs = np.round(rng.uniform(0, 1, (3, 16, 256)), 2)
+
+        partial_guessing_entropies = \
+            analyser.compute_guessing_entropies(KNOWN_KEY, pccs)
+
+        for (attack_pccs, expected_pges) in zip(pccs,
+                                                partial_guessing_entropies):
+            subkey_coeffs = {subkey_nr: dict(enumerate(attack_pccs[subkey_nr]))
+                             for subkey_nr in range(16)}
+            self.assertEqual(
+                analyser.compute_partial_guessing_entropies(KNOWN_KEY,
+                                                            subkey_coeffs),
+                list(expected_pges))
+
+    def test_estimates_with_confidence_intervals(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 800, 40)
+
+        # The points are selected on other traces than are resampled.
+        with tempfile.TemporaryDirectory() as data_dir:
+            traces_file = os.path.join(data_dir, "traces.npy")
+            np.save(traces_file, traces)
+            trace_source = TraceSource(traces_file, plaintexts,
+                                       indices=np.arange(400, 800),
+                                       memory_budget=400000)
+            points = select_points_of_interest(trace_source, 1, [1, 2])
+            del trace_source
+
+        # Every key byte leaks at an odd sample point only.
+        np.testing.assert_array_equal(points[1], np.arange(1, 32, 2))
+        self.assertTrue(np.all(points[2] % 2 == 0))
+
+        estimator = BootstrapEstimator(traces[:400, points[1]],
+                                       plaintexts[:400])
+        rng = np.random.default_rng(2)
+        many_traces = estimator.estimate(KNOWN_KEY, 300, 40, rng)
+        few_traces = estimator.estimate(KNOWN_KEY, 5, 40, rng,
+                                        replace=False)
+
+        self.assertEqual(many_traces['GE'], 0)
+        self.assertEqual(many_traces['GE_HIGH'], 0)
+        self.assertEqual(many_traces['KEY_SR_LOW'], 1)
+        self.assertGreater(few_traces['GE'], 10)
+        self.assertLessEqual(few_traces['GE_LOW'], few_traces['GE'])
+        self.assertLessEqual(few_traces['GE'], few_traces['GE_HIGH'])
+
+
+if __name__ == '__main__':
+    unittest.main()
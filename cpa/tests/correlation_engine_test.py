@@ -0,0 +1,69 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attacker import Attacker
+from helpers import *
+from power_consumption_modeler import PowerConsumptionModeler
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+def reference_subkey_coeffs(plaintexts, power_samples, subkey_byte_index):
+    """The original trace-by-trace correlation loop of Attacker."""
+    coeffs = {}
+    modeler = PowerConsumptionModeler()
+    for subkey_guess in range(256):
+        consumptions = [
+            modeler.subkey_hamm_weight(
+                apply_sbox(plaintexts[i][subkey_byte_index] ^ subkey_guess))
+            for i in range(len(power_samples))
+        ]
+        sumnum = np.zeros(len(power_samples[0]))
+        sumden1 = np.zeros(len(power_samples[0]))
+        sumden2 = np.zeros(len(power_samples[0]))
+        cons_mean = np.mean(consumptions, dtype=np.float64)
+        traces_mean = np.mean(power_samples, axis=0, dtype=np.float64)
+        for trace_num in range(len(power_samples)):
+            hdiff = consumptions[trace_num] - cons_mean
+            tdiff = power_samples[trace_num] - traces_mean
+            sumnum = sumnum + hdiff * tdiff
+            sumden1 = sumden1 + hdiff * hdiff
+            sumden2 = sumden2 + tdiff * tdiff
+        coeffs[subkey_guess] = max(abs(sumnum / np.sqrt(sumden1 * sumden2)))
+    return coeffs
+
+
+class CorrelationEngineTest(unittest.TestCase):
+    def test_matches_reference_loop(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 50, 40)
+        attacker = Attacker(plaintexts)
+
+        for byte_nr in [0, 7]:
+            best_subkey = attacker.find_used_subkey(traces, 0, byte_nr)
+            expected = reference_subkey_coeffs(plaintexts, traces, byte_nr)
+
+            self.assertEqual(best_subkey, max(expected, key=expected.get))
+            assert_coeffs_almost_equal(self, attacker.subkey_corr_coeffs,
+                                       {byte_nr: expected}, [byte_nr])
+
+    def test_full_key_pass_matches_per_byte_attack(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 50, 40)
+        full_attacker = Attacker(plaintexts)
+        full_attacker.obtain_full_private_key(traces, bytes_per_chunk=3)
+
+        for byte_nr in range(16):
+            attacker = Attacker(plaintexts)
+            attacker.find_used_subkey(traces, 0, byte_nr)
+            assert_coeffs_almost_equal(self, full_attacker.subkey_corr_coeffs,
+                                       attacker.subkey_corr_coeffs, [byte_nr])
+
+    def test_recovers_simulated_key(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 200, 40)
+        attacker = Attacker(plaintexts)
+
+        self.assertEqual(attacker.obtain_full_private_key(traces), KNOWN_KEY)
+
+
+if __name__ == '__main__':
+    unittest.main()
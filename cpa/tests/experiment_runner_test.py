@@ -0,0 +1,117 @@
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from experiment_runner import ExperimentRunner
+from streaming_attacker import StreamingAttacker
+from tests.helpers import KNOWN_KEY, simulate_traces
+
+
+
+def attack_random_subset(cell, rng):
+    plaintexts, traces = simulate_traces(KNOWN_KEY, 100, 40)
+    indices = rng.choice(100, cell["TRACES_AMOUNT"], replace=False)
+    attacker = StreamingAttacker()
+    attacker.update(traces[indices, ::cell["SAMPLE_STEP"]],
+                    plaintexts[indices])
+    pccs = np.abs(attacker.correlations(0)).max(axis=1)
+
+    return [{"TRACES_AMOUNT": cell["TRACES_AMOUNT"],
+             "SAMPLE_STEP": cell["SAMPLE_STEP"],
+             "FIRST_INDEX": indices[0], "PCC": pccs[KNOWN_KEY[0]]}]
+
+
+def fail(cell, rng):
+    raise AssertionError(f"Cell {cell} should have been skipped.")
+
+
+def attack_new_traces_amounts(cell, rng):
+    if cell["TRACES_AMOUNT"] in ExperimentRunnerTest.GRID["TRACES_AMOUNT"]:
+        fail(cell, rng)
+    return attack_random_subset(cell, rng)
+
+
+class ExperimentRunnerTest(unittest.TestCase):
+    GRID = {"TRACES_AMOUNT": [10, 30, 60], "SAMPLE_STEP": [1, 3]}
+
+    def test_parallel_matches_serial(self):
+        with tempfile.TemporaryDirectory() as serial_dir, \
+                tempfile.TemporaryDirectory() as parallel_dir:
+            serial = ExperimentRunner(self.GRID, attack_random_subset,
+                                      serial_dir).run()
+            parallel = ExperimentRunner(self.GRID, attack_random_subset,
+                                        parallel_dir, workers=3).run()
+
+        self.assertEqual(len(serial), 6)
+        self.assertTrue(serial.equals(parallel))
+
+    def test_resumes_from_checkpoints(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            first_run = ExperimentRunner(self.GRID, attack_random_subset,
+                                         checkpoint_dir).run()
+            resumed_run = ExperimentRunner(self.GRID, fail,
+                                           checkpoint_dir).run()
+
+        self.assertTrue(first_run.equals(resumed_run))
+
+    def test_reruns_cells_of_other_config(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            ExperimentRunner(self.GRID, attack_random_subset, checkpoint_dir,
+                             config={"traces_hash": "a"}).run()
+
+            for runner in [
+                    ExperimentRunner(self.GRID, fail, checkpoint_dir,
+                                     config={"traces_hash": "b"}),
+                    ExperimentRunner(self.GRID, fail, checkpoint_dir,
+                                     seed=7, config={"traces_hash": "a"}),
+                    ExperimentRunner(self.GRID, fail, checkpoint_dir,
+                                     seed_params=["TRACES_AMOUNT"],
+                                     config={"traces_hash": "a"})]:
+                with self.assertRaises(AssertionError):
+                    runner.run()
+
+            rerun = ExperimentRunner(self.GRID, attack_random_subset,
+                                     checkpoint_dir, seed=7).run()
+            resumed_run = ExperimentRunner(self.GRID, fail, checkpoint_dir,
+                                           seed=7).run()
+
+        self.assertTrue(rerun.equals(resumed_run))
+
+    def test_grown_grid_reuses_stored_cells(self):
+        grown_grid = {"TRACES_AMOUNT": [5] + self.GRID["TRACES_AMOUNT"] +
+                      [90], "SAMPLE_STEP": self.GRID["SAMPLE_STEP"]}
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            first_run = ExperimentRunner(self.GRID, attack_random_subset,
+                                         checkpoint_dir).run()
+            # Only the cells of the new values run, the others are loaded.
+            grown_run = ExperimentRunner(grown_grid,
+                                         attack_new_traces_amounts,
+                                         checkpoint_dir).run()
+            rerun = ExperimentRunner(grown_grid, fail, checkpoint_dir).run()
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            fresh_run = ExperimentRunner(grown_grid, attack_random_subset,
+                                         checkpoint_dir).run()
+
+        self.assertEqual(len(grown_run), 10)
+        old_cells = grown_run["TRACES_AMOUNT"].isin(
+            self.GRID["TRACES_AMOUNT"])
+        self.assertTrue(grown_run[old_cells].reset_index(drop=True).equals(
+            first_run))
+        self.assertTrue(grown_run.equals(rerun))
+        self.assertTrue(grown_run.equals(fresh_run))
+
+    def test_seed_params_share_random_numbers(self):
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            results = ExperimentRunner(self.GRID, attack_random_subset,
+                                       checkpoint_dir,
+                                       seed_params=["TRACES_AMOUNT"]).run()
+
+        for (_, cells) in results.groupby("TRACES_AMOUNT"):
+            self.assertEqual(cells["FIRST_INDEX"].nunique(), 1)
+        self.assertGreater(results["FIRST_INDEX"].nunique(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from helpers import apply_sbox
+from power_consumption_modeler import PowerConsumptionModeler
+
+# The key of aes_cipher/main.c, which is also the FIPS-197 example key.
+KNOWN_KEY = [43, 126, 21, 22, 40, 174, 210, 166,
+             171, 247, 21, 136, 9, 207, 79, 60]
+
+
+def simulate_traces(key, traces_amnt, samples_amnt, seed=0):
+    """Simulates noisy power traces that leak the Hamming weight of the first
+    round SubBytes output of every key byte at its own sample point."""
+    rng = np.random.RandomState(seed)
+    plaintexts = rng.randint(0, 256, (traces_amnt, 16))
+    traces = rng.normal(0, 1, (traces_amnt, samples_amnt))
+    for byte_nr in range(16):
+        leak = [PowerConsumptionModeler.SUBKEY_HAMM_WEIGHTS[
+            apply_sbox(p ^ key[byte_nr])] for p in plaintexts[:, byte_nr]]
+        traces[:, 2 * byte_nr + 1] += leak
+    return plaintexts, traces
+
+
+def assert_coeffs_almost_equal(test_case, computed_coeffs, expected_coeffs,
+                               byte_nrs=range(16), delta=None):
+    """Asserts that two attacks gave every guess of the given subkeys almost
+    the same correlation coefficient."""
+    for byte_nr in byte_nrs:
+        for guess in range(256):
+            test_case.assertAlmostEqual(computed_coeffs[byte_nr][guess],
+                                        expected_coeffs[byte_nr][guess],
+                                        delta=delta)
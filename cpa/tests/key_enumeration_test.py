@@ -0,0 +1,78 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+import aes128
+from key_enumerator import KeyEnumerator
+from tests.helpers import KNOWN_KEY
+
+
+class KeyEnumerationTest(unittest.TestCase):
+    PLAINTEXT = [50, 67, 246, 168, 136, 90, 48, 141,
+                 49, 49, 152, 162, 224, 55, 7, 52]
+
+    def test_enumerates_in_decreasing_score(self):
+        rng = np.random.RandomState(0)
+        scores = rng.normal(0, 1, (16, 256))
+        enumerator = KeyEnumerator(scores, batch_size=1000)
+
+        keys = []
+        key_scores = []
+        for (batch_keys, batch_scores) in enumerator.candidates():
+            keys.append(batch_keys)
+            key_scores.append(batch_scores)
+            if sum(map(len, keys)) >= 50000:
+                break
+        keys = np.vstack(keys)
+        key_scores = np.concatenate(key_scores)
+
+        self.assertTrue(np.all(np.diff(key_scores) <= 1e-9))
+        np.testing.assert_allclose(
+            key_scores, scores[np.arange(16), keys.astype(int)].sum(axis=1))
+        self.assertEqual(len(np.unique(keys, axis=0)), len(keys))
+        self.assertEqual(list(keys[0]), list(np.argmax(scores, axis=1)))
+
+    def test_enumerates_all_keys_of_few_guesses(self):
+        # Only the first two subkeys are uncertain, so the best 2^16 keys
+        # are all of their pairs.
+        rng = np.random.RandomState(1)
+        scores = np.zeros((16, 256))
+        scores[np.arange(16), KNOWN_KEY] = 100
+        scores[:2] = rng.uniform(0, 1, (2, 256))
+        enumerator = KeyEnumerator(scores, batch_size=4096)
+
+        key_scores = []
+        for (_, batch_scores) in enumerator.candidates():
+            key_scores.append(batch_scores)
+            if sum(map(len, key_scores)) >= 256 * 256:
+                break
+        key_scores = np.concatenate(key_scores)[:256 * 256]
+
+        pair_scores = scores[0][:, np.newaxis] + scores[1][np.newaxis, :]
+        np.testing.assert_allclose(
+            key_scores, np.sort(pair_scores.ravel())[::-1] + 1400)
+
+    def test_recovers_key_of_low_ranked_subkeys(self):
+        rng = np.random.RandomState(2)
+        scores = rng.uniform(0, 1, (16, 256))
+        scores[np.arange(16), KNOWN_KEY] = 2
+        # The attack ranked three subkeys of the known key low.
+        for (byte_nr, rank) in [(3, 5), (8, 20), (12, 40)]:
+            scores[byte_nr][KNOWN_KEY[byte_nr]] = \
+                np.sort(scores[byte_nr])[::-1][rank]
+        ciphertext = aes128.encrypt(self.PLAINTEXT, KNOWN_KEY)[0]
+
+        enumerator = KeyEnumerator(scores, batch_size=2 ** 14)
+        found_key = enumerator.search(self.PLAINTEXT, ciphertext,
+                                      budget=2 ** 18)
+        self.assertEqual(found_key, KNOWN_KEY)
+        self.assertGreater(enumerator.keys_tested, 1)
+        self.assertGreater(enumerator.keys_per_second, 0)
+
+        found_key = enumerator.search(self.PLAINTEXT, ciphertext, budget=100)
+        self.assertIsNone(found_key)
+        self.assertEqual(enumerator.keys_tested, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
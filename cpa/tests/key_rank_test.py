@@ -0,0 +1,64 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attack_analyser import AttackAnalyser
+from tests.helpers import KNOWN_KEY
+
+
+class KeyRankTest(unittest.TestCase):
+    def simulate_scores(self, seed):
+        """Scores of which only the first two subkeys are uncertain. Any key
+        with another wrong subkey scores far lower than the known key, so
+        the exact rank follows from the 2^16 pairs of the first two."""
+        rng = np.random.RandomState(seed)
+        scores = np.zeros((16, 256))
+        scores[np.arange(16), KNOWN_KEY] = 10
+        scores[:2] = rng.uniform(0, 1, (2, 256))
+
+        pair_scores = scores[0][:, np.newaxis] + scores[1][np.newaxis, :]
+        known_pair_score = pair_scores[KNOWN_KEY[0], KNOWN_KEY[1]]
+        exact_rank = int((pair_scores > known_pair_score).sum())
+        return scores, exact_rank
+
+    def test_bounds_contain_exact_rank(self):
+        analyser = AttackAnalyser()
+
+        for seed in range(5):
+            scores, exact_rank = self.simulate_scores(seed)
+            (lower, upper) = analyser.compute_key_rank_bounds(
+                KNOWN_KEY, scores)
+
+            self.assertLessEqual(lower, exact_rank)
+            self.assertGreaterEqual(upper, exact_rank)
+
+    def test_more_bins_tighten_bounds(self):
+        analyser = AttackAnalyser()
+        rng = np.random.RandomState(7)
+        scores = rng.normal(0, 1, (16, 256))
+
+        (coarse_lower, coarse_upper) = analyser.compute_key_rank_bounds(
+            KNOWN_KEY, scores, bins_amnt=256)
+        (fine_lower, fine_upper) = analyser.compute_key_rank_bounds(
+            KNOWN_KEY, scores, bins_amnt=2048)
+
+        self.assertLessEqual(coarse_lower, fine_lower)
+        self.assertLessEqual(fine_lower, fine_upper)
+        self.assertLessEqual(fine_upper, coarse_upper)
+        # A random key ranks somewhere around the middle of 2^128 keys.
+        self.assertGreater(np.log2(fine_lower), 100)
+        self.assertLess(np.log2(fine_upper), 128)
+
+    def test_best_key_ranks_first(self):
+        analyser = AttackAnalyser()
+        pccs = np.full((16, 256), 0.1)
+        pccs[np.arange(16), KNOWN_KEY] = 0.9
+
+        scores = analyser.compute_correlation_scores(pccs, 100)
+        (lower, upper) = analyser.compute_key_rank_bounds(KNOWN_KEY, scores)
+
+        self.assertEqual((lower, upper), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
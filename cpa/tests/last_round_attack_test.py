@@ -0,0 +1,42 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from aes128 import (SBOX, SHIFT_ROWS_SOURCES, expand_key,
+                    invert_key_schedule)
+from last_round_attacker import LastRoundAttacker
+from power_consumption_modeler import HAMM_WEIGHTS
+from tests.helpers import KNOWN_KEY
+
+
+class LastRoundAttackTest(unittest.TestCase):
+    def test_key_schedule(self):
+        # The key expansion example of FIPS-197, appendix A.1.
+        round_keys = expand_key(KNOWN_KEY)
+
+        self.assertEqual(bytes(round_keys[10]).hex(),
+                         "d014f9a8c9ee2589e13f0cc8b6630ca6")
+        for round_nr in range(11):
+            self.assertEqual(
+                invert_key_schedule(round_keys[round_nr], round_nr),
+                KNOWN_KEY)
+
+    def test_obtain_master_key(self):
+        last_round_key = np.array(expand_key(KNOWN_KEY)[10])
+
+        # Simulate the last round on random states and leak the Hamming
+        # distance of every state byte to the ciphertext byte replacing it.
+        rng = np.random.RandomState(4)
+        states = rng.randint(0, 256, (400, 16))
+        ciphertexts = np.asarray(SBOX)[states][:, SHIFT_ROWS_SOURCES] ^ \
+            last_round_key
+        traces = rng.normal(0, 1, (400, 32))
+        traces[:, :16] += HAMM_WEIGHTS[states ^ ciphertexts]
+
+        attacker = LastRoundAttacker(ciphertexts)
+
+        self.assertEqual(attacker.obtain_master_key(traces), KNOWN_KEY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attacker import Attacker
+from helpers import *
+from power_consumption_modeler import LEAKAGE_MODELS, PowerConsumptionModeler
+from tests.helpers import KNOWN_KEY
+
+
+class LeakageModelTest(unittest.TestCase):
+    def test_hypothesis_tables(self):
+        modeler = PowerConsumptionModeler()
+        for (plaintext_byte, guess) in [(0, 0), (17, 200), (255, 3)]:
+            sbox_in = plaintext_byte ^ guess
+            sbox_out = apply_sbox(sbox_in)
+            expected = {
+                "hw_sbox": modeler.hamming_weight(sbox_out),
+                "hw_sbox_in": modeler.hamming_weight(sbox_in),
+                "hd_sbox": modeler.hamming_dist(bin(sbox_in)[2:].zfill(8),
+                                                bin(sbox_out)[2:].zfill(8)),
+                "identity": sbox_out,
+                "sbox_bit7": sbox_out >> 7,
+            }
+            for (model, consumption) in expected.items():
+                table = PowerConsumptionModeler(model).hypothesis_table
+                self.assertEqual(table[plaintext_byte, guess], consumption)
+
+    def test_classes_amnt(self):
+        self.assertEqual(PowerConsumptionModeler().classes_amnt(), 9)
+        self.assertEqual(
+            PowerConsumptionModeler("identity").classes_amnt(), 256)
+        self.assertEqual(
+            PowerConsumptionModeler("sbox_bit0").classes_amnt(), 2)
+
+    def test_unknown_model(self):
+        self.assertRaises(ValueError, PowerConsumptionModeler, "hw_round11")
+
+    def test_attack_with_selected_model(self):
+        rng = np.random.RandomState(3)
+        plaintexts = rng.randint(0, 256, (300, 16))
+        traces = rng.normal(0, 1, (300, 32))
+        table = LEAKAGE_MODELS["hd_sbox"]()
+        for byte_nr in range(16):
+            traces[:, 2 * byte_nr] += \
+                table[plaintexts[:, byte_nr], KNOWN_KEY[byte_nr]]
+
+        attacker = Attacker(plaintexts, leakage_model="hd_sbox")
+
+        self.assertEqual(attacker.obtain_full_private_key(traces), KNOWN_KEY)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attacker import Attacker
+from operation_locator import OperationLocator, windows_from_scores
+from power_consumption_modeler import HAMM_WEIGHTS
+from streaming_attacker import StreamingAttacker
+from trace_source import TraceSource
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+class OperationLocatorTest(unittest.TestCase):
+    LEAKING_POINTS = [130, 131, 320]
+
+    def simulate_plaintext_leakage(self):
+        rng = np.random.RandomState(3)
+        plaintexts = rng.randint(0, 256, (400, 16))
+        traces = rng.normal(0, 1, (400, 500))
+        for (byte_nr, point) in enumerate(self.LEAKING_POINTS):
+            traces[:, point] += 2 * HAMM_WEIGHTS[plaintexts[:, byte_nr]]
+        return plaintexts, traces
+
+    def test_windows_contain_leaking_points(self):
+        plaintexts, traces = self.simulate_plaintext_leakage()
+
+        for method in ["snr", "correlation"]:
+            locator = OperationLocator(method=method)
+            for start in range(0, 400, 150):
+                locator.update(traces[start:start + 150],
+                               plaintexts[start:start + 150])
+            windows = locator.locate_windows(fraction=0.006, margin=10)
+
+            self.assertEqual(windows, [(120, 142), (310, 331)])
+
+    def test_windows_contain_sbox_output_leakage(self):
+        # The traces leak the SubBytes output of every key byte, which the
+        # locators find without the key.
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 1000, 400)
+        leaking_points = np.arange(1, 32, 2)
+
+        for method in ["snr", "correlation"]:
+            locator = OperationLocator(method=method)
+            locator.update(traces, plaintexts)
+            windows = locator.locate_windows(fraction=16 / 400, margin=0)
+
+            self.assertEqual(windows, [(point, point + 1)
+                                       for point in leaking_points])
+
+    def test_scores_of_sample_ranges_match_one_pass(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 300, 60)
+
+        for method in OperationLocator.METHODS:
+            one_pass = OperationLocator(method=method)
+            one_pass.update(traces, plaintexts)
+            scores = []
+            for (start, end) in [(0, 25), (25, 60)]:
+                locator = OperationLocator(method=method)
+                locator.update(traces[:, start:end], plaintexts)
+                scores.append(locator.scores())
+
+            np.testing.assert_allclose(np.concatenate(scores),
+                                       one_pass.scores())
+            self.assertEqual(
+                windows_from_scores(np.concatenate(scores), 0.1, 2),
+                one_pass.locate_windows(0.1, 2))
+
+    def test_batches_match_one_pass(self):
+        plaintexts, traces = self.simulate_plaintext_leakage()
+
+        for method in OperationLocator.METHODS:
+            one_pass = OperationLocator(method=method)
+            one_pass.update(traces, plaintexts)
+            batched = OperationLocator(method=method)
+            for (start, end) in [(0, 1), (1, 170), (170, 400)]:
+                batched.update(traces[start:end], plaintexts[start:end])
+
+            np.testing.assert_allclose(batched.scores(), one_pass.scores())
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            OperationLocator(method="entropy")
+
+    def test_attack_restricted_to_windows(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 120, 40)
+        windows = [(0, 11), (20, 33)]
+        columns = np.r_[0:11:2, 20:33:2]
+
+        attacker = Attacker(plaintexts)
+        attacker.obtain_full_private_key(traces[:, columns])
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            traces_file = os.path.join(data_dir, "traces.npy")
+            np.save(traces_file, traces)
+            indices = np.random.RandomState(2).permutation(120)
+            trace_source = TraceSource(traces_file, plaintexts,
+                                       indices=indices, step=2,
+                                       memory_budget=40000, windows=windows)
+            streaming_attacker = StreamingAttacker()
+            streaming_attacker.attack_trace_source(trace_source)
+            del trace_source
+
+        assert_coeffs_almost_equal(self, streaming_attacker.subkey_corr_coeffs,
+                                   attacker.subkey_corr_coeffs)
+
+
+if __name__ == '__main__':
+    unittest.main()
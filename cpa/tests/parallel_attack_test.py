@@ -0,0 +1,28 @@
+import unittest  # Run tests from this folder's parent directory
+
+from attacker import Attacker
+from parallel_attacker import ParallelAttacker
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+class ParallelAttackTest(unittest.TestCase):
+    def test_sharded_attack_matches_serial_attack(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 100, 40)
+        attacker = Attacker(plaintexts)
+        expected_key = attacker.obtain_full_private_key(traces)
+
+        parallel_attacker = ParallelAttacker(plaintexts, workers=2,
+                                             sample_shards=3)
+        computed_key = parallel_attacker.obtain_full_private_key(traces)
+
+        self.assertEqual(computed_key, expected_key)
+        self.assertEqual(
+            sum(n for (_, n) in parallel_attacker.worker_timings.values()),
+            3 + 16 * 3)
+        assert_coeffs_almost_equal(self, parallel_attacker.subkey_corr_coeffs,
+                                   attacker.subkey_corr_coeffs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attacker import Attacker
+from streaming_attacker import StreamingAttacker
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+class PrecisionTest(unittest.TestCase):
+    # The correlations of the float32 path may deviate this much at most.
+    TOLERANCE = 1e-5
+
+    def setUp(self):
+        # Quantize the simulated traces to signed bytes like the scope does.
+        self.plaintexts, traces = simulate_traces(KNOWN_KEY, 500, 40)
+        self.traces = np.clip(np.round(traces * 20), -128, 127)
+        self.traces = self.traces.astype(np.int8)
+
+    def assert_coeffs_close(self, computed_coeffs, expected_coeffs):
+        assert_coeffs_almost_equal(self, computed_coeffs, expected_coeffs,
+                                   delta=self.TOLERANCE)
+
+    def test_float32_attack_matches_float64_attack(self):
+        attacker = Attacker(self.plaintexts)
+        expected_key = attacker.obtain_full_private_key(
+            self.traces.astype(np.float64))
+
+        float32_attacker = Attacker(self.plaintexts, dtype=np.float32)
+        computed_key = float32_attacker.obtain_full_private_key(self.traces)
+
+        self.assertEqual(expected_key, KNOWN_KEY)
+        self.assertEqual(computed_key, expected_key)
+        self.assert_coeffs_close(float32_attacker.subkey_corr_coeffs,
+                                 attacker.subkey_corr_coeffs)
+
+    def test_float32_streaming_matches_float64_attack(self):
+        attacker = Attacker(self.plaintexts)
+        expected_key = attacker.obtain_full_private_key(
+            self.traces.astype(np.float64))
+
+        streaming_attacker = StreamingAttacker(dtype=np.float32)
+        for start in range(0, len(self.traces), 64):
+            streaming_attacker.update(self.traces[start:start + 64],
+                                      self.plaintexts[start:start + 64])
+        computed_key = streaming_attacker.obtain_full_private_key()
+
+        self.assertEqual(computed_key, expected_key)
+        self.assert_coeffs_close(streaming_attacker.subkey_corr_coeffs,
+                                 attacker.subkey_corr_coeffs)
+
+
+if __name__ == '__main__':
+    unittest.main()
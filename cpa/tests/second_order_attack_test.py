@@ -0,0 +1,139 @@
+import unittest  # Run tests from this folder's parent directory
+import tracemalloc
+
+import numpy as np
+
+from helpers import apply_sbox
+from power_consumption_modeler import HAMM_WEIGHTS
+from correlation import correlation_matrix, normalize_columns
+from second_order_attacker import SecondOrderAttacker, attack_tile
+from tests.helpers import assert_coeffs_almost_equal
+
+
+def simulate_masked_traces(key_byte, traces_amnt, samples_amnt, seed=0):
+    """Simulates noisy power traces of a first order masked implementation,
+    which leak the Hamming weight of a random mask at one sample point and
+    of the masked first SubBytes output at another."""
+    rng = np.random.RandomState(seed)
+    plaintexts = rng.randint(0, 256, (traces_amnt, 16))
+    masks = rng.randint(0, 256, traces_amnt)
+    sbox_outputs = np.array([apply_sbox(p ^ key_byte)
+                             for p in plaintexts[:, 0]])
+
+    traces = rng.normal(0, 0.5, (traces_amnt, samples_amnt))
+    traces[:, 3] += HAMM_WEIGHTS[masks]
+    traces[:, 9] += HAMM_WEIGHTS[sbox_outputs ^ masks]
+    return plaintexts, traces
+
+
+class SecondOrderAttackTest(unittest.TestCase):
+    KEY_BYTE = 43
+
+    @staticmethod
+    def pairs_budget(traces_amnt, pairs_amnt):
+        """The memory budget of a tile of the given amount of pairs of
+        float64 samples."""
+        return pairs_amnt * 2 * (traces_amnt + 256) * 8
+
+    def test_recovers_masked_subkey(self):
+        plaintexts, traces = simulate_masked_traces(self.KEY_BYTE, 3000, 14)
+
+        for combination in SecondOrderAttacker.COMBINATIONS:
+            attacker = SecondOrderAttacker(plaintexts, window=(2, 12),
+                                           combination=combination)
+            [subkey] = attacker.obtain_full_private_key(traces,
+                                                        only_first_byte=True)
+            self.assertEqual(subkey, self.KEY_BYTE)
+
+    def test_single_pair_matches_direct_combination(self):
+        plaintexts, traces = simulate_masked_traces(self.KEY_BYTE, 500, 14)
+        # Sample points with different means, which centering would shift
+        # apart in the absolute difference.
+        x = traces[:, [3, 9]] + [0, 5]
+        directly_combined = {
+            "product": (x[:, 0] - x[:, 0].mean()) * (x[:, 1] - x[:, 1].mean()),
+            "abs_diff": np.abs(x[:, 0] - x[:, 1])}
+
+        for combination in SecondOrderAttacker.COMBINATIONS:
+            attacker = SecondOrderAttacker(plaintexts,
+                                           combination=combination)
+            attacker.obtain_full_private_key(x, only_first_byte=True)
+            expected = np.abs(correlation_matrix(
+                attacker.model_consumptions(500, 0),
+                directly_combined[combination][:, np.newaxis]))[:, 0]
+            assert_coeffs_almost_equal(self, attacker.subkey_corr_coeffs,
+                                       [expected], [0])
+
+    def test_tiles_match_single_tile(self):
+        plaintexts, traces = simulate_masked_traces(self.KEY_BYTE, 200, 14)
+
+        single_tile = SecondOrderAttacker(plaintexts)
+        single_tile.obtain_full_private_key(traces, only_first_byte=True)
+        self.assertEqual(len(single_tile.tiles(200, 14)), 1)
+
+        # Blocks of 3 sample points, so some tiles only partially count.
+        tiled = SecondOrderAttacker(plaintexts,
+                                    memory_budget=self.pairs_budget(200, 9))
+        self.assertEqual(len(tiled.tiles(200, 14)), 15)
+        tiled.obtain_full_private_key(traces, only_first_byte=True)
+
+        parallel = SecondOrderAttacker(plaintexts, workers=2,
+                                       memory_budget=self.pairs_budget(
+                                           200, 18))
+        parallel.obtain_full_private_key(traces, only_first_byte=True)
+
+        assert_coeffs_almost_equal(self, tiled.subkey_corr_coeffs,
+                                   single_tile.subkey_corr_coeffs, [0])
+        assert_coeffs_almost_equal(self, parallel.subkey_corr_coeffs,
+                                   single_tile.subkey_corr_coeffs, [0])
+
+    def test_sample_steps_match_decimated_attacks(self):
+        plaintexts, traces = simulate_masked_traces(self.KEY_BYTE, 200, 14)
+
+        for combination in SecondOrderAttacker.COMBINATIONS:
+            attacker = SecondOrderAttacker(
+                plaintexts, window=(1, 14), combination=combination,
+                memory_budget=self.pairs_budget(200, 9))
+            step_results = attacker.attack_sample_steps(
+                traces, [1, 2, 3], only_first_byte=True)
+
+            for step in [1, 2, 3]:
+                decimated = SecondOrderAttacker(plaintexts,
+                                                combination=combination)
+                [subkey] = decimated.obtain_full_private_key(
+                    traces[:, 1:14:step], only_first_byte=True)
+                (best_guess, subkey_coeffs) = step_results[step]
+                self.assertEqual(best_guess, [subkey])
+                assert_coeffs_almost_equal(self, subkey_coeffs,
+                                           decimated.subkey_corr_coeffs, [0])
+
+    def test_tile_peak_within_budget(self):
+        traces_amnt = 1000
+        plaintexts, traces = simulate_masked_traces(self.KEY_BYTE,
+                                                    traces_amnt, 60)
+        window = traces - traces.mean(axis=0)
+        memory_budget = 2 * 1024 ** 2
+
+        attacker = SecondOrderAttacker(plaintexts, workers=2,
+                                       memory_budget=memory_budget)
+        hypotheses = normalize_columns(
+            attacker.model_consumptions(traces_amnt, 0))[np.newaxis]
+        tiles = attacker.tiles(traces_amnt, 60)
+        self.assertGreater(len(tiles), 1)
+
+        for combination in SecondOrderAttacker.COMBINATIONS:
+            tracemalloc.start()
+            for tile in tiles:
+                attack_tile(window, hypotheses, tile, combination,
+                            np.float64)
+            (_, peak) = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.assertLessEqual(peak, memory_budget // 2)
+
+    def test_unknown_combination(self):
+        with self.assertRaises(ValueError):
+            SecondOrderAttacker([], combination="sum")
+
+
+if __name__ == '__main__':
+    unittest.main()
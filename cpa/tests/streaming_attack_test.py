@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from attacker import Attacker
+from streaming_attacker import StreamingAttacker
+from trace_source import TraceSource
+from tests.helpers import (KNOWN_KEY, assert_coeffs_almost_equal,
+                           simulate_traces)
+
+
+class StreamingAttackTest(unittest.TestCase):
+    def test_batches_match_one_shot_attack(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 120, 40)
+        attacker = Attacker(plaintexts)
+        expected_key = attacker.obtain_full_private_key(traces)
+
+        streaming_attacker = StreamingAttacker()
+        for (start, end) in [(0, 1), (1, 30), (30, 31), (31, 120)]:
+            streaming_attacker.update(traces[start:end],
+                                      plaintexts[start:end])
+        computed_key = streaming_attacker.obtain_full_private_key()
+
+        self.assertEqual(computed_key, expected_key)
+        assert_coeffs_almost_equal(self, streaming_attacker.subkey_corr_coeffs,
+                                   attacker.subkey_corr_coeffs)
+
+    def test_last_batch_with_parent_parameter_order(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 120, 40)
+        expected_key = Attacker(plaintexts).obtain_full_private_key(traces)
+
+        streaming_attacker = StreamingAttacker()
+        streaming_attacker.update(traces[:30], plaintexts[:30])
+        computed_key = streaming_attacker.obtain_full_private_key(
+            traces[30:], False, plaintexts=plaintexts[30:])
+        self.assertEqual(computed_key, expected_key)
+
+        # Positionally, the second parameter is only_first_byte, as for an
+        # Attacker.
+        first_subkey = streaming_attacker.obtain_full_private_key(None, True)
+        self.assertEqual(first_subkey, expected_key[:1])
+
+    def test_trace_source_matches_in_memory_attack(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 120, 40)
+        indices = np.random.RandomState(1).choice(120, 90, replace=False)
+
+        attacker = Attacker(plaintexts[indices])
+        expected_key = attacker.obtain_full_private_key(traces[indices, 1::2])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            traces_file = os.path.join(tmp_dir, "traces.npy")
+            np.save(traces_file, traces)
+
+            # A tiny memory budget forces several sample ranges and batches.
+            trace_source = TraceSource(traces_file, plaintexts,
+                                       indices=indices, start=1, step=2,
+                                       memory_budget=500000)
+            streaming_attacker = StreamingAttacker()
+            computed_key = streaming_attacker.attack_trace_source(
+                trace_source)
+            del trace_source
+
+        self.assertEqual(computed_key, expected_key)
+        assert_coeffs_almost_equal(self, streaming_attacker.subkey_corr_coeffs,
+                                   attacker.subkey_corr_coeffs)
+
+    def test_checkpoints_match_attacks_on_prefixes(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 100, 40)
+        order = np.random.RandomState(2).permutation(100)
+        checkpoints = [3, 12, 48, 90]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            traces_file = os.path.join(tmp_dir, "traces.npy")
+            np.save(traces_file, traces)
+
+            trace_source = TraceSource(traces_file, plaintexts, indices=order,
+                                       memory_budget=1000000,
+                                       sort_indices=False)
+            results = StreamingAttacker().attack_checkpoints(trace_source,
+                                                             checkpoints)
+            del trace_source
+
+        for checkpoint in checkpoints:
+            prefix = order[:checkpoint]
+            attacker = Attacker(plaintexts[prefix])
+            expected_key = attacker.obtain_full_private_key(traces[prefix])
+            (computed_key, subkey_coeffs) = results[checkpoint]
+
+            # With few traces, many guesses correlate perfectly and tie.
+            if checkpoint == checkpoints[-1]:
+                self.assertEqual(computed_key, expected_key)
+            assert_coeffs_almost_equal(self, subkey_coeffs,
+                                       attacker.subkey_corr_coeffs)
+
+    def test_invalid_checkpoints(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 60, 40)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            traces_file = os.path.join(tmp_dir, "traces.npy")
+            np.save(traces_file, traces)
+            trace_source = TraceSource(traces_file, plaintexts)
+
+            for checkpoints in [[0, 30], [30, 61], [30, 30, 60]]:
+                with self.assertRaises(ValueError):
+                    StreamingAttacker().checkpoint_step_pccs(
+                        trace_source, checkpoints, [1], 16)
+            del trace_source
+
+    def test_sample_steps_match_decimated_sources(self):
+        plaintexts, traces = simulate_traces(KNOWN_KEY, 60, 40)
+        order = np.random.RandomState(3).permutation(60)
+        checkpoints = [12, 60]
+        windows = [(1, 14), (25, 39)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            traces_file = os.path.join(tmp_dir, "traces.npy")
+            np.save(traces_file, traces)
+
+            for source_windows in [None, windows]:
+                trace_source = TraceSource(traces_file, plaintexts,
+                                           indices=order, end=-1,
+                                           memory_budget=300000,
+                                           sort_indices=False,
+                                           windows=source_windows)
+                results = StreamingAttacker().attack_step_checkpoints(
+                    trace_source, checkpoints, [1, 4, 16])
+
+                for step in [1, 4, 16]:
+                    decimated_source = TraceSource(
+                        traces_file, plaintexts, indices=order, end=-1,
+                        step=step, memory_budget=300000, sort_indices=False,
+                        windows=source_windows)
+                    expected = StreamingAttacker().attack_checkpoints(
+                        decimated_source, checkpoints)
+
+                    for checkpoint in checkpoints:
+                        (_, subkey_coeffs) = results[step][checkpoint]
+                        (_, expected_coeffs) = expected[checkpoint]
+                        assert_coeffs_almost_equal(self, subkey_coeffs,
+                                                   expected_coeffs)
+                del trace_source, decimated_source
+
+
+if __name__ == '__main__':
+    unittest.main()
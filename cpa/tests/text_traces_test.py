@@ -0,0 +1,33 @@
+import unittest  # Run tests from this folder's parent directory
+import os
+
+import numpy as np
+
+from run_cpa import load_text_traces
+
+TRACES_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "scope",
+                           "data", "output", "2019-05-08_2", "trace_math_10")
+
+
+class TextTracesTest(unittest.TestCase):
+    def setUp(self):
+        self.traces = load_text_traces(TRACES_FILE)
+
+    def test_loads_every_trace(self):
+        with open(TRACES_FILE) as file:
+            lines = file.readlines()
+        self.assertEqual(len(self.traces), len(lines))
+
+        first = [int(point) for point in
+                 lines[0].strip("\n").strip("(").strip(")").split(",")]
+        np.testing.assert_array_equal(self.traces[0], first)
+
+    def test_unsigned_samples_do_not_overflow(self):
+        # The capture holds samples of up to 255, which int8 would wrap.
+        self.assertEqual(self.traces.max(), 255)
+        self.assertGreaterEqual(self.traces.min(), 0)
+        self.assertEqual(self.traces.dtype, np.uint8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+from trace_alignment import TraceAligner
+
+
+def simulate_desynchronized_traces(traces_amnt, samples_amnt, max_delay,
+                                   seed=0):
+    """Simulates noisy copies of one random trace, each delayed by a random
+    amount of sample points."""
+    rng = np.random.RandomState(seed)
+    template = rng.normal(0, 10, samples_amnt + 2 * max_delay)
+    delays = rng.randint(-max_delay, max_delay + 1, traces_amnt)
+    traces = np.array([template[max_delay - delay:
+                                max_delay - delay + samples_amnt]
+                       for delay in delays])
+    traces += rng.normal(0, 1, traces.shape)
+    return traces, delays
+
+
+class TraceAlignmentTest(unittest.TestCase):
+    def test_finds_delays(self):
+        traces, delays = simulate_desynchronized_traces(50, 300, 20)
+        aligner = TraceAligner(traces[0], (100, 200), max_shift=40,
+                               batch_size=16)
+
+        (aligned, shifts) = aligner.align(traces)
+
+        np.testing.assert_array_equal(shifts, delays - delays[0])
+        # Away from the edges, the aligned traces only differ by the noise.
+        differences = aligned[:, 50:250] - aligned[0, 50:250]
+        self.assertLess(np.abs(differences).max(), 10)
+
+    def test_file_matches_in_memory_alignment(self):
+        traces, _ = simulate_desynchronized_traces(30, 200, 10, seed=1)
+        traces = np.round(traces).astype(np.int8)
+        aligner = TraceAligner(traces[0], (80, 120), max_shift=15,
+                               batch_size=7)
+        (expected_aligned, expected_shifts) = aligner.align(traces)
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            traces_file = os.path.join(data_dir, "traces.npy")
+            aligned_file = os.path.join(data_dir, "aligned.npy")
+            shifts_file = os.path.join(data_dir, "shifts.npy")
+            np.save(traces_file, traces)
+
+            shifts = aligner.align_file(traces_file, aligned_file,
+                                        shifts_file)
+            aligned = np.load(aligned_file)
+
+            np.testing.assert_array_equal(shifts, expected_shifts)
+            np.testing.assert_array_equal(np.load(shifts_file), shifts)
+            np.testing.assert_array_equal(aligned, expected_aligned)
+            self.assertEqual(aligned.dtype, np.int8)
+
+
+if __name__ == '__main__':
+    unittest.main()
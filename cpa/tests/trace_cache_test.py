@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest  # Run tests from this folder's parent directory
+from functools import partial
+
+import numpy as np
+
+from trace_cache import TraceCache, crop_traces
+
+
+class TraceCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        self.traces_file = os.path.join(self.tmp_dir.name, "traces.npy")
+        self.traces = np.random.RandomState(0).randint(
+            -128, 128, (20, 100)).astype(np.int8)
+        np.save(self.traces_file, self.traces)
+        self.preprocessed = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def crop(self, source_file, entry_dir, step):
+        self.preprocessed.append(step)
+        crop_traces(source_file, entry_dir, start=10, end=90, step=step)
+
+    def load(self, cache, step):
+        return cache.load(self.traces_file,
+                          {"preprocessing": "crop", "step": step},
+                          partial(self.crop, step=step))
+
+    def test_hits_skip_preprocessing(self):
+        cache = TraceCache(self.cache_dir)
+
+        first = self.load(cache, 4)
+        second = self.load(TraceCache(self.cache_dir), 4)
+        other_step = self.load(cache, 2)
+
+        self.assertEqual(self.preprocessed, [4, 2])
+        np.testing.assert_array_equal(first, self.traces[:, 10:90:4])
+        np.testing.assert_array_equal(second, first)
+        np.testing.assert_array_equal(other_step, self.traces[:, 10:90:2])
+        self.assertEqual(first.dtype, np.int8)
+        del first, second, other_step
+
+    def test_changed_source_misses(self):
+        cache = TraceCache(self.cache_dir)
+        self.load(cache, 4)
+
+        # Make sure the modification time differs from the hashed one.
+        time.sleep(0.01)
+        np.save(self.traces_file, self.traces + 1)
+        changed = self.load(cache, 4)
+
+        self.assertEqual(self.preprocessed, [4, 4])
+        np.testing.assert_array_equal(changed,
+                                      (self.traces + 1)[:, 10:90:4])
+        del changed
+
+    def test_evicts_least_recently_used(self):
+        # Room for the entries of step 2 and 4, but not also for step 8.
+        entry_bytes = [os.path.getsize(self.traces_file) - 20 * 100 +
+                       20 * len(range(10, 90, step)) for step in [2, 4, 8]]
+        cache = TraceCache(self.cache_dir, max_bytes=sum(entry_bytes[:2]) + 1)
+
+        self.load(cache, 2)
+        time.sleep(0.01)
+        self.load(cache, 4)
+        time.sleep(0.01)
+        self.load(cache, 2)  # Step 4 is now the least recently used.
+        time.sleep(0.01)
+        self.load(cache, 8)
+        self.load(cache, 2)
+        self.load(cache, 4)
+
+        self.assertEqual(self.preprocessed, [2, 4, 8, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
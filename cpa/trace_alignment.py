@@ -0,0 +1,162 @@
+# Shared with the template attack code in ta/, so this module may only import
+# numpy and modules of cpa/ that do the same.
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 1024  # Traces
+
+
+class TraceAligner:
+    def __init__(self, reference, pattern_window, max_shift,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        """Initiates a TraceAligner object, which counters the random delays
+        of a hiding countermeasure by shifting every trace such that a
+        reference pattern lines up with it.
+
+        The pattern is a window of a reference trace. Every trace is searched
+        for the pattern up to `max_shift` sample points around the window,
+        using a normalized cross-correlation that is computed with FFTs for
+        a whole batch of traces at once.
+
+        Arguments:
+            reference {[float]} -- The reference trace, e.g. the first trace
+            or the mean of a few traces that are already aligned.
+            pattern_window {(int, int)} -- The first and end sample point of
+            the pattern in the reference trace, which should contain a
+            distinctive operation.
+            max_shift {int} -- The largest shift to search in either
+            direction.
+            batch_size {int} -- The amount of traces to align at once.
+        """
+        (self.pattern_start, self.pattern_end) = pattern_window
+        self.max_shift = max_shift
+        self.batch_size = batch_size
+
+        pattern = np.asarray(reference[self.pattern_start:self.pattern_end],
+                             dtype=np.float64)
+        # A zero mean pattern makes the cross-correlation ignore the local
+        # mean of the traces.
+        self.pattern = pattern - pattern.mean()
+        self.pattern_norm = np.linalg.norm(self.pattern)
+
+    def find_shifts(self, traces):
+        """Finds the shift of every trace at which it best matches the
+        pattern. A trace with shift s has the pattern at s sample points
+        after the pattern's position in the reference.
+
+        Arguments:
+            traces {np.ndarray} -- A (traces x samples) matrix of traces.
+
+        Returns:
+            np.ndarray -- The shift of every trace.
+        """
+        traces = np.asarray(traces)
+        samples_amnt = traces.shape[1]
+        pattern_len = len(self.pattern)
+
+        # The part of the traces in which the pattern is searched.
+        search_start = max(0, self.pattern_start - self.max_shift)
+        search_end = min(samples_amnt, self.pattern_end + self.max_shift)
+        fft_len = search_end - search_start + pattern_len
+        pattern_fft = np.conj(np.fft.rfft(self.pattern, fft_len))
+
+        shifts = np.zeros(len(traces), dtype=int)
+        for start in range(0, len(traces), self.batch_size):
+            segments = traces[start:start + self.batch_size,
+                              search_start:search_end].astype(np.float64)
+
+            # Entry k is the dot product of the pattern with the segments'
+            # sample points [k, k + pattern_len).
+            products = np.fft.irfft(np.fft.rfft(segments, fft_len, axis=1) *
+                                    pattern_fft, fft_len, axis=1)
+            positions_amnt = segments.shape[1] - pattern_len + 1
+            products = products[:, :positions_amnt]
+
+            # The norm of the centered segment samples at every position,
+            # from running sums.
+            sums = np.cumsum(np.pad(segments, ((0, 0), (1, 0))), axis=1)
+            squares = np.cumsum(np.pad(segments * segments, ((0, 0), (1, 0))),
+                                axis=1)
+            window_sums = sums[:, pattern_len:] - sums[:, :-pattern_len]
+            window_squares = squares[:, pattern_len:] - \
+                squares[:, :-pattern_len]
+            norms = np.sqrt(np.maximum(
+                window_squares - window_sums ** 2 / pattern_len, 0))
+
+            scores = np.zeros_like(products)
+            np.divide(products, norms * self.pattern_norm, out=scores,
+                      where=norms > 0)
+            shifts[start:start + len(segments)] = \
+                search_start + np.argmax(scores, axis=1) - self.pattern_start
+
+        return shifts
+
+    def apply_shifts(self, traces, shifts):
+        """Shifts every trace back by its shift. Sample points that are
+        shifted in from beyond the end of a trace repeat its edge value.
+
+        Arguments:
+            traces {np.ndarray} -- A (traces x samples) matrix of traces.
+            shifts {[int]} -- The shift of every trace.
+
+        Returns:
+            np.ndarray -- The aligned traces, of the same type as the given.
+        """
+        traces = np.asarray(traces)
+        samples_amnt = traces.shape[1]
+        positions = np.arange(samples_amnt) + \
+            np.asarray(shifts)[:, np.newaxis]
+        np.clip(positions, 0, samples_amnt - 1, out=positions)
+
+        return np.take_along_axis(traces, positions, axis=1)
+
+    def align(self, traces):
+        """Aligns a matrix of traces in batches.
+
+        Arguments:
+            traces {np.ndarray} -- A (traces x samples) matrix of traces.
+
+        Returns:
+            (np.ndarray, np.ndarray) -- The aligned traces and the shift of
+            every trace.
+        """
+        traces = np.asarray(traces)
+        shifts = self.find_shifts(traces)
+        aligned = np.empty_like(traces)
+        for start in range(0, len(aligned), self.batch_size):
+            end = start + self.batch_size
+            aligned[start:end] = self.apply_shifts(traces[start:end],
+                                                   shifts[start:end])
+
+        return (aligned, shifts)
+
+    def align_file(self, traces_file, aligned_file, shifts_file):
+        """Aligns the traces of a .npy file into another .npy file, batch by
+        batch, so that neither is ever fully in memory. The shifts are stored
+        as well, so that the aligned traces can be recreated or reused.
+
+        Arguments:
+            traces_file {string} -- The path of the .npy file of the traces.
+            aligned_file {string} -- The path of the .npy file to store the
+            aligned traces in.
+            shifts_file {string} -- The path of the .npy file to store the
+            shift of every trace in.
+
+        Returns:
+            np.ndarray -- The shift of every trace.
+        """
+        traces = np.load(traces_file, mmap_mode="r")
+        aligned = np.lib.format.open_memmap(
+            aligned_file, mode="w+", dtype=traces.dtype, shape=traces.shape)
+
+        shifts = np.zeros(len(traces), dtype=int)
+        for start in range(0, len(traces), self.batch_size):
+            end = start + self.batch_size
+            batch = np.array(traces[start:end])
+            shifts[start:end] = self.find_shifts(batch)
+            aligned[start:end] = self.apply_shifts(batch, shifts[start:end])
+
+        aligned.flush()
+        del aligned
+        np.save(shifts_file, shifts)
+
+        return shifts
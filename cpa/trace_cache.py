@@ -0,0 +1,194 @@
+# Shared with the template attack code in ta/, so this module may only import
+# numpy and modules of cpa/ that do the same.
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "..", ".trace_cache")
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+TRACES_NAME = "traces.npy"
+HASH_CHUNK_SIZE = 16 * 1024 ** 2  # Bytes
+HASHES_NAME = "hashes.json"
+
+
+def crop_traces(source_file, entry_dir, start=None, end=None, step=None,
+                batch_size=1024):
+    """Crops and decimates the sample points of a .npy trace file into a
+    cache entry, batch by batch.
+
+    Arguments:
+        source_file {string} -- The path of the .npy file of the traces.
+        entry_dir {string} -- The directory of the cache entry.
+        start {int} -- The first sample point to keep, as in a slice.
+        end {int} -- The sample point to stop at, as in a slice.
+        step {int} -- The step between kept sample points, as in a slice.
+        batch_size {int} -- The amount of traces to copy at once.
+    """
+    traces = np.load(source_file, mmap_mode="r")
+    samples = slice(start, end, step)
+    samples_amnt = len(range(*samples.indices(traces.shape[1])))
+    cropped = np.lib.format.open_memmap(
+        os.path.join(entry_dir, TRACES_NAME), mode="w+", dtype=traces.dtype,
+        shape=(len(traces), samples_amnt))
+
+    for i in range(0, len(traces), batch_size):
+        cropped[i:i + batch_size] = traces[i:i + batch_size, samples]
+
+    cropped.flush()
+
+
+class TraceCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        """Initiates a TraceCache object, which stores preprocessed trace
+        sets on disk, so that they are computed only once over all runs of
+        the experiment scripts.
+
+        Every entry is a directory of .npy files named after the hash of the
+        source trace file's content and the preprocessing parameters, so a
+        changed source file or a changed parameter never reuses a stale
+        entry. When the entries take up more than `max_bytes`, the least
+        recently used ones are evicted.
+
+        Arguments:
+            cache_dir {string} -- The directory to store the entries in.
+            max_bytes {int} -- The amount of bytes that all entries may take
+            up together.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def source_hash(self, source_file):
+        """Hashes the content of a source file. The hash of every file is
+        remembered along with its size and modification time, so that large
+        trace files are only hashed again after they change.
+
+        Arguments:
+            source_file {string} -- The path of the source file.
+
+        Returns:
+            string -- The SHA-256 hex digest of the file's content.
+        """
+        hashes_file = os.path.join(self.cache_dir, HASHES_NAME)
+        hashes = {}
+        if os.path.exists(hashes_file):
+            with open(hashes_file) as f:
+                hashes = json.load(f)
+
+        path = os.path.abspath(source_file)
+        stat = os.stat(path)
+        known = hashes.get(path)
+        if known and known["size"] == stat.st_size and \
+                known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+
+        hashes[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                        "sha256": sha256.hexdigest()}
+        with open(f"{hashes_file}.tmp", "w") as f:
+            json.dump(hashes, f)
+        os.replace(f"{hashes_file}.tmp", hashes_file)
+
+        return sha256.hexdigest()
+
+    def entry_key(self, source_file, params):
+        """Computes the key of the entry of a preprocessed source file.
+
+        Arguments:
+            source_file {string} -- The path of the source file.
+            params {{}} -- The JSON serializable preprocessing parameters,
+            including the name of the preprocessing.
+
+        Returns:
+            string -- The key of the entry.
+        """
+        description = json.dumps({"source": self.source_hash(source_file),
+                                  "params": params}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def entry(self, source_file, params, preprocess):
+        """Finds the entry of a preprocessed source file, preprocessing it
+        first if it is not cached yet.
+
+        Arguments:
+            source_file {string} -- The path of the source file.
+            params {{}} -- The JSON serializable preprocessing parameters,
+            including the name of the preprocessing.
+            preprocess {function} -- The function that preprocesses the
+            source file. It is called with the source file and the directory
+            of the new entry, in which it must store TRACES_NAME and may store
+            any other .npy files.
+
+        Returns:
+            string -- The directory of the entry.
+        """
+        entry_dir = os.path.join(self.cache_dir,
+                                 self.entry_key(source_file, params))
+
+        if os.path.isdir(entry_dir):
+            # The modification time of an entry is its last use.
+            os.utime(entry_dir)
+            return entry_dir
+
+        # Build the entry under a temporary name, so that an interrupted
+        # preprocessing never leaves an entry that looks complete.
+        tmp_dir = f"{entry_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        preprocess(source_file, tmp_dir)
+        os.replace(tmp_dir, entry_dir)
+
+        self.evict(keep=entry_dir)
+        return entry_dir
+
+    def load(self, source_file, params, preprocess, name=TRACES_NAME):
+        """Memory-maps an array of the entry of a preprocessed source file,
+        see entry().
+
+        Arguments:
+            source_file {string} -- The path of the source file.
+            params {{}} -- The JSON serializable preprocessing parameters.
+            preprocess {function} -- The function that preprocesses the
+            source file into an entry.
+            name {string} -- The name of the .npy file of the entry to load.
+
+        Returns:
+            np.memmap -- The read-only array.
+        """
+        entry_dir = self.entry(source_file, params, preprocess)
+        return np.load(os.path.join(entry_dir, name), mmap_mode="r")
+
+    def evict(self, keep=None):
+        """Removes the least recently used entries until all entries fit in
+        the size cap. An entry that is larger than the cap by itself is kept
+        if it is the given entry to keep.
+
+        Arguments:
+            keep {string} -- The directory of an entry to never evict.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry_dir) or name.endswith(".tmp"):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, file_name))
+                       for file_name in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_dir), entry_dir, size))
+
+        total_bytes = sum(size for (_, _, size) in entries)
+        for (_, entry_dir, size) in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir)
+            total_bytes -= size
@@ -0,0 +1,153 @@
+import numpy as np
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 ** 2  # Bytes
+
+
+class TraceSource:
+    def __init__(self, traces_file, plaintexts, indices=None, start=None,
+                 end=None, step=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                 sort_indices=True, windows=None):
+        """Initiates a TraceSource object, which opens a .npy trace file
+        memory-mapped and hands out bounded chunks of it, so that no more
+        than a configurable amount of trace data is in memory at once. The
+        chunks keep the type of the file, so int8 or int16 traces stay
+        compact until their consumer converts them.
+
+        Arguments:
+            traces_file {string} -- The path of the .npy file that stores the
+            (traces x samples) trace matrix.
+            plaintexts { [[int]] } -- The plaintexts belonging to all traces
+            in the trace file.
+            indices {[int]} -- The traces to use. Defaults to all traces.
+            start {int} -- The first sample point to use, as in a slice.
+            end {int} -- The sample point to stop at, as in a slice.
+            step {int} -- The step between used sample points, as in a slice.
+            memory_budget {int} -- The amount of bytes that the trace chunks
+            and the statistics computed over them may take up together.
+            sort_indices {bool} -- Whether to read the traces in file order
+            rather than in the given order. Keep the given order when the
+            order matters, e.g. when attacking after every few traces.
+            windows {[(int, int)]} -- The disjoint (start, end) windows of
+            sample points to use, e.g. found by an OperationLocator. When
+            given, they replace the start and end and are each decimated by
+            the step.
+        """
+        self.traces = np.load(traces_file, mmap_mode="r")
+        self.memory_budget = memory_budget
+
+        if indices is None:
+            indices = np.arange(len(self.traces))
+        # Reading the traces in file order keeps the disk access sequential.
+        # The plaintexts follow the same order, so the attack is unaffected.
+        if sort_indices:
+            indices = np.sort(indices)
+        self.indices = np.asarray(indices)
+        self.plaintexts = np.asarray(plaintexts)[self.indices]
+
+        # Cropping and decimating only selects sample points, so it is done
+        # while reading chunks rather than on a copy of the whole matrix.
+        (self.start, self.end, self.step) = \
+            slice(start, end, step).indices(self.traces.shape[1])
+        self.windows = windows
+        self.sample_points = self.select_sample_points(self.step)
+        self.samples_amnt = len(self.sample_points)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def select_sample_points(self, step):
+        """Selects the sample points of the trace file that are used with a
+        given step, within the start and end or within the windows.
+
+        Arguments:
+            step {int} -- The step between used sample points.
+
+        Returns:
+            np.ndarray -- The used sample points.
+        """
+        if self.windows is None:
+            return np.arange(self.start, self.end, step)
+
+        return np.concatenate([np.arange(window_start, window_end, step)
+                               for (window_start, window_end)
+                               in self.windows]).astype(int)
+
+    def step_mask(self, step):
+        """Marks the used sample points that remain when they are decimated
+        further, as if this source had been created with `step` times its
+        own step. Statistics per sample point computed on this source thus
+        give those of the decimated source without reading it again.
+
+        Arguments:
+            step {int} -- The factor by which to decimate the used sample
+            points.
+
+        Returns:
+            np.ndarray -- A boolean mask over the used sample points.
+        """
+        return np.isin(self.sample_points,
+                       self.select_sample_points(self.step * step))
+
+    def sample_ranges(self, bytes_per_sample):
+        """Splits the used sample points into ranges that are small enough
+        for the statistics over them to take up at most half of the memory
+        budget. The other half is left for the trace chunks themselves.
+
+        Arguments:
+            bytes_per_sample {int} -- The amount of bytes that the consumer
+            of the chunks needs to store per sample point.
+
+        Returns:
+            [range] -- Ranges of positions in the used sample points.
+        """
+        range_size = max(1, self.memory_budget // 2 // bytes_per_sample)
+        return [range(i, min(i + range_size, self.samples_amnt))
+                for i in range(0, self.samples_amnt, range_size)]
+
+    def batches(self, sample_range=None, bytes_per_trace=0):
+        """Reads the used traces chunk by chunk, restricted to a range of the
+        used sample points. Each chunk takes up at most half of the memory
+        budget.
+
+        Arguments:
+            sample_range {range} -- The positions in the used sample points to
+            read. Defaults to all used sample points.
+            bytes_per_trace {int} -- The amount of bytes that the consumer of
+            the chunks needs to store per trace besides the trace itself.
+
+        Yields:
+            (np.ndarray, np.ndarray) -- A (traces x samples) chunk of the
+            trace matrix and the plaintexts belonging to it.
+        """
+        if sample_range is None:
+            sample_range = range(self.samples_amnt)
+
+        points = self.sample_points[sample_range.start:sample_range.stop]
+        # Evenly spaced sample points can be read as a slice, which keeps
+        # the reads of a single window as cheap as those of a plain crop.
+        if len(points) == 1 or len(np.unique(np.diff(points))) == 1:
+            point_step = int(points[1] - points[0]) if len(points) > 1 else 1
+            samples = slice(int(points[0]), int(points[-1]) + 1, point_step)
+        else:
+            samples = points
+
+        trace_size = len(sample_range) * self.traces.itemsize + \
+            bytes_per_trace
+        batch_size = max(1, self.memory_budget // 2 // trace_size)
+
+        for i in range(0, len(self.indices), batch_size):
+            batch_indices = self.indices[i:i + batch_size]
+            batch_rows = slice(batch_indices[0], batch_indices[-1] + 1)
+
+            # Plain slices of a memory-mapped array are views, so only read
+            # through fancy indexing when the rows are not contiguous.
+            if np.array_equal(batch_indices, np.arange(batch_rows.start,
+                                                       batch_rows.stop)):
+                batch = self.traces[batch_rows, samples]
+            elif isinstance(samples, slice):
+                batch = self.traces[batch_indices, samples]
+            else:
+                batch = self.traces[np.ix_(batch_indices, samples)]
+
+            yield (np.array(batch),
+                   self.plaintexts[i:i + batch_size])
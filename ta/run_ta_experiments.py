@@ -1,27 +1,77 @@
 import numpy as np
+# The modules below live in cpa/, which helpers puts on the path.
+import helpers
 from ta import TAAttacker
+import aes128
+from attack_analyser import AttackAnalyser
+from key_enumerator import KeyEnumerator
+from trace_alignment import TraceAligner
+from trace_cache import DEFAULT_CACHE_DIR, TRACES_NAME, TraceCache, crop_traces
 from metrics import guessing_entropy, subkey_success_rate
-import csv
-import time
+import hashlib
+import os
 import pandas as pd
-import matplotlib.pyplot as plt
 
 
 TEMPLATE_SIZES = [10000, 15000, 20000]
 ATTACK_SIZES = [25, 50, 75, 100]
 SAMPLE_STEPS = [1, 2, 3]
+NUM_POIS = 5
+POOLED = False
 ITERATIONS = 10
 TOTAL_EXPIREMENTS = len(TEMPLATE_SIZES) * len(ATTACK_SIZES) * \
                     len(SAMPLE_STEPS) * ITERATIONS
 CM = False
+# The random delays of the cm traces are undone by aligning every trace to a
+# pattern of the first trace. The aligned and decimated traces are stored in
+# the trace cache and reused by later runs.
+ALIGN = CM
+ALIGNMENT_WINDOW = (7155, 7655)
+MAX_SHIFT = 500
+CACHE_DIR = DEFAULT_CACHE_DIR
+CACHE_MAX_BYTES = 20 * 1024 ** 3
+# Attacks that leave at most ENUMERATION_BUDGET keys above the known key are
+# finished by enumerating the keys in decreasing log-likelihood, verified
+# against a known plaintext/ciphertext pair. 0 disables the enumeration.
+ENUMERATION_BUDGET = 0
+# Profiled templates are stored in TEMPLATE_DIR and loaded by later runs, as
+# long as they were profiled on the same traces with the same preprocessing.
+TEMPLATE_DIR = 'profiled_templates'
+SEED = 42
 
 if CM:
     CM_DIR = "cm"
 else:
     CM_DIR = "no-cm"
 results = pd.DataFrame(columns=['TEMPLATE_SIZE', 'ATTACK_SIZE', 'SAMPLE_STEP',
-                                'GE', 'KEY_SR', 'SUBKEY_SR'], dtype=int)
-traces = np.load(f'data/{CM_DIR}/traces.npy')
+                                'GE', 'KEY_SR', 'SUBKEY_SR', 'KEY_RANK_LOW',
+                                'KEY_RANK_HIGH', 'KEY_RECOVERED'], dtype=int)
+atk_analyser = AttackAnalyser()
+trace_cache = TraceCache(CACHE_DIR, CACHE_MAX_BYTES)
+traces_file = f'data/{CM_DIR}/traces.npy'
+if ALIGN:
+    reference = np.load(traces_file, mmap_mode='r')[0]
+    aligner = TraceAligner(reference, ALIGNMENT_WINDOW, MAX_SHIFT)
+    entry_dir = trace_cache.entry(
+        traces_file,
+        {'preprocessing': 'align', 'reference_trace': 0,
+         'window': ALIGNMENT_WINDOW, 'max_shift': MAX_SHIFT},
+        lambda source_file, entry_dir: aligner.align_file(
+            source_file, os.path.join(entry_dir, TRACES_NAME),
+            os.path.join(entry_dir, 'shifts.npy')))
+    traces_file = os.path.join(entry_dir, TRACES_NAME)
+
+# Memory-mapped, the profiling reads the traces in batches.
+traces = np.load(traces_file, mmap_mode='r')
+dataset_hash = trace_cache.source_hash(traces_file)
+# The decimated traces of every other sample step, memory-mapped from the
+# cache instead of decimated again by every experiment.
+step_traces = {
+    step: traces if step == 1 else trace_cache.load(
+        traces_file, {'preprocessing': 'crop', 'step': step},
+        lambda source_file, entry_dir, step=step: crop_traces(
+            source_file, entry_dir, step=step))
+    for step in SAMPLE_STEPS}
 ptext = np.load(f'data/{CM_DIR}/plain.npy')
 key = np.load(f'data/{CM_DIR}/key.npy')
 
@@ -35,31 +85,54 @@ atkKey = key[-1000:]
 
 known_key = atkKey[0]
 
-np.random.seed(42)
+np.random.seed(SEED)
+os.makedirs(TEMPLATE_DIR, exist_ok=True)
 i = 0
-for _ in range(ITERATIONS):
+for iteration in range(ITERATIONS):
     for temp_size in TEMPLATE_SIZES:
         for step in SAMPLE_STEPS:
             temp_indices = np.random.choice(
                 np.arange(len(tempTraces)), temp_size, replace=False)
 
-            sampled_tempTraces = tempTraces[temp_indices, ::step]
-            sampled_tempPText = tempPText[temp_indices, :]
-            sampled_tempKey = tempKey[temp_indices, :]
-
-            ta = TAAttacker(5, pooled=False)
-            print(f"Profiling using {temp_size} traces...")
-            ta.profile(sampled_tempTraces, sampled_tempPText, sampled_tempKey)
+            # The templates of this experiment, which depend on the random
+            # choice of profiling traces. Their indices are hashed, as they
+            # follow from the seed and from every earlier draw.
+            indices_hash = hashlib.sha256(
+                np.sort(temp_indices).astype(np.int64).tobytes()).hexdigest()
+            preprocessing = {'align': ALIGN, 'step': step,
+                             'temp_size': temp_size, 'pois': NUM_POIS,
+                             'pooled': POOLED, 'indices_hash': indices_hash}
+            if ALIGN:
+                preprocessing.update({'window': list(ALIGNMENT_WINDOW),
+                                      'max_shift': MAX_SHIFT})
+            template_file = os.path.join(
+                TEMPLATE_DIR,
+                f'{CM_DIR}_{temp_size}_{step}_{iteration}.npy')
+            ta = None
+            if os.path.exists(template_file):
+                ta = TAAttacker.load(template_file)
+                if ta.metadata['dataset_hash'] != dataset_hash or \
+                        ta.metadata['preprocessing'] != preprocessing:
+                    ta = None
+            if ta is None:
+                ta = TAAttacker(NUM_POIS, pooled=POOLED)
+                print(f"Profiling using {temp_size} traces...")
+                ta.profile(step_traces[step], tempPText, tempKey,
+                           indices=temp_indices)
+                ta.save(template_file, sample_step=step,
+                        dataset_hash=dataset_hash,
+                        preprocessing=preprocessing)
 
             for atk_size in ATTACK_SIZES:
                 print(f"Experiment {i+1}/{TOTAL_EXPIREMENTS}(sample step: {step})")
 
                 atk_indices = np.random.choice(
                     np.arange(len(atkTraces)), atk_size, replace=False)
-                sampled_atkTraces = atkTraces[atk_indices, ::step]
+                # The attack traces are the last traces of the file.
+                atk_rows = len(traces) - len(atkTraces) + atk_indices
+                sampled_atkTraces = step_traces[step][atk_rows]
                 sampled_atkPText = atkPText[atk_indices, :]
 
-                # try:
                 print(f"Attacking using {atk_size} traces...")
                 refs = ta.attack(sampled_atkTraces, sampled_atkPText)
                 best_guess = ta.bestguess
@@ -68,13 +141,23 @@ for _ in range(ITERATIONS):
                 key_sr = int(ge == 0)
                 subkey_sr = subkey_success_rate(
                     known_key, best_guess)
-                # except Exception as e:
-                #     ge = np.nan
-                #     key_sr = np.nan
-                #     subkey_sr = np.nan
-                #     print('Singular table found!')
+                # The brute force effort that remains for the full key.
+                (key_rank_low, key_rank_high) = \
+                    atk_analyser.compute_key_rank_bounds(
+                        known_key, ta.log_likelihoods)
+                key_recovered = key_sr
+                if not key_sr and key_rank_low < ENUMERATION_BUDGET:
+                    enumerator = KeyEnumerator(ta.log_likelihoods)
+                    ciphertext = aes128.encrypt(atkPText[0], known_key)[0]
+                    found_key = enumerator.search(
+                        atkPText[0], ciphertext, budget=ENUMERATION_BUDGET)
+                    key_recovered = int(found_key == list(known_key))
+                    print(f"Enumerated {enumerator.keys_tested} keys at "
+                          f"{enumerator.keys_per_second:.0f} keys/s")
                 results.loc[i] = [temp_size, atk_size,
-                                  step, ge, key_sr, subkey_sr]
+                                  step, ge, key_sr, subkey_sr,
+                                  key_rank_low, key_rank_high,
+                                  key_recovered]
                 i += 1
                 print(f"RESULTS\t-->\tGE: {ge}\tKEY SR: {key_sr}\tSUBKEY SR: {subkey_sr}")
 
@@ -2,121 +2,171 @@
 # A script to perform a template attack
 # Will attack one subkey of AES-128
 
+import json
+import os
+
 import numpy as np
-from scipy.stats import multivariate_normal
-import matplotlib.pyplot as plt
 from helpers import *
 from metrics import guessing_entropy
+from power_consumption_modeler import PowerConsumptionModeler
+from template_profiler import TemplateProfiler
+from templates import Templates
+from trace_cache import TraceCache
+
+# The version of the template files written by TAAttacker.save(), which is
+# raised whenever their layout changes.
+TEMPLATE_FORMAT_VERSION = 1
 
 
 class TAAttacker:
-    def __init__(self, numPOIs, pooled=False):
+    def __init__(self, numPOIs, pooled=False,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        # The leakage model divides the traces into classes, e.g. the 9
+        # Hamming weights of the Sbox output for the default model.
+        self.leakage_model = leakage_model
+        self.power_modeler = PowerConsumptionModeler(leakage_model)
+        self.numClasses = self.power_modeler.classes_amnt()
+
         # 0: Init convariance and mean matrices
         self.numPOIs = numPOIs
         self.POIspacing = 5
         self.POIs = [[] for _ in range(16)]
-        self.meanMatrix = np.zeros((16, 9, self.numPOIs))
-        self.covMatrix = np.zeros((16, 9, self.numPOIs, self.numPOIs))
+        self.meanMatrix = np.zeros((16, self.numClasses, self.numPOIs))
+        self.covMatrix = np.zeros((16, self.numClasses, self.numPOIs,
+                                   self.numPOIs))
         self.pooled = pooled
+        # The prefactored templates of every subkey, built by profile()
+        self.templates = []
+        self.profilingTraces = 0
+        # The description of the profiling set of loaded templates
+        self.metadata = {}
         self.bestguess = [0] * 16
-
-    def find_traces_HW(self, bnum, traces, ptext, key):
-        # 2: Find HW(sbox) to go with each input
-        # Note - we're only working with the first byte here
-        tempSbox = [sbox[ptext[i][bnum] ^ key[i][bnum]]
-                    for i in range(len(ptext))]
-        tempHW = [hw[s] for s in tempSbox]
-
-        # 2.5: Sort traces by HW
-        # Make 9 blank lists - one for each Hamming weight
-        tempTracesHW = [[] for _ in range(9)]
-
-        # Fill them up
-        for i in range(len(ptext)):
-            HW = tempHW[i]
-            tempTracesHW[HW].append(traces[i])
-
-        # Switch to numpy arrays
-        tempTracesHW = [np.array(tempTracesHW[HW]) for HW in range(9)]
-        return tempTracesHW
-
-    def find_diffs(self, traces_HW, trace_size):
-        # 3: Find averages
-        tempMeans = np.zeros((9, trace_size))
-        for i in range(9):
-            tempMeans[i] = np.average(traces_HW[i], 0)
-
-        # 4: Find sum of differences
-        tempSumDiff = np.zeros(trace_size)
-        for i in range(9):
-            for j in range(i):
-                tempSumDiff += np.abs(tempMeans[i] - tempMeans[j])
-
-        return (tempMeans, tempSumDiff)
-
-    def find_max_POIs(self, diffs, bnum):
-        # 5: Find POIs
-        for i in range(self.numPOIs):
-            # Find the max
-            nextPOI = diffs.argmax()
-            self.POIs[bnum].append(nextPOI)
-
-            # Make sure we don't pick a nearby value
-            poiMin = max(0, nextPOI - self.POIspacing)
-            poiMax = min(nextPOI + self.POIspacing, len(diffs))
-            for j in range(poiMin, poiMax):
-                diffs[j] = 0
-
-    def fill_matrices(self, means, tempTracesHW, bnum):
-        # 6: Fill up mean and covariance matrix for each HW
-        for HW in range(9):
-            for i in range(self.numPOIs):
-                # Fill in mean
-                self.meanMatrix[bnum, HW, i] = means[HW][self.POIs[bnum][i]]
-                for j in range(self.numPOIs):
-                    x = tempTracesHW[HW][:, self.POIs[bnum][i]]
-                    y = tempTracesHW[HW][:, self.POIs[bnum][j]]
-                    self.covMatrix[bnum, HW, i, j] = cov(x, y)
-
-    def profile(self, traces, ptexts, keys):
-
-        for bnum in range(16):
-            tempTracesHW = self.find_traces_HW(bnum, traces, ptexts, keys)
-            (tempMeans, tempSumDiff) = self.find_diffs(
-                tempTracesHW, len(traces[0]))    
-            self.find_max_POIs(tempSumDiff, bnum)
-            self.fill_matrices(tempMeans, tempTracesHW, bnum)
-
-    def get_multivariate_normal(self, bnum, HW):
-        if self.pooled:
-            return multivariate_normal(self.meanMatrix[bnum, HW],
-                                       self.covMatrix[bnum].mean(axis=0))
-        else:
-            return multivariate_normal(self.meanMatrix[bnum, HW],
-                                       self.covMatrix[bnum, HW])
+        # The log-likelihood of every subkey guess in the last attack, which
+        # can be used to rank full keys (see AttackAnalyser).
+        self.log_likelihoods = np.zeros((16, 256))
+
+    def profile(self, traces, ptexts, keys, indices=None, batch_size=1024):
+        # Profile in batches, so that the traces may be a memory-mapped file
+        # (see TemplateProfiler)
+        profiler = TemplateProfiler(self.numPOIs, self.POIspacing,
+                                    self.leakage_model)
+        profiler.update_means(traces, ptexts, keys, indices, batch_size)
+        profiler.select_POIs()
+        profiler.update_covariances(traces, ptexts, keys, indices,
+                                    batch_size)
+        self.use_profile(profiler)
+
+    def use_profile(self, profiler):
+        # 6: Fill up mean and covariance matrix for each class from a
+        # profile, which may be extended or merged with others first
+        self.POIs = [[int(poi) for poi in pois] for pois in profiler.POIs]
+        self.meanMatrix = profiler.class_means()
+        self.covMatrix = profiler.class_covariances()
+        self.profilingTraces = profiler.traces_amnt()
+
+        self.build_templates()
+
+    def build_templates(self):
+        # 7: Factor the covariance matrices once, shrinking singular ones
+        self.templates = [Templates(self.meanMatrix[bnum],
+                                    self.covMatrix[bnum], self.pooled)
+                          for bnum in range(16)]
+
+    def save(self, path, sample_step=1, dataset_hash=None,
+             preprocessing=None):
+        """Stores the profiled templates in a single .npy file, which holds
+        one record of the POIs, the mean and covariance matrices and the
+        JSON metadata of the templates. The file can be memory-mapped by
+        load(), so that templates are profiled once and attack anywhere.
+
+        Arguments:
+            path {string} -- The path of the .npy file.
+            sample_step {int} -- The sample step of the profiling traces.
+            dataset_hash {string} -- The hash of the profiling trace file,
+            e.g. TraceCache.source_hash().
+            preprocessing {{}} -- The JSON serializable preprocessing of the
+            profiling traces, e.g. the parameters of a TraceCache entry.
+        """
+        metadata = json.dumps({
+            'version': TEMPLATE_FORMAT_VERSION,
+            'leakage_model': self.leakage_model,
+            'classes': self.numClasses,
+            'pois': self.numPOIs,
+            'poi_spacing': self.POIspacing,
+            'pooled': self.pooled,
+            'sample_step': sample_step,
+            'profiling_traces': self.profilingTraces,
+            'dataset_hash': dataset_hash,
+            'preprocessing': preprocessing}).encode()
+
+        record = np.zeros((), dtype=[
+            ('POIs', np.int64, (16, self.numPOIs)),
+            ('meanMatrix', np.float64, self.meanMatrix.shape),
+            ('covMatrix', np.float64, self.covMatrix.shape),
+            ('metadata', f'S{len(metadata)}')])
+        record['POIs'] = self.POIs
+        record['meanMatrix'] = self.meanMatrix
+        record['covMatrix'] = self.covMatrix
+        record['metadata'] = metadata
+
+        # Write under a temporary name, so that an interrupted save never
+        # leaves a template file that looks complete.
+        np.save(f'{path}.tmp.npy', record)
+        os.replace(f'{path}.tmp.npy', path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads templates stored by save(). The mean and covariance matrices
+        are memory-mapped from the file.
+
+        Arguments:
+            path {string} -- The path of the .npy file.
+
+        Raises:
+            ValueError -- If the file was written in another format version.
+
+        Returns:
+            TAAttacker -- The attacker with the loaded templates, of which
+            metadata describes the profiling set.
+        """
+        record = np.load(path, mmap_mode='r')
+        metadata = json.loads(bytes(record['metadata']).decode())
+        if metadata['version'] != TEMPLATE_FORMAT_VERSION:
+            raise ValueError(f"Template file {path} has format version "
+                             f"{metadata['version']}, expected "
+                             f"{TEMPLATE_FORMAT_VERSION}.")
+
+        ta = cls(metadata['pois'], metadata['pooled'],
+                 metadata['leakage_model'])
+        ta.POIspacing = metadata['poi_spacing']
+        ta.POIs = [[int(poi) for poi in pois] for pois in record['POIs']]
+        ta.meanMatrix = record['meanMatrix']
+        ta.covMatrix = record['covMatrix']
+        ta.profilingTraces = metadata['profiling_traces']
+        ta.metadata = metadata
+        ta.build_templates()
+
+        return ta
 
     def attack(self, traces, ptexts):
         # 2: Attack
-        # Running total of log P_k
+        # Working in the log domain, so that tiny densities do not underflow
+        traces = np.asarray(traces)
+        ptexts = np.asarray(ptexts)
         refs = [0] * 16
         for bnum in range(16):
-            P_k = np.zeros(256)
-            for j in range(len(traces)):
-                # Grab key points and put them in a small matrix
-                a = [traces[j][self.POIs[bnum][i]]
-                     for i in range(len(self.POIs[bnum]))]
-
-                # Test each key
-                for k in range(256):
-                    # Find HW coming out of sbox
-                    HW = hw[sbox[ptexts[j][bnum] ^ k]]
-                    # Find p_{k,j}
-                    rv = self.get_multivariate_normal(bnum, HW)
-                    p_kj = rv.pdf(a)
-
-                    # Add it to running total
-                    P_k[k] += np.log(p_kj)
-
+            # Grab key points and put them in a small matrix
+            points = traces[:, self.POIs[bnum]].astype(np.float64)
+            log_densities = self.templates[bnum].log_likelihood(points)
+
+            # Only the classes have templates, so the log P_k of every key is
+            # a gather of the class of each trace under that key, e.g. the HW
+            # coming out of sbox
+            classes = self.power_modeler.hypotheses(ptexts[:, bnum])
+            P_k = np.take_along_axis(log_densities, classes, axis=1).sum(
+                axis=0)
+
+            self.log_likelihoods[bnum] = P_k
             self.bestguess[bnum] = np.argmax(P_k)
             refs[bnum] = P_k.argsort()[::-1]
 
@@ -132,10 +182,22 @@ if __name__ == "__main__":
     atkTraces = np.load('data/traces.npy')[:atk_size]
     atkPText = np.load('data/plain.npy')[:atk_size]
     atkKey = np.load('data/key.npy')[:atk_size]
-    # Start calculating template
-
-    ta = TAAttacker(5, pooled=False)
-    ta.profile(tempTraces, tempPText, tempKey)
+    # Start calculating template, unless it was stored by an earlier run on
+    # the same traces
+    templateFile = f'data/templates_{temp_size}.npy'
+    dataset_hash = TraceCache().source_hash('data/ta_traces.npy')
+    preprocessing = {'temp_size': temp_size}
+    ta = None
+    if os.path.exists(templateFile):
+        ta = TAAttacker.load(templateFile)
+        if ta.metadata['dataset_hash'] != dataset_hash or \
+                ta.metadata['preprocessing'] != preprocessing:
+            ta = None
+    if ta is None:
+        ta = TAAttacker(5, pooled=False)
+        ta.profile(tempTraces, tempPText, tempKey)
+        ta.save(templateFile, dataset_hash=dataset_hash,
+                preprocessing=preprocessing)
 
     # Template is ready!
     print(atkKey[0])
@@ -0,0 +1,319 @@
+import json
+import os
+
+import numpy as np
+from power_consumption_modeler import PowerConsumptionModeler
+
+# The version of the profile files written by TemplateProfiler.save(), which
+# is raised whenever their layout changes.
+PROFILE_FORMAT_VERSION = 1
+
+
+def merge_moments(counts_a, means_a, counts_b, means_b, co_moments_a=None,
+                  co_moments_b=None):
+    """Merges the counts, means and, optionally, co-moment matrices (sums of
+    outer products of the deviations from the mean) of two disjoint sets of
+    traces per class, with the pairwise update of Chan et al., which is the
+    batched form of Welford's algorithm.
+
+    Arguments:
+        counts_a {np.ndarray} -- The (... x classes) trace counts of set a.
+        means_a {np.ndarray} -- The (... x classes x samples) means of set a.
+        counts_b {np.ndarray} -- The trace counts of set b.
+        means_b {np.ndarray} -- The means of set b.
+        co_moments_a {np.ndarray} -- The (... x classes x samples x samples)
+        co-moment matrices of set a, or None to only merge the means.
+        co_moments_b {np.ndarray} -- The co-moment matrices of set b.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray) -- The counts, means and
+        co-moment matrices (or None) of the union of both sets.
+    """
+    counts = counts_a + counts_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = np.where(counts > 0, counts_b / counts, 0)
+    deltas = means_b - means_a
+    means = means_a + deltas * weights[..., np.newaxis]
+
+    co_moments = None
+    if co_moments_a is not None:
+        co_moments = co_moments_a + co_moments_b + \
+            np.einsum('...p,...q->...pq', deltas, deltas) * \
+            (counts_a * weights)[..., np.newaxis, np.newaxis]
+
+    return (counts, means, co_moments)
+
+
+class TemplateProfiler:
+    def __init__(self, numPOIs, POIspacing=5,
+                 leakage_model=PowerConsumptionModeler.DEFAULT_LEAKAGE_MODEL):
+        """Initiates a TemplateProfiler object, which profiles templates
+        incrementally from chunks of traces, e.g. batches of a memory-mapped
+        trace file, so that the profiling set never has to fit in memory.
+
+        Profiling takes two passes over the traces. The first one
+        accumulates the mean of every class at every sample point, from
+        which select_POIs() picks the POIs. The second one accumulates the
+        counts, means and co-moment matrices of every class at the POIs.
+        Traces that are captured later are added to both with update(), so
+        that they cost only themselves, and profiles of disjoint traces,
+        e.g. of other processes or machines, are combined with merge().
+
+        Arguments:
+            numPOIs {int} -- The amount of POIs of every subkey.
+            POIspacing {int} -- The minimal distance between two POIs.
+            leakage_model {string} -- The leakage model that divides the
+            traces into classes.
+        """
+        self.numPOIs = numPOIs
+        self.POIspacing = POIspacing
+        self.leakage_model = leakage_model
+        self.power_modeler = PowerConsumptionModeler(leakage_model)
+        self.numClasses = self.power_modeler.classes_amnt()
+
+        # The class means at every sample point, for selecting the POIs
+        self.counts = np.zeros((16, self.numClasses), dtype=np.int64)
+        self.means = None
+        # The class statistics at the POIs, for the templates
+        self.POIs = None
+        self.poiCounts = np.zeros((16, self.numClasses), dtype=np.int64)
+        self.poiMeans = np.zeros((16, self.numClasses, numPOIs))
+        self.coMoments = np.zeros((16, self.numClasses, numPOIs, numPOIs))
+
+    def find_classes(self, ptexts, keys):
+        # Find the class (e.g. HW(sbox)) to go with each input, for all
+        # traces and all 16 bytes at once
+        table = self.power_modeler.hypothesis_table
+        return table[np.asarray(ptexts, dtype=np.intp),
+                     np.asarray(keys, dtype=np.intp)]
+
+    def batches(self, traces, ptexts, keys, indices=None, batch_size=1024):
+        """Reads the traces in batches, along with the class of every byte.
+
+        Arguments:
+            traces {np.ndarray} -- The traces, e.g. a memory-mapped file.
+            ptexts {np.ndarray} -- The plaintexts of the traces.
+            keys {np.ndarray} -- The keys of the traces.
+            indices {np.ndarray} -- The indices of the traces to read, or None
+            to read all traces.
+            batch_size {int} -- The amount of traces to read at once.
+
+        Yields:
+            (np.ndarray, np.ndarray) -- The (traces x samples) float batch and
+            the (traces x 16) classes of its traces.
+        """
+        if indices is None:
+            indices = np.arange(len(traces))
+        # Sorted indices read a memory-mapped file front to back.
+        indices = np.sort(indices)
+
+        for i in range(0, len(indices), batch_size):
+            rows = indices[i:i + batch_size]
+            yield (np.asarray(traces[rows], dtype=np.float64),
+                   self.find_classes(np.asarray(ptexts)[rows],
+                                     np.asarray(keys)[rows]))
+
+    def update_means(self, traces, ptexts, keys, indices=None,
+                     batch_size=1024):
+        """Adds traces to the class means at every sample point. The
+        arguments are those of batches().
+        """
+        for (batch, classes) in self.batches(traces, ptexts, keys, indices,
+                                             batch_size):
+            # Sum every class of every byte with one grouped matrix
+            # product: the one-hot (traces x 16 bytes * classes) matrix of
+            # the classes times the traces
+            columns = classes + self.numClasses * np.arange(16)
+            oneHot = np.zeros((len(batch), 16 * self.numClasses))
+            np.put_along_axis(oneHot, columns, 1, axis=1)
+            counts = oneHot.sum(axis=0).reshape(16, self.numClasses)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = (oneHot.T @ batch).reshape(
+                    16, self.numClasses, -1) / counts[..., np.newaxis]
+            means[counts == 0] = 0
+
+            if self.means is None:
+                self.means = np.zeros_like(means)
+            (self.counts, self.means, _) = merge_moments(
+                self.counts, self.means, counts.astype(np.int64), means)
+
+    def select_POIs(self):
+        """Selects the POIs of every subkey from the class means, at the
+        sample points where the classes differ the most, and restarts the
+        statistics at the POIs.
+        """
+        self.POIs = np.zeros((16, self.numPOIs), dtype=np.int64)
+        for bnum in range(16):
+            # Find sum of differences between every pair of classes, leaving
+            # out classes without traces
+            means = np.where(self.counts[bnum, :, np.newaxis] > 0,
+                             self.means[bnum], np.nan)
+            diffs = np.nansum(np.abs(means[:, np.newaxis, :] -
+                                     means[np.newaxis, :, :]),
+                              axis=(0, 1)) / 2
+
+            for i in range(self.numPOIs):
+                # Find the max
+                nextPOI = diffs.argmax()
+                self.POIs[bnum, i] = nextPOI
+
+                # Make sure we don't pick a nearby value
+                poiMin = max(0, nextPOI - self.POIspacing)
+                poiMax = min(nextPOI + self.POIspacing, len(diffs))
+                diffs[poiMin:poiMax] = 0
+
+        self.poiCounts[:] = 0
+        self.poiMeans[:] = 0
+        self.coMoments[:] = 0
+
+    def update_covariances(self, traces, ptexts, keys, indices=None,
+                           batch_size=1024):
+        """Adds traces to the class means and co-moment matrices at the POIs.
+        The arguments are those of batches().
+        """
+        for (batch, classes) in self.batches(traces, ptexts, keys, indices,
+                                             batch_size):
+            # The (traces x 16 x POIs) samples at the POIs of every byte
+            points = batch[:, self.POIs]
+            oneHot = np.zeros((len(batch), 16, self.numClasses))
+            np.put_along_axis(oneHot, classes[..., np.newaxis], 1, axis=2)
+            counts = oneHot.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = np.einsum('tbc,tbp->bcp', oneHot, points) / \
+                    counts[..., np.newaxis]
+            means[counts == 0] = 0
+
+            # The co-moments of the batch, with one grouped product of the
+            # traces' deviations from their class mean
+            deviations = points - means[np.arange(16), classes]
+            coMoments = np.einsum('tbc,tbp,tbq->bcpq', oneHot, deviations,
+                                  deviations)
+
+            (self.poiCounts, self.poiMeans, self.coMoments) = merge_moments(
+                self.poiCounts, self.poiMeans, counts.astype(np.int64), means,
+                self.coMoments, coMoments)
+
+    def update(self, traces, ptexts, keys, indices=None, batch_size=1024):
+        """Adds newly captured traces to a profile of which the POIs were
+        selected already, keeping those POIs. The arguments are those of
+        batches().
+        """
+        self.update_means(traces, ptexts, keys, indices, batch_size)
+        self.update_covariances(traces, ptexts, keys, indices, batch_size)
+
+    def merge(self, other):
+        """Adds the statistics of a profile of other traces, with the same
+        POIs if they were selected already.
+
+        Arguments:
+            other {TemplateProfiler} -- The profile to merge into this one.
+
+        Raises:
+            ValueError -- If the POIs or classes of the profiles differ.
+        """
+        if other.leakage_model != self.leakage_model or \
+                not np.array_equal(other.POIs, self.POIs):
+            raise ValueError("Only profiles with the same leakage model and "
+                             "POIs can be merged.")
+
+        if other.means is not None:
+            if self.means is None:
+                self.means = np.zeros_like(other.means)
+            (self.counts, self.means, _) = merge_moments(
+                self.counts, self.means, other.counts, other.means)
+        (self.poiCounts, self.poiMeans, self.coMoments) = merge_moments(
+            self.poiCounts, self.poiMeans, other.poiCounts, other.poiMeans,
+            self.coMoments, other.coMoments)
+
+    def traces_amnt(self):
+        """Returns the amount of traces at the POIs, which are those of the
+        templates.
+        """
+        return int(self.poiCounts[0].sum())
+
+    def class_means(self):
+        """Returns the (16 x classes x POIs) class means at the POIs, which
+        are NaN for classes without traces.
+        """
+        return np.where(self.poiCounts[..., np.newaxis] > 0, self.poiMeans,
+                        np.nan)
+
+    def class_covariances(self):
+        """Returns the (16 x classes x POIs x POIs) class covariance matrices,
+        which are NaN for classes with fewer than 2 traces.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covs = self.coMoments / \
+                (self.poiCounts - 1)[..., np.newaxis, np.newaxis]
+        covs[self.poiCounts < 2] = np.nan
+        return covs
+
+    def save(self, path):
+        """Stores the profile in a single .npy file, so that it can be
+        extended with new traces or merged with other profiles later.
+
+        Arguments:
+            path {string} -- The path of the .npy file.
+        """
+        metadata = json.dumps({
+            'version': PROFILE_FORMAT_VERSION,
+            'leakage_model': self.leakage_model,
+            'pois': self.numPOIs,
+            'poi_spacing': self.POIspacing,
+            'has_means': self.means is not None,
+            'has_pois': self.POIs is not None}).encode()
+        means = self.means if self.means is not None \
+            else np.zeros((16, self.numClasses, 0))
+        POIs = self.POIs if self.POIs is not None \
+            else np.zeros((16, self.numPOIs), dtype=np.int64)
+
+        record = np.zeros((), dtype=[
+            ('counts', np.int64, self.counts.shape),
+            ('means', np.float64, means.shape),
+            ('POIs', np.int64, POIs.shape),
+            ('poiCounts', np.int64, self.poiCounts.shape),
+            ('poiMeans', np.float64, self.poiMeans.shape),
+            ('coMoments', np.float64, self.coMoments.shape),
+            ('metadata', f'S{len(metadata)}')])
+        for (name, value) in [('counts', self.counts), ('means', means),
+                              ('POIs', POIs), ('poiCounts', self.poiCounts),
+                              ('poiMeans', self.poiMeans),
+                              ('coMoments', self.coMoments),
+                              ('metadata', metadata)]:
+            record[name] = value
+
+        np.save(f'{path}.tmp.npy', record)
+        os.replace(f'{path}.tmp.npy', path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a profile stored by save().
+
+        Arguments:
+            path {string} -- The path of the .npy file.
+
+        Raises:
+            ValueError -- If the file was written in another format version.
+
+        Returns:
+            TemplateProfiler -- The loaded profile.
+        """
+        record = np.load(path)
+        metadata = json.loads(bytes(record['metadata']).decode())
+        if metadata['version'] != PROFILE_FORMAT_VERSION:
+            raise ValueError(f"Profile file {path} has format version "
+                             f"{metadata['version']}, expected "
+                             f"{PROFILE_FORMAT_VERSION}.")
+
+        profiler = cls(metadata['pois'], metadata['poi_spacing'],
+                       metadata['leakage_model'])
+        profiler.counts = record['counts']
+        if metadata['has_means']:
+            profiler.means = record['means']
+        if metadata['has_pois']:
+            profiler.POIs = record['POIs']
+        profiler.poiCounts = record['poiCounts']
+        profiler.poiMeans = record['poiMeans']
+        profiler.coMoments = record['coMoments']
+
+        return profiler
@@ -0,0 +1,118 @@
+import numpy as np
+
+# Covariance matrices with a larger condition number are shrunk towards a
+# scaled identity matrix until they reach it.
+MAX_CONDITION = 1e8
+
+
+def shrink_covariance(cov, max_condition=MAX_CONDITION):
+    """Regularizes a covariance matrix by shrinking it towards the identity
+    matrix scaled by its average variance, (1 - a) * cov + a * mu * I, with
+    the smallest shrinkage a that keeps its condition number below
+    max_condition. Shrinking moves every eigenvalue towards mu, so that
+    singular matrices, such as those of classes with fewer traces than
+    POIs, become positive definite.
+
+    Arguments:
+        cov {np.ndarray} -- A symmetric (POIs x POIs) covariance matrix.
+        max_condition {float} -- The largest condition number to allow.
+
+    Returns:
+        (np.ndarray, float) -- The regularized covariance matrix and its
+        shrinkage.
+    """
+    eigenvalues = np.linalg.eigvalsh(cov)
+    (lowest, highest) = (eigenvalues[0], eigenvalues[-1])
+    average = eigenvalues.mean()
+    if average <= 0:
+        # Without any variance, every POI gets unit variance.
+        return (np.identity(len(cov)), 1.0)
+    if highest <= max_condition * lowest:
+        return (cov, 0.0)
+
+    # Solve (1 - a) * highest + a * average
+    #     = max_condition * ((1 - a) * lowest + a * average) for a.
+    excess = highest - max_condition * lowest
+    shrinkage = excess / (excess + average * (max_condition - 1))
+    shrunk = (1 - shrinkage) * cov + \
+        shrinkage * average * np.identity(len(cov))
+    return (shrunk, shrinkage)
+
+
+class Templates:
+    def __init__(self, means, covs, pooled=False,
+                 max_condition=MAX_CONDITION):
+        """Initiates a Templates object, which holds the multivariate normal
+        templates of all classes of one subkey in prefactored form, so that
+        the traces of an attack are scored without decomposing a covariance
+        matrix again.
+
+        Every covariance matrix is regularized (see shrink_covariance()) and
+        Cholesky factored into L L^T once. The log-determinant is the sum of
+        the logs of L's diagonal, and the precision matrix is
+        L^-T L^-1.
+
+        Arguments:
+            means {np.ndarray} -- A (classes x POIs) array of the mean of
+            every class at the POIs, which is NaN for classes without traces.
+            covs {np.ndarray} -- A (classes x POIs x POIs) array of the
+            covariance matrix of every class. The matrices of classes with
+            too few traces to estimate one, which contain NaNs, are replaced
+            by the average of the other classes' matrices.
+            pooled {bool} -- Whether all classes share the average of the
+            covariance matrices.
+            max_condition {float} -- The largest condition number to allow
+            before shrinking a covariance matrix.
+        """
+        self.means = np.array(means, dtype=np.float64)
+        covs = np.array(covs, dtype=np.float64)
+        (classes_amnt, pois_amnt) = self.means.shape
+
+        # A class without traces has no mean either, so its template is the
+        # average of the others, which does not favour any key.
+        observed = np.all(np.isfinite(self.means), axis=1)
+        if np.any(observed) and not np.all(observed):
+            self.means[~observed] = self.means[observed].mean(axis=0)
+
+        estimated = np.all(np.isfinite(covs), axis=(1, 2))
+        if np.any(estimated):
+            covs[~estimated] = covs[estimated].mean(axis=0)
+        else:
+            covs[:] = np.identity(pois_amnt)
+        if pooled:
+            covs[:] = covs.mean(axis=0)
+
+        self.covs = np.empty_like(covs)
+        self.shrinkages = np.zeros(classes_amnt)
+        for (i, cov) in enumerate(covs):
+            (self.covs[i], self.shrinkages[i]) = \
+                shrink_covariance(cov, max_condition)
+
+        self.factors = np.linalg.cholesky(self.covs)
+        self.inverse_factors = np.linalg.inv(self.factors)
+        self.logdets = 2 * np.log(
+            np.diagonal(self.factors, axis1=1, axis2=2)).sum(axis=1)
+        self.precisions = np.einsum('cqp,cqr->cpr', self.inverse_factors,
+                                    self.inverse_factors)
+
+    def log_likelihood(self, traces_at_pois):
+        """Computes the log-density of every trace under the template of
+        every class, in one batched computation.
+
+        Arguments:
+            traces_at_pois {np.ndarray} -- A (traces x POIs) array of the
+            samples of every trace at the POIs.
+
+        Returns:
+            np.ndarray -- A (traces x classes) array of log-densities.
+        """
+        traces_at_pois = np.asarray(traces_at_pois, dtype=np.float64)
+        diffs = traces_at_pois[:, np.newaxis, :] - \
+            self.means[np.newaxis, :, :]
+        # The squared Mahalanobis distance is the squared norm of the
+        # difference after whitening it by the inverse Cholesky factor.
+        whitened = np.einsum('cqp,tcp->tcq', self.inverse_factors, diffs)
+        distances = np.einsum('tcq,tcq->tc', whitened, whitened)
+
+        return -0.5 * (distances + self.logdets +
+                       self.means.shape[1] * np.log(2 * np.pi))
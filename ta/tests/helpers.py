@@ -0,0 +1,26 @@
+import numpy as np
+
+import helpers  # Puts cpa/ on the path
+from aes128 import SBOX
+from power_consumption_modeler import HAMM_WEIGHTS
+
+KNOWN_KEY = [43, 126, 21, 22, 40, 174, 210, 166,
+             171, 247, 21, 136, 9, 207, 79, 60]
+
+
+def simulate_profiling_traces(traces_amnt, samples_amnt=200, key=None,
+                              seed=0):
+    """Simulates noisy power traces, which leak the Hamming weight of the
+    first SubBytes output of key byte b at sample point 10 * (b + 1). The
+    key of every trace is random, unless a key is given."""
+    rng = np.random.RandomState(seed)
+    ptexts = rng.randint(0, 256, (traces_amnt, 16))
+    if key is None:
+        keys = rng.randint(0, 256, (traces_amnt, 16))
+    else:
+        keys = np.tile(key, (traces_amnt, 1))
+    sbox_outputs = np.asarray(SBOX)[ptexts ^ keys]
+
+    traces = rng.normal(0, 1.5, (traces_amnt, samples_amnt))
+    traces[:, 10:170:10] += HAMM_WEIGHTS[sbox_outputs]
+    return (traces, ptexts, keys)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+from scipy.stats import multivariate_normal
+
+from ta import TAAttacker
+from tests.helpers import KNOWN_KEY, simulate_profiling_traces
+from aes128 import SBOX
+
+
+class TAAttackTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        (traces, ptexts, keys) = simulate_profiling_traces(8000)
+        cls.ta = TAAttacker(5)
+        cls.ta.profile(traces, ptexts, keys)
+
+        (cls.traces, cls.ptexts, _) = simulate_profiling_traces(
+            100, key=KNOWN_KEY, seed=1)
+
+    def test_attack_matches_scipy_reference(self):
+        refs = self.ta.attack(self.traces, self.ptexts)
+
+        for bnum in range(16):
+            # The density of every trace under every class, directly from
+            # the profiled mean and covariance matrices.
+            points = self.traces[:, self.ta.POIs[bnum]]
+            log_densities = np.stack([
+                multivariate_normal(self.ta.meanMatrix[bnum, hw],
+                                    self.ta.covMatrix[bnum, hw]).logpdf(
+                                        points)
+                for hw in range(self.ta.numClasses)], axis=1)
+
+            expected = np.zeros(256)
+            for (trace_densities, ptext) in zip(log_densities,
+                                                self.ptexts[:, bnum]):
+                for guess in range(256):
+                    hw = bin(SBOX[ptext ^ guess]).count("1")
+                    expected[guess] += trace_densities[hw]
+
+            np.testing.assert_allclose(self.ta.log_likelihoods[bnum],
+                                       expected, rtol=1e-9)
+            # The guesses are ranked from the most to the least likely.
+            self.assertEqual(sorted(refs[bnum]), list(range(256)))
+            self.assertTrue(np.all(np.diff(expected[refs[bnum]]) <= 1e-6))
+
+        self.assertEqual(list(self.ta.bestguess), KNOWN_KEY)
+
+    def test_save_load_round_trip(self):
+        preprocessing = {'step': 2, 'indices_hash': 'abc'}
+        with tempfile.TemporaryDirectory() as template_dir:
+            path = os.path.join(template_dir, "templates.npy")
+            self.ta.save(path, sample_step=2, dataset_hash="0123",
+                         preprocessing=preprocessing)
+            loaded = TAAttacker.load(path)
+
+            self.assertEqual(loaded.POIs, self.ta.POIs)
+            self.assertEqual(loaded.numPOIs, self.ta.numPOIs)
+            self.assertEqual(loaded.pooled, self.ta.pooled)
+            self.assertEqual(loaded.leakage_model, self.ta.leakage_model)
+            self.assertEqual(loaded.profilingTraces, 8000)
+            np.testing.assert_array_equal(loaded.meanMatrix,
+                                          self.ta.meanMatrix)
+            np.testing.assert_array_equal(loaded.covMatrix,
+                                          self.ta.covMatrix)
+            self.assertEqual(loaded.metadata['sample_step'], 2)
+            self.assertEqual(loaded.metadata['dataset_hash'], "0123")
+            self.assertEqual(loaded.metadata['preprocessing'], preprocessing)
+
+            self.ta.attack(self.traces, self.ptexts)
+            loaded.attack(self.traces, self.ptexts)
+            np.testing.assert_array_equal(loaded.log_likelihoods,
+                                          self.ta.log_likelihoods)
+            del loaded
+
+
+if __name__ == '__main__':
+    unittest.main()
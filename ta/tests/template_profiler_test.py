@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+
+import helpers  # Puts cpa/ on the path
+from template_profiler import TemplateProfiler
+from tests.helpers import simulate_profiling_traces
+
+
+class TemplateProfilerTest(unittest.TestCase):
+    def setUp(self):
+        (self.traces, self.ptexts, self.keys) = \
+            simulate_profiling_traces(2000)
+
+    def profile(self, indices=None):
+        profiler = TemplateProfiler(3)
+        profiler.update_means(self.traces, self.ptexts, self.keys, indices,
+                              batch_size=300)
+        profiler.select_POIs()
+        profiler.update_covariances(self.traces, self.ptexts, self.keys,
+                                    indices, batch_size=300)
+        return profiler
+
+    def assert_profiles_equal(self, profiler, expected):
+        np.testing.assert_array_equal(profiler.POIs, expected.POIs)
+        np.testing.assert_array_equal(profiler.counts, expected.counts)
+        np.testing.assert_allclose(profiler.means, expected.means,
+                                   atol=1e-10)
+        np.testing.assert_array_equal(profiler.poiCounts, expected.poiCounts)
+        np.testing.assert_allclose(profiler.poiMeans, expected.poiMeans,
+                                   atol=1e-10)
+        np.testing.assert_allclose(profiler.coMoments, expected.coMoments,
+                                   rtol=1e-10, atol=1e-8)
+
+    def test_profile_matches_class_statistics(self):
+        profiler = self.profile()
+        classes = profiler.find_classes(self.ptexts, self.keys)
+
+        # Every key byte leaks at its own sample point.
+        for bnum in range(16):
+            self.assertIn(10 * (bnum + 1), profiler.POIs[bnum])
+
+        means = profiler.class_means()
+        covs = profiler.class_covariances()
+        for (bnum, hw) in [(0, 4), (7, 2), (15, 6)]:
+            points = self.traces[classes[:, bnum] == hw][
+                :, profiler.POIs[bnum]]
+            np.testing.assert_allclose(means[bnum, hw], points.mean(axis=0))
+            np.testing.assert_allclose(covs[bnum, hw], np.cov(points.T))
+        self.assertEqual(profiler.traces_amnt(), 2000)
+
+    def test_merged_halves_match_single_pass(self):
+        single_pass = self.profile()
+
+        halves = []
+        for indices in [np.arange(0, 2000, 2), np.arange(1, 2000, 2)]:
+            half = TemplateProfiler(3)
+            half.POIs = single_pass.POIs.copy()
+            half.update(self.traces, self.ptexts, self.keys, indices,
+                        batch_size=300)
+            halves.append(half)
+        halves[0].merge(halves[1])
+
+        self.assert_profiles_equal(halves[0], single_pass)
+
+    def test_update_after_selecting_POIs(self):
+        profiler = self.profile(np.arange(1200))
+        profiler.update(self.traces, self.ptexts, self.keys,
+                        np.arange(1200, 2000), batch_size=300)
+
+        # The POIs of the first traces are kept, the statistics are those
+        # of all traces.
+        expected = TemplateProfiler(3)
+        expected.update_means(self.traces, self.ptexts, self.keys)
+        expected.POIs = profiler.POIs
+        expected.update_covariances(self.traces, self.ptexts, self.keys)
+
+        self.assert_profiles_equal(profiler, expected)
+        self.assertEqual(profiler.traces_amnt(), 2000)
+
+    def test_save_load_round_trip(self):
+        unselected = TemplateProfiler(3)
+        unselected.update_means(self.traces, self.ptexts, self.keys)
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            path = os.path.join(profile_dir, "profile.npy")
+            for profiler in [TemplateProfiler(3, POIspacing=8,
+                                              leakage_model="hd_sbox"),
+                             unselected, self.profile()]:
+                profiler.save(path)
+                loaded = TemplateProfiler.load(path)
+
+                self.assertEqual(loaded.numPOIs, profiler.numPOIs)
+                self.assertEqual(loaded.POIspacing, profiler.POIspacing)
+                self.assertEqual(loaded.leakage_model,
+                                 profiler.leakage_model)
+                for name in ["means", "POIs"]:
+                    if getattr(profiler, name) is None:
+                        self.assertIsNone(getattr(loaded, name))
+                    else:
+                        np.testing.assert_array_equal(
+                            getattr(loaded, name), getattr(profiler, name))
+                for name in ["counts", "poiCounts", "poiMeans", "coMoments"]:
+                    np.testing.assert_array_equal(getattr(loaded, name),
+                                                  getattr(profiler, name))
+
+    def test_merge_requires_same_POIs(self):
+        profiler = self.profile(np.arange(1000))
+        other = TemplateProfiler(3)
+        other.POIs = profiler.POIs + 1
+        other.update(self.traces, self.ptexts, self.keys,
+                     np.arange(1000, 2000))
+        with self.assertRaises(ValueError):
+            profiler.merge(other)
+
+        # Neither may profiles of another leakage model be merged.
+        other = TemplateProfiler(3, leakage_model="hd_sbox")
+        other.POIs = profiler.POIs
+        with self.assertRaises(ValueError):
+            profiler.merge(other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest  # Run tests from this folder's parent directory
+
+import numpy as np
+from scipy.stats import multivariate_normal
+
+from templates import MAX_CONDITION, Templates, shrink_covariance
+
+
+class TemplatesTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.means = rng.normal(0, 1, (9, 4))
+        mixing = rng.normal(0, 1, (9, 4, 4))
+        self.covs = mixing @ mixing.transpose(0, 2, 1) + np.identity(4)
+
+    def test_shrinks_rank_deficient_covariance(self):
+        # Estimated from fewer traces than POIs, so its rank is 2.
+        samples = np.random.RandomState(1).normal(0, 1, (3, 5))
+        cov = np.cov(samples.T)
+        self.assertGreater(np.linalg.cond(cov), MAX_CONDITION)
+
+        (shrunk, shrinkage) = shrink_covariance(cov)
+        self.assertGreater(shrinkage, 0)
+        # The shrinkage is the smallest one, so the condition number lands
+        # on the maximum, up to rounding.
+        self.assertLessEqual(np.linalg.cond(shrunk),
+                             MAX_CONDITION * (1 + 1e-6))
+        np.linalg.cholesky(shrunk)
+
+    def test_keeps_well_conditioned_covariance(self):
+        for cov in self.covs:
+            (kept, shrinkage) = shrink_covariance(cov)
+            self.assertEqual(shrinkage, 0)
+            np.testing.assert_array_equal(kept, cov)
+
+    def test_log_likelihood_matches_scipy(self):
+        templates = Templates(self.means, self.covs)
+        np.testing.assert_array_equal(templates.shrinkages, 0)
+
+        traces = np.random.RandomState(2).normal(0, 2, (20, 4))
+        expected = np.stack([
+            multivariate_normal(mean, cov).logpdf(traces)
+            for (mean, cov) in zip(self.means, self.covs)], axis=1)
+        np.testing.assert_allclose(templates.log_likelihood(traces),
+                                   expected)
+
+    def test_class_without_statistics_gets_average_template(self):
+        means = self.means.copy()
+        covs = self.covs.copy()
+        # A class without traces has no mean, one with a single trace no
+        # covariance matrix.
+        means[3] = np.nan
+        covs[3] = np.nan
+        covs[5] = np.nan
+
+        templates = Templates(means, covs)
+
+        observed = np.delete(np.arange(9), 3)
+        np.testing.assert_allclose(templates.means[3],
+                                   means[observed].mean(axis=0))
+        estimated = np.delete(np.arange(9), [3, 5])
+        for class_nr in [3, 5]:
+            np.testing.assert_allclose(templates.covs[class_nr],
+                                       covs[estimated].mean(axis=0))
+        traces = np.random.RandomState(3).normal(0, 2, (20, 4))
+        self.assertTrue(np.all(np.isfinite(templates.log_likelihood(traces))))
+
+
+if __name__ == '__main__':
+    unittest.main()